@@ -0,0 +1,78 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Benchmark getting a changelog, with the on demand changelog store against reloading the sack
+
+The old way sets load_metadata_other on all repos and reloads the whole sack,
+each way is run in its own process, to measure the time & RSS growth for the first changelog.
+
+Usage: PYTHONPATH=src/:benchmarks/ python3 benchmarks/bench_changelog.py [repos] [packages per repo]
+"""
+
+import subprocess
+import sys
+import tempfile
+import time
+
+from localrepo import make_backend
+
+CHANGELOGS = 20
+MODES = ('store', 'reload')
+
+
+def rss() -> int:
+    """ Get the current RSS in kB """
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def run(mode: str, repo_count: int, pkg_count: int):
+    with tempfile.TemporaryDirectory() as root:
+        backend = make_backend(root, repo_count, pkg_count, changelogs=CHANGELOGS)
+        backend.setup()
+        pkg = backend.packages.by_key('repo0-package1*')[0]
+        before = rss()
+        start = time.perf_counter()
+        if mode == 'store':
+            changelog = backend.get_attribute(str(pkg), 'repo0', 'changelog')[0][2]
+        else:
+            for repo in backend.base.repos.iter_enabled():
+                repo.load_metadata_other = True
+            backend.setup(refresh=True, cache=True)
+            changelog = backend.packages.find_pkg(str(pkg), 'repo0')[0].changelog
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f'{mode:>8} {len(changelog):8} {elapsed:10.1f} {(rss() - before) / 1024:10.1f}')
+
+
+def main(repo_count: int, pkg_count: int):
+    print(f'Repos: {repo_count} Packages per repo: {pkg_count} Changelog entries: {CHANGELOGS}')
+    print(f'{"mode":>8} {"entries":>8} {"time ms":>10} {"RSS MB":>10}')
+    sys.stdout.flush()
+    for mode in MODES:
+        subprocess.run([sys.executable, __file__, mode, str(repo_count), str(pkg_count)], check=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in MODES:
+        run(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+             int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
@@ -0,0 +1,79 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Benchmark building client Packages from nevra strings against pre-split nevra fields
+
+Measures the client side unmarshalling of the a(ssst) and a(sssssst) package
+lists and building the Package objects, without a running daemon.
+
+Usage: PYTHONPATH=src/ python3 benchmarks/bench_fields.py [number of packages]
+"""
+
+import sys
+import time
+
+from dasbus.typing import List, get_variant
+from gi.repository import GLib
+
+from dnfdbus.client import Package, _make_package
+from dnfdbus.interface import PackageExtraType, PackageFieldsType
+
+ROUNDS = 5
+
+
+def make_fields(count: int) -> list:
+    """ Make (name, epoch, version, release, arch, reponame, summary, size) rows for count packages """
+    return [(f'package{i}', str(i % 2), f'{i % 10}.{i % 7}.0', f'{i % 3}.fc34', 'x86_64', f'repo{i % 5}',
+             f'Summary for package{i}', i * 1000) for i in range(count)]
+
+
+def to_nevra_rows(rows: list) -> list:
+    """ Make the (nevra, reponame, summary, size) rows for the same packages """
+    return [(str(Package.from_fields(*row[:6])), row[5], row[6], row[7]) for row in rows]
+
+
+def timed(func) -> float:
+    """ Get the average time used by func in ms """
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func()
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def decode(rows: list, row_type, make) -> dict:
+    data = get_variant(List[row_type], rows).get_data_as_bytes()
+    variant = GLib.Variant.new_from_bytes(GLib.VariantType.new(f'a{get_variant(row_type, rows[0]).get_type_string()}'),
+                                          data, False)
+    unpacked = variant.unpack()
+    return {'unpack': timed(variant.unpack),
+            'build': timed(lambda: [make(elem) for elem in unpacked]),
+            'bytes': data.get_size()}
+
+
+def main(count: int):
+    fields = make_fields(count)
+    nevras = to_nevra_rows(fields)
+    print(f'Packages : {count}')
+    for name, res in (('nevra', decode(nevras, PackageExtraType, _make_package)),
+                      ('fields', decode(fields, PackageFieldsType, lambda elem: Package.from_fields(*elem)))):
+        print(f'{name:8} unpack: {res["unpack"]:8.1f} ms  build packages: {res["build"]:8.1f} ms  '
+              f'bytes: {res["bytes"]:10}')
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 60000)
@@ -0,0 +1,83 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Benchmark GetPackagesByKey name globs, the name index against dnf.subject.Subject
+
+Builds a synthetic sack (default 60000 packages) from a local file:// repository.
+
+Usage: PYTHONPATH=src/:benchmarks/ python3 benchmarks/bench_index.py [packages]
+"""
+
+import itertools
+import sys
+import tempfile
+import time
+
+import dnf
+
+from dnfdbus.backend.index import NameIndex
+from localrepo import make_backend
+
+PREFIXES = ['', 'lib', 'python3-', 'perl-', 'golang-', 'rust-', 'texlive-', 'ghc-', 'qt6-', 'kf5-']
+WORDS = ['qt', 'gtk', 'base', 'core', 'net', 'xml', 'json', 'http', 'crypt', 'font', 'sound',
+         'image', 'math', 'data', 'test', 'tool', 'kit', 'web', 'sql', 'zip']
+SUFFIXES = ['', '-devel', '-libs', '-doc', '-common', '-tests', '-static', '-debuginfo']
+
+KEYS = ['*qt6*', 'python3-*', 'lib*xml*', '*-devel', '*json*http*', '*crypt*', 'qt6-qtbase*', '*zz*']
+
+ROUNDS = 10
+
+
+def make_names(count: int) -> list:
+    """ Make count unique, realistic looking package names """
+    names = []
+    words = itertools.cycle(itertools.product(WORDS, WORDS))
+    for i in range(count):
+        first, second = next(words)
+        prefix = PREFIXES[i % len(PREFIXES)]
+        suffix = SUFFIXES[(i // len(PREFIXES)) % len(SUFFIXES)]
+        names.append(f'{prefix}{first}{second}{i}{suffix}')
+    return names
+
+
+def timed(func, rounds: int = ROUNDS) -> float:
+    """ Get the average time in ms """
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main(count: int):
+    with tempfile.TemporaryDirectory() as root:
+        backend = make_backend(root, 1, count, names=make_names(count))
+        backend.setup()
+        sack = backend.base.sack
+        start = time.perf_counter()
+        index = NameIndex(list(sack.query()))
+        print(f'Packages: {len(index)}  index build: {(time.perf_counter() - start) * 1000:.1f} ms')
+        print(f'{"key":>14} {"matches":>8} {"subject ms":>11} {"index ms":>9} {"speedup":>8}')
+        for key in KEYS:
+            subject = timed(lambda: list(dnf.subject.Subject(key).get_best_query(sack)))
+            indexed = timed(lambda: index.match(key))
+            matches = len(index.match(key))
+            print(f'{key:>14} {matches:8} {subject:11.2f} {indexed:9.2f} {subject / indexed:7.1f}x')
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 60000)
@@ -0,0 +1,56 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+"""
+Run the load generator against a daemon with a synthetic backend on a private bus
+
+Usage: PYTHONPATH=src/:benchmarks/ python3 benchmarks/bench_load.py [packages] [clients] [seconds]
+"""
+
+import sys
+import tempfile
+
+from dnfdbus.loadtest import MIX, print_report, run
+from fakebus import start_bus, start_daemon
+
+REPOS = 4
+GROUPS = 300
+
+
+def main(pkg_count: int, clients: int, duration: float):
+    bus, address = start_bus()
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            daemon, sack_load = start_daemon(address, root, pkg_count, REPOS, GROUPS)
+            try:
+                print(f'Packages: {pkg_count} (sack load {sack_load:.2f} s) Clients: {clients}')
+                res = run({'clients': clients, 'duration': duration, 'mix': dict(MIX), 'seed': 0,
+                           'keys': ['repo0-package1*', 'repo1-package2', '*package99*'],
+                           'packages': ['repo0-package1', 'repo2-package3'], 'filters': ['available'],
+                           'categories': None, 'address': address})
+                print_report(res)
+            finally:
+                daemon.terminate()
+                daemon.wait()
+    finally:
+        bus.terminate()
+        bus.wait()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+         float(sys.argv[3]) if len(sys.argv) > 3 else 10)
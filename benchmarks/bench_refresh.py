@@ -0,0 +1,53 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Benchmark DnfBackend.refresh_repos() against local file:// repositories
+
+Sets up a number of local repos, changes 0..all of them and shows that the
+refresh cost depends on the number of changed repos, not the total number of repos.
+
+Usage: PYTHONPATH=src/:benchmarks/ python3 benchmarks/bench_refresh.py [repos] [packages per repo]
+"""
+
+import os
+import sys
+import tempfile
+
+from localrepo import make_backend, make_packages, write_repo
+
+
+def main(repo_count: int, pkg_count: int):
+    with tempfile.TemporaryDirectory() as root:
+        backend = make_backend(root, repo_count, pkg_count)
+        backend.setup()
+        print(f'Repos: {repo_count} Packages per repo: {pkg_count}')
+        changes = sorted({0, 1, repo_count // 4, repo_count // 2, repo_count})
+        for release, changed in enumerate(changes, start=2):
+            for i in range(changed):
+                repo_id = f'repo{i}'
+                write_repo(os.path.join(root, 'repos', repo_id),
+                           make_packages(repo_id, pkg_count, release=str(release)))
+            res = backend.refresh_repos()
+            load = sum(res['timings'].values())
+            print(f'changed: {len(res["changed"]):4}  metadata load: {load * 1000:8.1f} ms  '
+                  f'sack reload: {res["reload"] * 1000:8.1f} ms')
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
@@ -0,0 +1,125 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Micro benchmark of the backend package rows, wrapping and dumping a list of packages
+
+Compares making new wrappers and nevra strings on every call (the old DnfPkg)
+with the rows cached for a sack generation, using fake packages.
+
+Usage: PYTHONPATH=src/ python3 benchmarks/bench_rows.py [packages]
+"""
+
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+from dnfdbus.backend.packages import DnfPkg
+
+ROUNDS = 5
+
+
+@dataclass
+class FakePkg:
+    """ Fake hawkey package """
+    name: str
+    epoch: int
+    version: str
+    release: str
+    arch: str
+    reponame: str
+    summary: str
+    downloadsize: int
+    installsize: int
+
+    def __str__(self):
+        if self.epoch == 0:
+            return f'{self.name}-{self.version}-{self.release}.{self.arch}'
+        else:
+            return f'{self.name}-{self.epoch}:{self.version}-{self.release}.{self.arch}'
+
+
+class OldDnfPkg:
+    """ The DnfPkg wrapper before the rows was cached """
+
+    def __init__(self, pkg) -> None:
+        self.pkg = pkg
+
+    @property
+    def reponame(self):
+        return self.pkg.reponame
+
+    @property
+    def summary(self):
+        return self.pkg.summary
+
+    @property
+    def size(self):
+        return self.pkg.downloadsize or self.pkg.installsize
+
+    @property
+    def dump_list(self):
+        return [str(self.pkg), self.reponame, self.summary, self.size]
+
+
+def make_pkgs(count: int) -> list:
+    return [FakePkg(f'package{i}', i % 3, f'{i % 10}.{i % 7}.0', f'{i % 5}.fc34', 'x86_64',
+                    'fedora', f'Summary of package{i}', 1000 + i, 3000 + i) for i in range(count)]
+
+
+def timed(func) -> tuple:
+    """ Get the average time in ms and the peak allocation in MB for func """
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func()
+    return (time.perf_counter() - start) / ROUNDS * 1000, peak
+
+
+def main(count: int):
+    pkgs = make_pkgs(count)
+    rows = [DnfPkg(pkg) for pkg in pkgs]
+    [str(row) for row in rows]  # the nevras is made on first use in a generation
+
+    def old():
+        return [OldDnfPkg(pkg).dump_list for pkg in pkgs]
+
+    def cached():
+        return [row.dump_list for row in rows]
+
+    print(f'Packages: {count}')
+    print(f'{"":>8} {"time ms":>10} {"peak MB":>10}')
+    for name, func in (('old', old), ('cached', cached)):
+        elapsed, peak = timed(func)
+        print(f'{name:>8} {elapsed:10.1f} {peak:10.1f}')
+    tracemalloc.start()
+    _ = [DnfPkg(pkg) for pkg in pkgs]
+    slots = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    tracemalloc.start()
+    _ = [OldDnfPkg(pkg) for pkg in pkgs]
+    dicts = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f'wrapper memory: slots {slots / 1024 / 1024:.1f} MB, dict {dicts / 1024 / 1024:.1f} MB')
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,79 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Benchmark the JSON (v1) and native DBus types (v2) package list formats
+
+Measures the daemon side encoding, the size of the marshalled DBus message body
+and the client side decoding into Package objects, without a running daemon.
+
+Usage: PYTHONPATH=src/ python3 benchmarks/bench_wire.py [number of packages]
+"""
+
+import json
+import sys
+import time
+
+from dasbus.typing import List, Str, get_variant
+from gi.repository import GLib
+
+from dnfdbus.client import _make_package
+from dnfdbus.interface import PackageExtraType
+
+
+def make_rows(count: int) -> list:
+    """ Make (nevra, reponame, summary, size) rows for count packages """
+    return [(f'package{i}-1:{i % 10}.{i % 7}.0-{i % 3}.fc34.x86_64', f'repo{i % 5}',
+             f'Summary for package{i}', i * 1000) for i in range(count)]
+
+
+def timed(func, *args):
+    """ Return the result of func(*args) and the time used in ms """
+    start = time.perf_counter()
+    res = func(*args)
+    return res, (time.perf_counter() - start) * 1000
+
+
+def json_path(rows: list) -> dict:
+    # daemon: encode to JSON and wrap it in a string
+    data, t_encode = timed(lambda: get_variant(Str, json.dumps(rows)).get_data_as_bytes())
+    # client: unmarshal the string, decode the JSON and build the packages
+    variant = GLib.Variant.new_from_bytes(GLib.VariantType.new('s'), data, False)
+    _, t_decode = timed(lambda: [_make_package(elem) for elem in json.loads(variant.unpack())])
+    return {'encode': t_encode, 'decode': t_decode, 'bytes': data.get_size()}
+
+
+def native_path(rows: list) -> dict:
+    # daemon: marshal the rows as a(ssst)
+    data, t_encode = timed(lambda: get_variant(List[PackageExtraType], rows).get_data_as_bytes())
+    # client: unmarshal the rows and build the packages
+    variant = GLib.Variant.new_from_bytes(GLib.VariantType.new('a(ssst)'), data, False)
+    _, t_decode = timed(lambda: [_make_package(elem) for elem in variant.unpack()])
+    return {'encode': t_encode, 'decode': t_decode, 'bytes': data.get_size()}
+
+
+def main(count: int):
+    rows = make_rows(count)
+    print(f'Packages : {count}')
+    for name, path in (('json (v1)', json_path), ('native (v2)', native_path)):
+        res = path(rows)
+        print(f'{name:12} encode: {res["encode"]:8.1f} ms  decode: {res["decode"]:8.1f} ms  '
+              f'bytes: {res["bytes"]:10}')
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 60000)
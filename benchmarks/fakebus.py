@@ -0,0 +1,111 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+"""
+Private bus for the benchmarks, standing in for the system bus
+
+start_bus() starts a private dbus-daemon, the returned address is used as
+DBUS_SYSTEM_BUS_ADDRESS, so the daemon & client code uses it as the system bus.
+
+Run as a script, it serves a DnfDbus daemon with a synthetic backend on the bus,
+with a fake PolicyKit authority granting all calls.
+
+Usage: python3 benchmarks/fakebus.py <root> <packages> <repos> <groups>
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+
+def start_bus() -> tuple:
+    """ Start a private dbus-daemon with the session bus config, return the process and the address """
+    proc = subprocess.Popen(['dbus-daemon', '--session', '--nofork', '--print-address=1'],
+                            stdout=subprocess.PIPE, text=True)
+    address = proc.stdout.readline().strip()
+    if not address:
+        proc.kill()
+        raise RuntimeError('dbus-daemon did not print its address')
+    return proc, address
+
+
+def peak_rss(pid: int) -> int:
+    """ Get the peak resident set size of a process in kB """
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    return 0
+
+
+def serve(root: str, pkg_count: int, repo_count: int, groups: int) -> None:
+    from dasbus.loop import EventLoop
+    from dasbus.server.interface import dbus_interface
+    from dasbus.typing import Bool, Dict, Str, Tuple, UInt32, Variant
+
+    from localrepo import make_backend
+    from dnfdbus.server import DNFDBUS, DNFDBUS_V2, SYSTEM_BUS, DnfDbus, DnfDbusServerObjectHandler
+    from dnfdbus.polkit import POLKIT_INTERFACE, POLKIT_NAME, POLKIT_PATH
+
+    # noinspection PyPep8Naming
+    @dbus_interface(POLKIT_INTERFACE)
+    class FakeAuthority:
+        """ PolicyKit authority granting all actions """
+
+        def CheckAuthorization(self, subject: Tuple[Str, Dict[Str, Variant]], action_id: Str,
+                               details: Dict[Str, Str], flags: UInt32,
+                               cancellation_id: Str) -> Tuple[Bool, Bool, Dict[Str, Str]]:
+            return True, False, {}
+
+    backend = make_backend(root, repo_count, pkg_count // repo_count, groups=groups)
+    start = time.perf_counter()
+    backend.setup()
+    sack_load = time.perf_counter() - start
+
+    loop = EventLoop()
+    dnfdbus = DnfDbus(loop, snapshot_path=None, state_path=None)
+    dnfdbus.backend = backend
+    backend.state_changed.connect(dnfdbus._backend_state_changed)
+    backend.sack_changed.connect(dnfdbus._sack_changed)
+    SYSTEM_BUS.publish_object(POLKIT_PATH, FakeAuthority())
+    SYSTEM_BUS.register_service(POLKIT_NAME)
+    SYSTEM_BUS.publish_object(DNFDBUS.object_path, dnfdbus.for_publication(),
+                              server_factory=DnfDbusServerObjectHandler)
+    SYSTEM_BUS.publish_object(DNFDBUS_V2.object_path, dnfdbus.for_publication_v2(),
+                              server_factory=DnfDbusServerObjectHandler)
+    SYSTEM_BUS.register_service(DNFDBUS.service_name)
+    print(f'READY {sack_load}', flush=True)
+    try:
+        loop.run()
+    finally:
+        SYSTEM_BUS.disconnect()
+
+
+def start_daemon(address: str, root: str, pkg_count: int, repo_count: int, groups: int) -> tuple:
+    """ Start a daemon serving a synthetic backend on the bus, return the process and the sack load time """
+    env = dict(os.environ, DBUS_SYSTEM_BUS_ADDRESS=address)
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), root, str(pkg_count),
+                             str(repo_count), str(groups)], stdout=subprocess.PIPE, text=True, env=env)
+    line = proc.stdout.readline().split()
+    if not line or line[0] != 'READY':
+        proc.kill()
+        raise RuntimeError('The benchmark daemon failed to start')
+    return proc, float(line[1])
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]))
@@ -0,0 +1,221 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Local file:// repository fixtures for the benchmarks
+
+Writes the repodata (repomd.xml, primary, filelists, other & comps) for a set of
+fake packages directly, so no rpms or createrepo_c are needed.
+"""
+
+import gzip
+import hashlib
+import os
+import time
+from xml.sax.saxutils import escape
+
+import dnf
+
+from dnfdbus.backend import DnfBackend
+
+REPOMD = """<?xml version="1.0" encoding="UTF-8"?>
+<repomd xmlns="http://linux.duke.edu/metadata/repo" xmlns:rpm="http://linux.duke.edu/metadata/rpm">
+  <revision>{revision}</revision>
+{data}</repomd>
+"""
+
+REPOMD_DATA = """  <data type="{mdtype}">
+    <checksum type="sha256">{checksum}</checksum>
+    <open-checksum type="sha256">{open_checksum}</open-checksum>
+    <location href="repodata/{filename}"/>
+    <timestamp>{timestamp}</timestamp>
+    <size>{size}</size>
+    <open-size>{open_size}</open-size>
+  </data>
+"""
+
+PRIMARY_PKG = """<package type="rpm">
+  <name>{name}</name>
+  <arch>{arch}</arch>
+  <version epoch="{epoch}" ver="{version}" rel="{release}"/>
+  <checksum type="sha256" pkgid="YES">{pkgid}</checksum>
+  <summary>{summary}</summary>
+  <description>{summary}</description>
+  <packager></packager>
+  <url></url>
+  <time file="{timestamp}" build="{timestamp}"/>
+  <size package="{size}" installed="{size}" archive="{size}"/>
+  <location href="Packages/{name}-{version}-{release}.{arch}.rpm"/>
+  <format>
+    <rpm:license>MIT</rpm:license>
+    <rpm:vendor></rpm:vendor>
+    <rpm:group>Unspecified</rpm:group>
+    <rpm:buildhost>localhost</rpm:buildhost>
+    <rpm:sourcerpm>{name}-{version}-{release}.src.rpm</rpm:sourcerpm>
+    <rpm:header-range start="0" end="0"/>
+    <rpm:provides>
+      <rpm:entry name="{name}" flags="EQ" epoch="{epoch}" ver="{version}" rel="{release}"/>
+    </rpm:provides>
+  </format>
+</package>
+"""
+
+PRIMARY = """<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common" xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="{count}">
+{packages}</metadata>
+"""
+
+FILELISTS = """<?xml version="1.0" encoding="UTF-8"?>
+<filelists xmlns="http://linux.duke.edu/metadata/filelists" packages="{count}">
+{packages}</filelists>
+"""
+
+OTHER = """<?xml version="1.0" encoding="UTF-8"?>
+<otherdata xmlns="http://linux.duke.edu/metadata/other" packages="{count}">
+{packages}</otherdata>
+"""
+
+OTHER_PKG = """<package pkgid="{pkgid}" name="{name}" arch="{arch}">
+  <version epoch="{epoch}" ver="{version}" rel="{release}"/>
+{changelog}</package>
+"""
+
+CHANGELOG = """  <changelog author="Packager &lt;packager@example.com&gt; - {version}-{n}" date="{date}">- Change number {n}
+- Some more details about the change</changelog>
+"""
+
+COMPS = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE comps PUBLIC "-//Red Hat, Inc.//DTD Comps info//EN" "comps.dtd">
+<comps>
+{groups}{categories}</comps>
+"""
+
+COMPS_GROUP = """  <group>
+    <id>{id}</id>
+    <name>{name}</name>
+    <description>Description of {name}</description>
+    <default>false</default>
+    <uservisible>true</uservisible>
+    <packagelist>
+{packages}    </packagelist>
+  </group>
+"""
+
+COMPS_PACKAGE = """      <packagereq type="{type}">{name}</packagereq>
+"""
+
+COMPS_CATEGORY = """  <category>
+    <id>{id}</id>
+    <name>{name}</name>
+    <description>Description of {name}</description>
+    <grouplist>
+{groups}    </grouplist>
+  </category>
+"""
+
+COMPS_GROUPID = """      <groupid>{id}</groupid>
+"""
+
+
+def make_packages(prefix: str, count: int, release: str = '1', names: list = None) -> list:
+    """ Make a list of fake package dicts, named from names or <prefix>-package<n> """
+    pkgs = []
+    for i in range(count):
+        name = names[i] if names else f'{prefix}-package{i}'
+        pkgs.append({
+            'name': name, 'epoch': '0', 'version': f'{i % 10}.{i % 7}', 'release': release,
+            'arch': 'noarch', 'summary': f'Summary for {name}', 'size': 1000 + i,
+            'pkgid': hashlib.sha256(f'{name}-{release}'.encode()).hexdigest(),
+            'timestamp': 1600000000
+        })
+    return pkgs
+
+
+def make_comps(pkgs: list, groups: int, group_size: int = 20, category_size: int = 20) -> str:
+    """ Make comps with groups of group_size packages each, and a category for each category_size groups """
+    group_xml = []
+    for i in range(groups):
+        members = [pkgs[(i * group_size + n) % len(pkgs)]['name'] for n in range(group_size)] if pkgs else []
+        packages = ''.join(COMPS_PACKAGE.format(type='mandatory' if n == 0 else 'default', name=escape(name))
+                           for n, name in enumerate(members))
+        group_xml.append(COMPS_GROUP.format(id=f'group{i}', name=f'Group {i}', packages=packages))
+    category_xml = []
+    for i in range(0, groups, category_size):
+        groupids = ''.join(COMPS_GROUPID.format(id=f'group{n}') for n in range(i, min(i + category_size, groups)))
+        category_xml.append(COMPS_CATEGORY.format(id=f'category{i // category_size}',
+                                                  name=f'Category {i // category_size}', groups=groupids))
+    return COMPS.format(groups=''.join(group_xml), categories=''.join(category_xml))
+
+
+def _write_metadata(repodata: str, mdtype: str, content: str, compress: bool = True) -> str:
+    raw = content.encode('utf-8')
+    data = gzip.compress(raw, mtime=0) if compress else raw
+    checksum = hashlib.sha256(data).hexdigest()
+    filename = f'{checksum}-{mdtype}.xml.gz' if compress else f'{checksum}-{mdtype}.xml'
+    with open(os.path.join(repodata, filename), 'wb') as f:
+        f.write(data)
+    return REPOMD_DATA.format(mdtype=mdtype, checksum=checksum,
+                              open_checksum=hashlib.sha256(raw).hexdigest(), filename=filename,
+                              timestamp=int(time.time()), size=len(data), open_size=len(raw))
+
+
+def write_repo(path: str, pkgs: list, changelogs: int = 0, groups: int = 0) -> str:
+    """ Write the repodata for pkgs to path and return the file:// baseurl
+
+    changelogs is the number of changelog entries for each package,
+    groups is the number of comps groups made from the packages
+    """
+    repodata = os.path.join(path, 'repodata')
+    os.makedirs(repodata, exist_ok=True)
+    for filename in os.listdir(repodata):
+        os.unlink(os.path.join(repodata, filename))
+    escaped = [{key: escape(str(value)) for key, value in pkg.items()} for pkg in pkgs]
+    count = len(pkgs)
+    data = _write_metadata(repodata, 'primary', PRIMARY.format(
+        count=count, packages=''.join(PRIMARY_PKG.format(**pkg) for pkg in escaped)))
+    data += _write_metadata(repodata, 'filelists', FILELISTS.format(
+        count=count, packages=''.join(OTHER_PKG.format(changelog='', **pkg) for pkg in escaped)))
+    changelog = ''.join(CHANGELOG.format(version='1.0', n=n, date=1600000000 - n * 86400) for n in range(changelogs))
+    data += _write_metadata(repodata, 'other', OTHER.format(
+        count=count, packages=''.join(OTHER_PKG.format(changelog=changelog, **pkg) for pkg in escaped)))
+    if groups:
+        data += _write_metadata(repodata, 'group', make_comps(pkgs, groups), compress=False)
+    with open(os.path.join(repodata, 'repomd.xml'), 'w') as f:
+        f.write(REPOMD.format(revision=int(time.time()), data=data))
+    return f'file://{os.path.abspath(path)}'
+
+
+def make_backend(root: str, repo_count: int, pkg_count: int, names: list = None,
+                 changelogs: int = 0, groups: int = 0) -> DnfBackend:
+    """ Make a backend with repo_count local repos, using an empty installroot
+
+    The comps groups is added to the first repo.
+    """
+    base = dnf.Base()
+    base.conf.installroot = os.path.join(root, 'installroot')
+    base.conf.cachedir = os.path.join(root, 'cache')
+    base.conf.substitutions['releasever'] = '34'
+    for i in range(repo_count):
+        repo_id = f'repo{i}'
+        baseurl = write_repo(os.path.join(root, 'repos', repo_id),
+                             make_packages(repo_id, pkg_count, names=names), changelogs=changelogs,
+                             groups=groups if i == 0 else 0)
+        repo = base.repos.add_new_repo(repo_id, base.conf, baseurl=[baseurl])
+        repo.metadata_expire = 0  # always check the local repos for changes
+    backend = DnfBackend(base)
+    backend._repo_setup = True  # only use the local repos
+    return backend
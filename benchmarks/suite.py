@@ -0,0 +1,168 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+"""
+End-to-end benchmark suite
+
+For each size, a daemon serving a synthetic backend (local repos with the number of
+packages and comps groups) is started on a private bus, and the client methods is called
+on it. The latency (including the client side parsing), reply bytes and peak RSS of the
+daemon & client is written to a JSON file, that can be compared with an earlier run.
+
+Usage: PYTHONPATH=src/:benchmarks/ python3 benchmarks/suite.py [--sizes 1000,10000,100000]
+           [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+from fakebus import peak_rss, start_bus, start_daemon
+
+SIZES = (1000, 10000, 100000)
+REPOS = 4
+GROUPS = 300
+REPEAT = 5
+
+# Slower than the baseline by this factor is reported as a regression
+THRESHOLD = 1.2
+
+V2 = 'dk.rasmil.DnfDbus.V2'
+
+# (name, DBus method, client call)
+CASES = (
+    ('repositories', f'{V2}.GetRepositories', lambda client: client.get_repositories()),
+    ('filter_available', f'{V2}.GetPackagesByFilter',
+     lambda client: client.get_packages_by_filter('available')),
+    ('filter_available_extra', f'{V2}.GetPackagesByFilter',
+     lambda client: client.get_packages_by_filter('available', extra=True)),
+    ('filter_available_fields', f'{V2}.GetPackagesByFilterFields',
+     lambda client: client.get_packages_by_filter('available', extra=True, fields=True)),
+    ('filter_available_compact', f'{V2}.GetPackagesByFilterColumns',
+     lambda client: client.get_packages_by_filter('available', extra=True, compact=True)),
+    ('key_glob', f'{V2}.GetPackagesByKey', lambda client: client.get_packages_by_key('repo0-package1*')),
+    ('key_nevra', f'{V2}.GetPackagesByKey', lambda client: client.get_packages_by_key('repo1-package1-1.1-1.noarch')),
+    ('attribute', f'{V2}.GetPackageAttribute',
+     lambda client: client.get_package_attribute('repo0-package1', 'repo0', 'description')),
+    ('categories', f'{V2}.GetCategories', lambda client: client.get_categories()),
+    ('groups_by_category', f'{V2}.GetGroupsByCategory', lambda client: client.get_groups_by_category('category0')),
+)
+
+
+def reply_size(client, method: str) -> tuple:
+    """ Get the (sum, count) of the reply sizes of a method, from the daemon statistics """
+    stats = client.get_async_method('GetStats')().get(method)
+    if stats is None:
+        return 0, 0
+    return stats['reply_size']['sum'], stats['reply_size']['count']
+
+
+def run_cases(client, repeat: int) -> dict:
+    results = {}
+    for name, method, call in CASES:
+        items = len(call(client))  # warm up, the rows for the sack is made at the first call
+        size_sum, size_count = reply_size(client, method)
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            call(client)
+            latencies.append((time.perf_counter() - start) * 1000)
+        new_sum, new_count = reply_size(client, method)
+        results[name] = {'items': items, 'median_ms': statistics.median(latencies), 'min_ms': min(latencies),
+                         'max_ms': max(latencies),
+                         'reply_bytes': (new_sum - size_sum) // max(1, new_count - size_count)}
+        print(f'  {name:26} {results[name]["median_ms"]:9.1f} ms  {results[name]["reply_bytes"]:10} bytes  '
+              f'{items:7} items')
+    return results
+
+
+def run_size(address: str, size: int, repeat: int) -> dict:
+    from dnfdbus.client import DnfDbusClient
+
+    with tempfile.TemporaryDirectory() as root:
+        proc, sack_load = start_daemon(address, root, size, REPOS, GROUPS)
+        try:
+            print(f'Packages: {size} (sack load {sack_load:.2f} s)')
+            client = DnfDbusClient()
+            cases = run_cases(client, repeat)
+            return {'sack_load_s': sack_load, 'daemon_peak_rss_kb': peak_rss(proc.pid), 'cases': cases}
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    """ Print the change in median latency from the baseline, return the number of regressions """
+    regressions = 0
+    for size, res in results['sizes'].items():
+        base = baseline.get('sizes', {}).get(size)
+        if base is None:
+            continue
+        for name, case in res['cases'].items():
+            base_case = base['cases'].get(name)
+            if base_case is None or not base_case['median_ms']:
+                continue
+            ratio = case['median_ms'] / base_case['median_ms']
+            flag = ' REGRESSION' if ratio > threshold else ''
+            regressions += bool(flag)
+            print(f'{size:>7} {name:26} {base_case["median_ms"]:9.1f} -> {case["median_ms"]:9.1f} ms '
+                  f'({ratio:.2f}x){flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='dnfdbus benchmark suite')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SIZES),
+                        help='comma separated number of packages in the synthetic backends')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='number of timed calls for each case')
+    parser.add_argument('--output', default='benchmark-results.json', help='file to write the results to')
+    parser.add_argument('--compare', help='results from an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='slowdown factor reported as a regression')
+    args = parser.parse_args()
+
+    bus, address = start_bus()
+    # make the client use the private bus as the system bus
+    os.environ['DBUS_SYSTEM_BUS_ADDRESS'] = address
+    try:
+        sizes = {}
+        for size in (int(size) for size in args.sizes.split(',')):
+            sizes[str(size)] = run_size(address, size, args.repeat)
+    finally:
+        bus.terminate()
+        bus.wait()
+    results = {'time': datetime.datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+               'repos': REPOS, 'groups': GROUPS, 'repeat': args.repeat,
+               'client_peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 'sizes': sizes}
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {args.output}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
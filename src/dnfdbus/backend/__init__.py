@@ -19,30 +19,83 @@
 dnfdbus.backend module
 """
 
+import datetime
+import hashlib
+import itertools
+import os
+import threading
+import time
+
 import dnf
+import rpm
+from dasbus.signal import Signal
 
+from .changelogs import DnfChangelogs
 from .groups import DnfComps
 from .packages import DnfPackages
 from .repo import DnfRepository
-from dnfdbus.misc import log
+from dnfdbus.misc import ReadWriteLock, log, span
+
+# Backend states
+STATE_IDLE = 'idle'
+STATE_LOADING = 'loading'
+STATE_READY = 'ready'
+STATE_ERROR = 'error'
+
+
+def read_rpmdb_cookie() -> str:
+    """ Get the rpmdb cookie, it changes every time packages are installed or removed """
+    try:
+        return rpm.TransactionSet().dbCookie()
+    except (AttributeError, rpm.error):  # dbCookie needs rpm >= 4.16
+        return ''
+
+
+def _entry_date(entry: dict) -> datetime.date:
+    timestamp = entry['timestamp']
+    if isinstance(timestamp, datetime.datetime):
+        return timestamp.date()
+    return timestamp
 
 
 class DnfBackend:
 
-    def __init__(self, base=None) -> None:
+    def __init__(self, base=None, generation=0) -> None:
+        """ generation is the sack generation before the first load """
         self.base = base or dnf.Base()
         self.is_setup = False
-        self._changelogs = False
+        self.state = STATE_IDLE
+        self.state_changed = Signal()  # emitted with the new state (maybe from another thread)
+        self.sack_changed = Signal()  # emitted with the new generation, when the sack is (re)loaded
+        # queries hold the read side, (re)loading the sack holds the write side
+        self.lock = ReadWriteLock()
+        self.generation = generation  # bumped every time the sack is (re)loaded
+        self._changelogs = None
         self._packages = None
         self._groups = None
         self._repo_setup = False
+        self._rpmdb_cookie = ''
+        self._repo_fingerprints = {}
+        self._repo_checksums = {}
+        self._refresh_lock = threading.Lock()
+        # libdnf repo objects are shared, only one thread at the time may load them
+        self.repo_lock = threading.Lock()
 
     @property
     def groups(self):
         if not self._groups:
-            self._groups = DnfComps(self)
+            with self.lock.write():
+                if not self._groups:
+                    self._groups = DnfComps(self)
         return self._groups
     
+    @property
+    def changelogs(self):
+        """ Get the changelog store """
+        if not self._changelogs:
+            self._changelogs = DnfChangelogs(self)
+        return self._changelogs
+
     @property
     def packages(self):
         """ Get tha package object"""
@@ -50,27 +103,163 @@ class DnfBackend:
             self._packages = DnfPackages(self)
         return self._packages
 
-    def setup(self, changelogs=False, refresh=False, cache=False):
-        """ Setup Dnf load repository info & fill the sack """
-        if not self.is_setup or refresh:
-            log.debug(f'setup: {refresh=} {cache=} {changelogs=}')
-            if not self._repo_setup: # only setup repos once
-                _ = self.base.read_all_repos()
+    def setup(self, refresh=False, cache=False):
+        """ Setup Dnf load repository info & fill the sack
+
+        Only one thread loads the sack at the time, other callers wait
+        for it to complete instead of starting their own load.
+        Must not be called while holding the read lock, unless the sack is loaded.
+        """
+        if self.is_setup and not refresh:
+            return
+        # the repo lock is taken before the write lock, so a repo being loaded (maybe downloading)
+        # delays the reload, without the pending write lock blocking the readers
+        with self.repo_lock, self.lock.write():
+            if not self.is_setup or refresh:
+                log.debug(f'setup: {refresh=} {cache=}')
+                self._set_state(STATE_LOADING)
+                try:
+                    with span('setup', refresh=refresh, cache=cache):
+                        self.setup_repos()
+                        with span('fill_sack', cache=cache):
+                            if cache:
+                                _ = self.base.fill_sack_from_repos_in_cache()
+                            else:
+                                _ = self.base.fill_sack()
+                except Exception:
+                    self._set_state(STATE_ERROR)
+                    raise
+                self._rpmdb_cookie = read_rpmdb_cookie()
+                self._repo_fingerprints = {repo.id: self._repo_fingerprint(repo)
+                                           for repo in self._enabled_repos()}
+                self._repo_checksums = self.repo_checksums()
+                self.is_setup = True
+                self.generation += 1
+                self.sack_changed.emit(self.generation)
+                self._set_state(STATE_READY)
+
+    def setup_repos(self):
+        """ Read the repository configuration, only done once """
+        if self._repo_setup:
+            return
+        with self.lock.write():
+            if not self._repo_setup:
+                with span('read_all_repos'):
+                    _ = self.base.read_all_repos()
                 self._repo_setup = True
-            if changelogs:
-                for repo in self.base.repos.iter_enabled():
-                    repo.load_metadata_other = True
-                self._changelogs = True
-            if cache:
-                _ = self.base.fill_sack_from_repos_in_cache()
-            else:
-                _ = self.base.fill_sack()
-            self.is_setup = True
+
+    def repo_checksums(self) -> dict:
+        """ Get the checksum of the cached repomd.xml for each enabled repo ('' if not cached)
+
+        Works without loading the sack, so it can be used to check if saved data is still current.
+        """
+        self.setup_repos()
+        checksums = {}
+        for repo in self._enabled_repos():
+            # dnf has no public api for the repo cache directory
+            repomd = os.path.join(repo._repo.getCachedir(), 'repodata', 'repomd.xml')
+            try:
+                with open(repomd, 'rb') as f:
+                    checksums[repo.id] = hashlib.sha256(f.read()).hexdigest()
+            except OSError:
+                checksums[repo.id] = ''
+        return checksums
+
+    def sack_source(self) -> tuple:
+        """ Get the rpmdb cookie and repo checksums the current sack is loaded from """
+        with self.lock.read():
+            return self._rpmdb_cookie, dict(self._repo_checksums)
+
+    @property
+    def rpmdb_path(self) -> str:
+        return rpm.expandMacro('%{_dbpath}')
+
+    @property
+    def cache_path(self) -> str:
+        return self.base.conf.cachedir
+
+    def refresh_installed(self) -> bool:
+        """ Reload the sack if the rpmdb has changed since it was loaded
+
+        The available repos are loaded from the local metadata cache,
+        so only the system repo is read again.
+        """
+        if not self.is_setup:
+            return False
+        cookie = read_rpmdb_cookie()
+        if cookie and cookie == self._rpmdb_cookie:
+            return False
+        self.setup(refresh=True, cache=True)
+        return True
+
+    def refresh_cache(self) -> bool:
+        """ Reload the sack if the cached repo metadata has changed since it was loaded
+
+        Loading the sack writes solv files to the metadata cache, they don't change
+        the repomd.xml checksums, so they don't trigger a reload.
+        """
+        if not self.is_setup:
+            return False
+        if self.repo_checksums() == self._repo_checksums:
+            return False
+        self.setup(refresh=True, cache=True)
+        return True
+
+    def refresh_repos(self) -> dict:
+        """ Refresh the repository metadata, reload the sack only if some repos have changed
+
+        The sack is reloaded from the local metadata cache, where the unchanged repos
+        are read from their solv cache, so the reload cost depends on the changed repos.
+        @return: dict with the 'changed' repo ids, per repo load 'timings' and the sack 'reload' time
+        """
+        self.setup()
+        with self._refresh_lock:
+            timings = {}
+            changed = []
+            for repo in self._enabled_repos():
+                start = time.monotonic()
+                with self.repo_lock:
+                    repo.load()
+                timings[repo.id] = time.monotonic() - start
+                if self._repo_fingerprint(repo) != self._repo_fingerprints.get(repo.id):
+                    changed.append(repo.id)
+            reload = 0.0
+            if changed:
+                start = time.monotonic()
+                self.setup(refresh=True, cache=True)
+                reload = time.monotonic() - start
+            log.debug(f'refresh_repos: {changed=} {timings=} {reload=}')
+            return {'changed': changed, 'timings': timings, 'reload': reload}
+
+    def _enabled_repos(self) -> list:
+        return [repo for repo in self.base.repos.values() if repo.enabled]
+
+    @staticmethod
+    def _repo_fingerprint(repo) -> str:
+        """ Get the path to the primary metadata, it contains the checksum, so it changes with the metadata """
+        return repo.get_metadata_path('primary')
+
+    def setup_in_background(self) -> threading.Thread:
+        """ Start loading the sack in a background thread """
+        thread = threading.Thread(target=self._background_setup, name='dnfdbus-setup', daemon=True)
+        thread.start()
+        return thread
+
+    def _background_setup(self):
+        try:
+            self.setup()
+        except Exception:  # pylint: disable=broad-except
+            log.exception('Loading the package sack in the background failed')
+
+    def _set_state(self, state):
+        self.state = state
+        self.state_changed.emit(state)
 
     def get_repositories(self) -> list:
         """ Get list of repositories"""
         self.setup()
-        return [DnfRepository(self.base.repos[repo]) for repo in self.base.repos]
+        with self.lock.read():
+            return [DnfRepository(self.base.repos[repo]) for repo in self.base.repos]
 
     def get_attribute(self, pkg: str, reponame: str, attribute: str):
         """
@@ -80,23 +269,66 @@ class DnfBackend:
         @param attribute: attribute name to get from dnf package
         @return: list of (package, reponame, attribute values)
         """
-        if attribute == 'changelog':
-            if not self._changelogs:
-                self.setup(changelogs=True, refresh=True)
         pkgs = self.packages.find_pkg(pkg, reponame)
-        value_list = []
-        for po in pkgs:
-            if hasattr(po, attribute):
-                value = getattr(po, attribute)
+        # the changelogs is read without holding the sack lock, loading them can download metadata
+        changelogs = self.changelogs.get(pkgs) if attribute == 'changelog' else None
+        with self.lock.read():
+            if changelogs is not None:
+                values = changelogs
             else:
-                value = None
-            elem = (str(po), po.reponame, value)
-            value_list.append(elem)
+                values = [self._attribute_value(po, attribute) for po in pkgs]
+            return [(str(po), po.reponame, value) for po, value in zip(pkgs, values)]
+
+    def get_attributes(self, nevras: list, attributes: list) -> list:
+        """
+        Get many attributes from many packages, the packages are found in a single query
+        @param nevras: list of package nevras (name-[epoch:]version-release.arch)
+        @param attributes: attribute names to get from dnf package
+        @return: list of (package, reponame, {attribute: value})
+        """
+        pkgs = self.packages.by_nevras(nevras)
+        changelogs = self.changelogs.get(pkgs) if 'changelog' in attributes else None
+        with self.lock.read():
+            value_list = [(str(po), po.reponame, {attribute: self._attribute_value(po, attribute)
+                                                  for attribute in attributes if attribute != 'changelog'})
+                          for po in pkgs]
+            if changelogs is not None:
+                for (_nevra, _reponame, values), changelog in zip(value_list, changelogs):
+                    values['changelog'] = changelog
+            return value_list
+
+    def get_changelog(self, pkg: str, reponame: str, since: datetime.date = None) -> list:
+        """
+        Get the changelog entries for package(s), newest first
+        @param pkg: package key
+        @param reponame: reponame ("" = all repos)
+        @param since: only get the entries newer than this date (None = all entries)
+        @return: list of (package, reponame, changelog entry)
+        """
+        pkgs = self.packages.find_pkg(pkg, reponame)
+        changelogs = self.changelogs.get(pkgs)
+        with self.lock.read():
+            value_list = []
+            for po, changelog in zip(pkgs, changelogs):
+                if since is not None:
+                    changelog = itertools.takewhile(lambda entry: _entry_date(entry) > since, changelog)
+                value_list.extend((str(po), po.reponame, entry) for entry in changelog)
+        # the entries of all the packages (ex. the installed kernels) newest first
+        return sorted(value_list, key=lambda value: value[2]['timestamp'], reverse=True)
 
-        return value_list
+    @staticmethod
+    def _attribute_value(po, attribute: str):
+        if hasattr(po, attribute):
+            return getattr(po, attribute)
+        else:
+            return None
 
     def get_categories(self):
-        return self.groups.dump_categories()
+        groups = self.groups
+        with self.lock.read():
+            return groups.dump_categories()
 
     def get_groups_by_category(self, category_id):
-        return self.groups.dump_groups_by_category(category_id)
+        groups = self.groups
+        with self.lock.read():
+            return groups.dump_groups_by_category(category_id)
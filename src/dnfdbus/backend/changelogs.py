@@ -0,0 +1,122 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+dnfdbus.backend.changelogs module
+"""
+
+import datetime
+import os
+import threading
+
+import hawkey
+import rpm
+
+from dnfdbus.misc import log
+
+
+class DnfChangelogs:
+    """
+    Changelogs loaded on demand, without loading the other metadata into the main sack
+
+    Changelogs for available packages are read from a separate sack, where only the
+    repos with requested changelogs are loaded with their other metadata, changelogs
+    for installed packages are read from the rpmdb.
+    The separate sack is dropped, when the main sack is reloaded.
+    Loading the other metadata can download it, so the changelogs must be read without
+    holding the sack lock, they have their own lock.
+    """
+
+    def __init__(self, backend) -> None:
+        self.backend = backend
+        self.base = backend.base
+        self._sack = None
+        self._loaded_repos = set()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, pkgs: list) -> list:
+        """ Get the changelogs for a list of DnfPkg (newest entries first), in the same order as pkgs """
+        with self._lock:
+            if self._generation != self.backend.generation:
+                self._sack = None
+                self._loaded_repos = set()
+                self._generation = self.backend.generation
+            return [self._changelog(po) for po in pkgs]
+
+    def _changelog(self, po) -> list:
+        if po.reponame == hawkey.SYSTEM_REPO_NAME:
+            changelog = self._rpmdb_changelog(po)
+        else:
+            changelog = self._repo_changelog(po)
+        return sorted(changelog, key=lambda entry: entry['timestamp'], reverse=True)
+
+    def _repo_changelog(self, po) -> list:
+        sack = self._repo_sack(po.reponame)
+        if sack is None:
+            return []
+        q = sack.query().filter(name=po.name, epoch=int(po.epoch), version=po.version,
+                                release=po.release, arch=po.arch, reponame=po.reponame)
+        for pkg in q:
+            return pkg.changelogs
+        return []
+
+    def _repo_sack(self, reponame: str):
+        """ Get the changelog sack, with the other metadata for a repo loaded
+
+        A libdnf repo is bound to the last sack it is loaded into, so the metadata files
+        of the repo is loaded into the changelog sack as a new hawkey repo.
+        """
+        if reponame in self._loaded_repos:
+            return self._sack
+        repo = self.base.repos.get(reponame)
+        if repo is None:
+            return None
+        log.debug(f'Loading changelogs for {reponame}')
+        with self.backend.repo_lock:
+            # the other metadata must only be loaded for this repo, not when the main sack is (re)loaded
+            repo.load_metadata_other = True
+            try:
+                repo.load()  # downloads the other metadata, if it is not in the cache
+            finally:
+                repo.load_metadata_other = False
+            metadata = hawkey.Repo(reponame)
+            # dnf has no public api for the repo cache directory
+            metadata.repomd_fn = os.path.join(repo._repo.getCachedir(), 'repodata', 'repomd.xml')
+            metadata.primary_fn = repo.get_metadata_path('primary')
+            metadata.other_fn = repo.get_metadata_path('other')
+        if self._sack is None:
+            self._sack = hawkey.Sack(arch=self.base.conf.substitutions['arch'], cachedir=self.base.conf.cachedir)
+        if metadata.other_fn:
+            # no solv cache, it would replace the cache of the main sack repo
+            self._sack.load_repo(metadata, build_cache=False, load_filelists=False,
+                                 load_presto=False, load_updateinfo=False, load_other=True)
+        else:
+            log.debug(f'No other metadata for {reponame}')
+        self._loaded_repos.add(reponame)
+        return self._sack
+
+    def _rpmdb_changelog(self, po) -> list:
+        ts = rpm.TransactionSet(self.base.conf.installroot)
+        for hdr in ts.dbMatch('name', po.name):
+            if (hdr[rpm.RPMTAG_VERSION] == po.version and hdr[rpm.RPMTAG_RELEASE] == po.release and
+                    hdr[rpm.RPMTAG_ARCH] == po.arch and (hdr[rpm.RPMTAG_EPOCH] or 0) == int(po.epoch)):
+                return [{'timestamp': datetime.date.fromtimestamp(timestamp), 'author': author, 'text': text}
+                        for timestamp, author, text in zip(hdr[rpm.RPMTAG_CHANGELOGTIME],
+                                                           hdr[rpm.RPMTAG_CHANGELOGNAME],
+                                                           hdr[rpm.RPMTAG_CHANGELOGTEXT])]
+        return []
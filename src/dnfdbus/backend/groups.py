@@ -21,6 +21,8 @@ dnfdbus.backend.groups module
 
 import dnf.comps
 
+from dnfdbus.misc import span
+
 CONDITIONAL = dnf.comps.CONDITIONAL
 DEFAULT = dnf.comps.DEFAULT
 MANDATORY = dnf.comps.MANDATORY
@@ -141,7 +143,8 @@ class DnfComps:
 
     def setup(self):
         self._backend.setup()
-        self._base.read_comps()
+        with span('read_comps'):
+            self._base.read_comps()
 
     @property
     def comps(self) -> dnf.comps.Comps:
@@ -0,0 +1,97 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+dnfdbus.backend.index module
+"""
+
+import bisect
+import re
+from fnmatch import translate
+from typing import Optional
+
+# Keys there can only match package names, glob with '*' and no nevra separators
+NAME_GLOB = re.compile(r'^[\w+*-]*\*[\w+*-]*$')
+
+NGRAM = 3
+
+
+class NameIndex:
+    """
+    Index for finding packages by name glob, without scanning the sack
+
+    The sorted names are used for prefix search, and an n-gram index
+    is used to find the candidate names for the substrings in the glob.
+    """
+
+    def __init__(self, pkgs: list) -> None:
+        self.pkgs = pkgs
+        by_name = {}
+        for ndx, pkg in enumerate(pkgs):
+            by_name.setdefault(pkg.name, []).append(ndx)
+        self.names = sorted(by_name)
+        self._pkg_ndx = [by_name[name] for name in self.names]
+        self._ngrams = {}
+        for name_ndx, name in enumerate(self.names):
+            for ngram in {name[i:i + NGRAM] for i in range(len(name) - NGRAM + 1)}:
+                self._ngrams.setdefault(ngram, []).append(name_ndx)
+
+    def __len__(self) -> int:
+        return len(self.pkgs)
+
+    @staticmethod
+    def is_name_glob(key: str) -> bool:
+        """ Check if key is a glob there only can match package names """
+        return bool(NAME_GLOB.match(key))
+
+    def match(self, key: str) -> Optional[list]:
+        """ Get the packages with a name matching the glob, in the same order as the sack
+
+        Return None if the key is not a name glob
+        """
+        if not self.is_name_glob(key):
+            return None
+        regex = re.compile(translate(key))
+        pkg_ndx = []
+        for name_ndx in self._candidates(key):
+            if regex.match(self.names[name_ndx]):
+                pkg_ndx.extend(self._pkg_ndx[name_ndx])
+        return [self.pkgs[ndx] for ndx in sorted(pkg_ndx)]
+
+    def _candidates(self, key: str):
+        """ Get the indexes of the names there can match the key """
+        parts = key.split('*')
+        if parts[0]:
+            start = bisect.bisect_left(self.names, parts[0])
+            end = bisect.bisect_left(self.names, parts[0] + '\U0010ffff', lo=start)
+            candidates = range(start, end)
+        else:
+            candidates = range(len(self.names))
+        ngrams = {part[i:i + NGRAM] for part in parts for i in range(len(part) - NGRAM + 1)}
+        if not ngrams:
+            return candidates
+        postings = sorted((self._ngrams.get(ngram, []) for ngram in ngrams), key=len)
+        if len(postings[0]) >= len(candidates):
+            return candidates
+        matches = set(postings[0])
+        for posting in postings[1:]:
+            matches.intersection_update(posting)
+            if not matches:
+                break
+        if len(candidates) < len(self.names):
+            matches = {ndx for ndx in matches if candidates.start <= ndx < candidates.stop}
+        return sorted(matches)
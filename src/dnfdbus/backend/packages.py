@@ -19,20 +19,34 @@
 dnfdbus.backend.packages module
 """
 
+import threading
+
 import dnf
 
+from .index import NameIndex
+from dnfdbus.misc import span
+
 
 class DnfPkg:
-    """ Wrapper for dnf po"""
+    """ Wrapper for dnf po
+
+    The nevra string is only made once, and the wrappers for the package lists
+    are reused for the lifetime of a sack generation (see DnfPackages).
+    """
+
+    __slots__ = ('pkg', '_nevra')
 
     def __init__(self, pkg) -> None:
         self.pkg = pkg
+        self._nevra = None
 
     def __str__(self):
-        if self.epoch == '0':
-            return f'{self.name}-{self.version}-{self.release}.{self.arch}'
-        else:
-            return f'{self.name}-{self.epoch}:{self.version}-{self.release}.{self.arch}'
+        if self._nevra is None:
+            if str(self.epoch) == '0':
+                self._nevra = f'{self.name}-{self.version}-{self.release}.{self.arch}'
+            else:
+                self._nevra = f'{self.name}-{self.epoch}:{self.version}-{self.release}.{self.arch}'
+        return self._nevra
 
     def __repr__(self):
         return f'DnfPkg({str(self.pkg)})'
@@ -57,6 +71,13 @@ class DnfPkg:
     def epoch(self):
         return self.pkg.epoch
 
+    @property
+    def evr(self):
+        if str(self.epoch) == '0':
+            return f'{self.version}-{self.release}'
+        else:
+            return f'{self.epoch}:{self.version}-{self.release}'
+
     @property
     def reponame(self):
         return self.pkg.reponame
@@ -79,11 +100,17 @@ class DnfPkg:
 
     @property
     def dump_list(self):
-        return [str(self.pkg), self.reponame, self.summary, self.size]
+        return [str(self), self.reponame, self.summary, self.size]
 
     @property
     def dump(self) -> str:
-        return [str(self.pkg), self.reponame]
+        return [str(self), self.reponame]
+
+    @property
+    def dump_fields(self) -> tuple:
+        """ Get (name, epoch, version, release, arch, reponame, summary, size) """
+        return (self.name, str(self.epoch), self.version, self.release, self.arch, self.reponame,
+                self.summary, self.size)
 
 
 class DnfPackages:
@@ -91,37 +118,59 @@ class DnfPackages:
     def __init__(self, backend) -> None:
         self.backend = backend
         self.base = backend.base
+        self._rows = {}
+        self._rows_generation = 0
+        self._rows_lock = threading.RLock()  # the name index is made from the cached rows
+
+    def _cached(self, key: str, make):
+        """ Get a value made from the sack, it is only made once for a sack generation
+
+        The value is shared between callers and must not be changed.
+        """
+        self.backend.setup()
+        with self.backend.lock.read():
+            with self._rows_lock:
+                if self._rows_generation != self.backend.generation:
+                    self._rows = {}
+                    self._rows_generation = self.backend.generation
+                if key not in self._rows:
+                    with span('make_rows', key=key):
+                        self._rows[key] = make()
+                return self._rows[key]
+
+    def _query_rows(self, key: str, make_query) -> list:
+        """ Get the DnfPkg rows for a query on the sack, made once for a sack generation """
+        return self._cached(key, lambda: [DnfPkg(pkg) for pkg in make_query(self.base.sack.query())])
+
+    @property
+    def name_index(self) -> NameIndex:
+        """ Get the name index for the current sack, it is build the first time it is used for a generation """
+        return self._cached('name_index', lambda: NameIndex(self.all))
+
+    @property
+    def all(self):
+        """ Get list of all packages"""
+        return self._query_rows('all', lambda q: q)
 
     @property
     def installed(self):
         """ Get list of installed packages"""
-        self.backend.setup()
-        q = self.base.sack.query()
-        q = q.installed()
-        return [DnfPkg(pkg) for pkg in q]
+        return self._query_rows('installed', lambda q: q.installed())
 
     @property
     def available(self):
         """ Get list of lastest available packages"""
-        self.backend.setup()
-        q = self.base.sack.query().available().latest()
-        return [DnfPkg(pkg) for pkg in q]
+        return self._query_rows('available', lambda q: q.available().latest())
 
     @property
     def available_all(self):
         """ Get list of all available packages"""
-        self.backend.setup()
-        q = self.base.sack.query()
-        q = q.available()
-        return [DnfPkg(pkg) for pkg in q]
+        return self._query_rows('available_all', lambda q: q.available())
 
     @property
     def updates(self):
         """ Get list of all available packages"""
-        self.backend.setup()
-        q = self.base.sack.query()
-        q = q.upgrades().latest()
-        return [DnfPkg(pkg) for pkg in q]
+        return self._query_rows('updates', lambda q: q.upgrades().latest())
 
     def find_pkg(self, nevra, reponame):
         """ find packages the match a nevra and reponame """
@@ -129,25 +178,46 @@ class DnfPackages:
         if reponame == "":
             reponame = None
         subject = dnf.subject.Subject(nevra)  # type: ignore
-        q = subject.get_best_selector(
-            self.base.sack, reponame=reponame).matches()
-        return [DnfPkg(pkg) for pkg in q]
+        with self.backend.lock.read(), span('find_pkg', nevra=nevra, reponame=reponame):
+            q = subject.get_best_selector(
+                self.base.sack, reponame=reponame).matches()
+            return [DnfPkg(pkg) for pkg in q]
+
+    def by_nevras(self, nevras: list):
+        """ find the packages matching a list of nevras, in a single query """
+        self.backend.setup()
+        with self.backend.lock.read(), span('by_nevras', count=len(nevras)):
+            q = self.base.sack.query().filter(nevra=list(nevras))
+            return [DnfPkg(pkg) for pkg in q]
 
     def by_key(self, key):
-        """ find packages the match a key (Ex. '*qt6*') """
+        """ find packages the match a key (Ex. '*qt6*')
+
+        Name globs is looked up in the name index, other keys (nevra, provides etc.)
+        and globs not matching any names are resolved by dnf.
+        A name glob has no '.', so the name form is the first form dnf can match it with,
+        and like dnf the index gives all the versions and archs, not only the latest.
+        """
         self.backend.setup()
+        if NameIndex.is_name_glob(key):
+            with self.backend.lock.read(), span('by_key_index', key=key):
+                pkgs = self.name_index.match(key)
+                if pkgs:
+                    return pkgs
         subject = dnf.subject.Subject(key)  # type: ignore
-        q = subject.get_best_query(self.base.sack)
-        return [DnfPkg(pkg) for pkg in q]
+        with self.backend.lock.read(), span('by_key_query', key=key):
+            q = subject.get_best_query(self.base.sack)
+            return [DnfPkg(pkg) for pkg in q]
 
     def by_filter(self, flt):
         """ find packages the match a key (Ex. '*qt6*') """
         self.backend.setup()
-        if flt == 'installed':
-            return self.installed
-        if flt == 'available':
-            return self.available
-        if flt == 'updates':
-            return self.updates
-        else:
-            return []
+        with span('by_filter', flt=flt):
+            if flt == 'installed':
+                return self.installed
+            if flt == 'available':
+                return self.available
+            if flt == 'updates':
+                return self.updates
+            else:
+                return []
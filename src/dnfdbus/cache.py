@@ -0,0 +1,118 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+dnfdbus.cache module
+"""
+
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+# number of items in a list, the size of the list is estimated from
+SAMPLE_ITEMS = 16
+
+
+def estimate_size(value) -> int:
+    """ Estimate the size of a result in bytes, from the strings and DBus values in it
+
+    The size of a list is estimated from a sample of its items, so large listings are cheap to measure.
+    """
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return 0
+        sample = value[::max(1, len(value) // SAMPLE_ITEMS)]
+        return sum(estimate_size(item) for item in sample) * len(value) // len(sample)
+    get_size = getattr(value, 'get_size', None)  # GLib.Variant
+    if get_size is not None:
+        return get_size()
+    return 8
+
+
+class ResultCache:
+    """
+    LRU cache for method results, keyed on (method, arguments, sack generation)
+
+    Results from an older sack generation are never returned, and the cache
+    should be cleared when the sack is reloaded.
+    The cache holds max. maxsize results and, if maxbytes > 0, results of max. maxbytes
+    in total (measured by sizeof), a result larger than maxbytes is not cached.
+    """
+
+    def __init__(self, maxsize: int, maxbytes: int = 0, sizeof=estimate_size) -> None:
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()  # (key, generation) -> (value, size)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def stats(self) -> dict:
+        return {'size': len(self._cache), 'maxsize': self.maxsize, 'bytes': self.nbytes,
+                'maxbytes': self.maxbytes, 'hits': self.hits, 'misses': self.misses}
+
+    def get(self, key: tuple, generation: int, default=None):
+        """ Get the cached value for key and generation or default if not cached """
+        with self._lock:
+            entry = self._cache.get((key, generation))
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._cache.move_to_end((key, generation))
+            return entry[0]
+
+    def put(self, key: tuple, generation: int, value) -> None:
+        """ Cache value for key and generation, dropping the least recently used values if full"""
+        if self.maxsize <= 0:
+            return
+        size = self.sizeof(value) if self.maxbytes > 0 else 0
+        if size > self.maxbytes > 0:
+            return
+        with self._lock:
+            old = self._cache.pop((key, generation), None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._cache[(key, generation)] = (value, size)
+            self.nbytes += size
+            while len(self._cache) > self.maxsize or self.nbytes > self.maxbytes > 0:
+                _key, (_value, dropped) = self._cache.popitem(last=False)
+                self.nbytes -= dropped
+
+    def get_or_call(self, key: tuple, generation: int, func):
+        """ Get the cached value for key and generation, calling func to get it if not cached"""
+        value = self.get(key, generation, _MISSING)
+        if value is _MISSING:
+            value = func()
+            self.put(key, generation, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.nbytes = 0
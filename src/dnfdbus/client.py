@@ -17,12 +17,14 @@
 
 """ Module for client code to talk with the DBus Backend daemon"""
 
+import datetime
 import json
 from dataclasses import dataclass
-from functools import partial
+from functools import partial, wraps
 
-from dnfdbus.misc import to_nevra, log, AsyncDbusCaller
-from dnfdbus.server import DNFDBUS
+from dnfdbus.cache import ResultCache
+from dnfdbus.misc import to_evr, to_nevra, log, AsyncDbusCaller, AsyncioDbusCaller
+from dnfdbus.interface import CACHE_SIZE, DNFDBUS, DNFDBUS_V2, PAGE_SIZE, SYSTEM_BUS
 from dasbus.loop import EventLoop
 
 
@@ -37,22 +39,39 @@ class Repository:
         self.__dict__.update(attr)
 
 
-@dataclass
 class Package:
     """ Wrapper class for a dnf package"""
-    name: str
-    epoch: str
-    version: str
-    release: str
-    arch: str
-    reponame: str
-    summary: str = ""
-    size: int = 0
+
+    __slots__ = ('name', 'epoch', 'version', 'release', 'arch', 'reponame', 'summary', 'size')
 
     def __init__(self, pkg: str, reponame: str) -> None:
         self.reponame = reponame
         self.name, self.epoch, self.version, self.release, self.arch = to_nevra(
             pkg)
+        self.summary = ""
+        self.size = 0
+
+    @classmethod
+    def from_fields(cls, name: str, epoch: str, version: str, release: str, arch: str,
+                    reponame: str, summary: str = "", size: int = 0) -> 'Package':
+        """ Make a Package from already split NEVRA fields """
+        po = cls.__new__(cls)
+        po.name = name
+        po.epoch = epoch
+        po.version = version
+        po.release = release
+        po.arch = arch
+        po.reponame = reponame
+        po.summary = summary
+        po.size = size
+        return po
+
+    def __eq__(self, other) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, attr) == getattr(other, attr) for attr in self.__slots__)
+
+    __hash__ = None
 
     def __repr__(self) -> str:
         return f'Package({str(self)})'
@@ -64,17 +83,89 @@ class Package:
             return f'{self.name}-{self.epoch}:{self.version}-{self.release}.{self.arch}'
 
 
+def _make_package(elem: tuple) -> Package:
+    """ Make a Package from a (pkg, reponame) or (pkg, reponame, summary, size) tuple """
+    po = Package(elem[0], elem[1])
+    if len(elem) > 2:
+        po.summary = elem[2]
+        po.size = elem[3]
+    return po
+
+
+def _packages_from_columns(columns: dict) -> list:
+    """ Make Packages from the columnar format returned by GetPackagesByFilterColumns """
+    arches = columns['arches']
+    repos = columns['repos']
+    res = []
+    for name, evr, arch_index, repo_index in zip(columns['names'], columns['evrs'],
+                                                 columns['arch_index'], columns['repo_index']):
+        epoch, version, release = to_evr(evr)
+        res.append(Package.from_fields(name, epoch, version, release,
+                                       arches[arch_index], repos[repo_index]))
+    if 'summaries' in columns:
+        for po, summary, size in zip(res, columns['summaries'], columns['sizes']):
+            po.summary = summary
+            po.size = size
+    return res
+
+
+def _since(since: datetime.date) -> str:
+    return since.isoformat() if since else ''
+
+
+def _installed_since(installed: list):
+    """ Get the day before the newest installed changelog entry
+
+    An update can have entries from the same day as it (a rebuild), they are
+    fetched too and the entries there are installed is removed by _new_entries.
+    """
+    if not installed:
+        return None
+    return datetime.date.fromisoformat(installed[0][2][:10]) - datetime.timedelta(days=1)
+
+
+def _new_entries(entries: list, installed: list) -> list:
+    """ Get the changelog entries there are not in the installed changelog """
+    known = {tuple(entry[2:]) for entry in installed}
+    return [entry for entry in entries if tuple(entry[2:]) not in known]
+
+
+def cached(method):
+    """
+    Cache the result of a client method, when the client cache is enabled
+
+    The results is keyed on the method name, arguments and the sack generation of the daemon,
+    the cached values is shared between callers and must not be changed.
+    """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.cache is None:
+            return method(self, *args, **kwargs)
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        return self.cache.get_or_call(key, self.generation, lambda: method(self, *args, **kwargs))
+
+    return wrapper
+
+
+# used for the timeout argument, when the client default timeout should be used
+DEFAULT_TIMEOUT = object()
+
+# number of installed changelog entries, the update changelog entries is compared with
+INSTALLED_ENTRIES = 20
 
 # Classes
 
 class DnfDbusSignals:
-    SIGNALS = ['Message', 'Progress']
+    SIGNALS = ['Message', 'Progress', 'Ready', 'SackChanged']
 
     def __init__(self, loop: EventLoop):
         self.proxy = DNFDBUS.get_proxy()
         self.proxy.Message.connect(self.message)
         self.proxy.Progress.connect(self.progress)
         self.proxy.Quitting.connect(self.quitting)
+        self.proxy.Ready.connect(self.ready)
+        self.proxy.SackChanged.connect(self.sack_changed)
         self.loop = loop
 
     def message(self, msg: str):
@@ -87,13 +178,46 @@ class DnfDbusSignals:
         print('Daemon is quitting')
         self.loop.quit()
 
+    def ready(self):
+        print('Daemon package sack is ready')
+
+    def sack_changed(self, generation: int):
+        print(f'Daemon package sack changed: {generation=}')
+
 
 class DnfDbusClient:
-    """Wrapper class for the dk.rasmil.DnfDbus Dbus object"""
+    """Wrapper class for the dk.rasmil.DnfDbus Dbus object
 
-    def __init__(self):
+    With cache=True the results of the read methods are cached, until the daemon signals
+    the package sack has changed or the daemon exits (the signals is received by the GLib main loop).
+    """
+
+    def __init__(self, cache: bool = False, cache_size: int = CACHE_SIZE):
         self.proxy = DNFDBUS.get_proxy()
+        self.proxy_v2 = DNFDBUS.get_proxy(DNFDBUS_V2)
         self.async_dbus = AsyncDbusCaller()
+        self.cache = None
+        self.generation = 0
+        if cache:
+            self.enable_cache(cache_size)
+
+    def enable_cache(self, cache_size: int = CACHE_SIZE) -> None:
+        """ Cache the results of the read methods, until the package sack changes """
+        self.cache = ResultCache(cache_size)
+        self.proxy.SackChanged.connect(self._sack_changed)
+        SYSTEM_BUS.proxy.NameOwnerChanged.connect(self._name_owner_changed)
+        self.generation = self.proxy.Generation
+
+    def _sack_changed(self, generation: int) -> None:
+        log.debug(f'Sack changed : {generation=}')
+        self.generation = generation
+        self.cache.clear()
+
+    def _name_owner_changed(self, name: str, _old_owner: str, new_owner: str) -> None:
+        """ Clear the cache when the daemon exits, the sack can change before it is started again """
+        if name == DNFDBUS.service_name:
+            log.debug(f'Daemon name owner changed : {new_owner=}')
+            self.cache.clear()
 
     def __enter__(self):
         return self
@@ -104,6 +228,11 @@ class DnfDbusClient:
         self.quit()
 
     def get_async_method(self, method):
+        """ Get a method from the v2 interface, returning native DBus types """
+        return partial(self.async_dbus.call_native, getattr(self.proxy_v2, method))
+
+    def get_async_json_method(self, method):
+        """ Get a method from the v1 interface, returning JSON strings """
         return partial(self.async_dbus.call, getattr(self.proxy, method))
 
     @property
@@ -111,53 +240,102 @@ class DnfDbusClient:
         """ Get the version from dk.rasmil.DnfDbus daemon"""
         return self.proxy.Version
 
+    @property
+    def state(self) -> str:
+        """ Get the package sack state from dk.rasmil.DnfDbus daemon ('idle', 'loading', 'ready', 'error')"""
+        return self.proxy.State
+
     def quit(self) -> None:
         """ Quit the dk.rasmil.DnfDbus daemon"""
         self.proxy.Quit()
 
+    @cached
     def get_repositories(self) -> list:
         """ Get all configured repositories """
         GetRepositories = self.get_async_method('GetRepositories')
         repos = GetRepositories()
         return [Repository(repo) for repo in repos]
 
-    def get_packages_by_key(self, key: str) -> list:
+    @cached
+    def get_packages_by_key(self, key: str, fields: bool = False) -> list:
         """ Get packages that matches a key
 
         Args:
             key: key with wildcards for packages to matck
+            fields: get the nevra as separate fields, so it don't have to be parsed
 
         Returns:
             list of packages
         """
+        if fields:
+            GetPackagesByKeyFields = self.get_async_method('GetPackagesByKeyFields')
+            return [Package.from_fields(*elem) for elem in GetPackagesByKeyFields(key)]
         GetPackagesByKey = self.get_async_method('GetPackagesByKey')
         pkgs = GetPackagesByKey(key)
         return [Package(elem[0], elem[1]) for elem in pkgs]
 
-    def get_packages_by_filter(self, flt: str, extra: bool = False) -> list:
+    @cached
+    def get_packages_by_filter(self, flt: str, extra: bool = False, compact: bool = False,
+                               fields: bool = False) -> list:
         """ Get packages that matches a filter
 
         Args:
             flt: package filter ('installed', 'updates')
             extra: get extra info on packages flag (summary & size)
+            compact: use the compact columnar transfer format (for big lists)
+            fields: get the nevra as separate fields, so it don't have to be parsed
 
         Returns:
             list of packages
         """
+        if fields:
+            GetPackagesByFilterFields = self.get_async_method('GetPackagesByFilterFields')
+            return [Package.from_fields(*elem) for elem in GetPackagesByFilterFields(flt, extra)]
+        if compact:
+            GetPackagesByFilterColumns = self.get_async_method('GetPackagesByFilterColumns')
+            return _packages_from_columns(GetPackagesByFilterColumns(flt, extra))
         GetPackagesByFilter = self.get_async_method('GetPackagesByFilter')
         pkgs = GetPackagesByFilter(flt, extra)
-        if extra:
-            res = []
-            for elem in pkgs:
-                pkg, repo, summary, size = elem
-                po = Package(pkg, repo)
-                po.summary = summary
-                po.size = size
-                res.append(po)
-            return res
-        else:
-            return [Package(elem[0], elem[1]) for elem in pkgs]
+        return [_make_package(elem) for elem in pkgs]
+
+    def iter_packages_by_key(self, key: str, page_size: int = PAGE_SIZE):
+        """ Iterate over packages that matches a key, fetching a page at the time
+
+        Args:
+            key: key with wildcards for packages to match
+            page_size: number of packages to fetch in each call to the daemon
+
+        Yields:
+            packages
+        """
+        GetPackagesByKeyPaged = self.get_async_method('GetPackagesByKeyPaged')
+        yield from self._iter_pages(partial(GetPackagesByKeyPaged, key), page_size)
+
+    def iter_packages_by_filter(self, flt: str, extra: bool = False, page_size: int = PAGE_SIZE):
+        """ Iterate over packages that matches a filter, fetching a page at the time
+
+        Args:
+            flt: package filter ('installed', 'available', 'updates')
+            extra: get extra info on packages flag (summary & size)
+            page_size: number of packages to fetch in each call to the daemon
 
+        Yields:
+            packages
+        """
+        GetPackagesByFilterPaged = self.get_async_method('GetPackagesByFilterPaged')
+        yield from self._iter_pages(partial(GetPackagesByFilterPaged, flt, extra), page_size)
+
+    def _iter_pages(self, get_page, page_size: int, make=_make_package):
+        """ Call get_page(cursor, limit) until the daemon returns no more pages """
+        cursor = ''
+        while True:
+            elems, cursor = get_page(cursor, page_size)
+            for elem in elems:
+                yield make(elem)
+            if not cursor:
+                break
+
+    @cached
     def get_package_attribute(self, pkg: str, reponame: str, attribute: str):
         """ Get Atrributes for a package filter
 
@@ -172,10 +350,220 @@ class DnfDbusClient:
         GetPackageAttribute = self.get_async_method('GetPackageAttribute')
         return GetPackageAttribute(pkg, reponame, attribute)
 
+    @cached
+    def get_changelog(self, pkg: str, reponame: str = "", since: datetime.date = None, limit: int = 0) -> list:
+        """ Get the newest changelog entries for package(s)
+
+        Args:
+            pkg: package filter (can include wildcards)
+            reponame: reponame to limit to a given repo ("" = all repos)
+            since: only get entries newer than this date (None = all entries)
+            limit: max. number of entries (0 = all entries)
+
+        Returns:
+            list of (packagename, reponame, date, author, text), newest first
+        """
+        if limit > 0:
+            GetPackageChangelog = self.get_async_method('GetPackageChangelog')
+            entries, _cursor = GetPackageChangelog(pkg, reponame, _since(since), '', limit)
+            return entries
+        return list(self.iter_changelog(pkg, reponame, since))
+
+    def iter_changelog(self, pkg: str, reponame: str = "", since: datetime.date = None,
+                       page_size: int = PAGE_SIZE):
+        """ Iterate over the changelog entries for package(s), newest first, fetching a page at the time
+
+        Args:
+            pkg: package filter (can include wildcards)
+            reponame: reponame to limit to a given repo ("" = all repos)
+            since: only get entries newer than this date (None = all entries)
+            page_size: number of entries to fetch in each call to the daemon
+
+        Yields:
+            (packagename, reponame, date, author, text)
+        """
+        GetPackageChangelog = self.get_async_method('GetPackageChangelog')
+        get_page = partial(GetPackageChangelog, pkg, reponame, _since(since))
+        yield from self._iter_pages(get_page, page_size, make=tuple)
+
+    def get_update_changelog(self, pkg: Package) -> list:
+        """ Get the changelog entries for an update, there are newer than the installed version
+
+        Args:
+            pkg: the update package
+
+        Returns:
+            list of (packagename, reponame, date, author, text), newest first
+        """
+        installed = self.get_changelog(f'{pkg.name}.{pkg.arch}', '@System', limit=INSTALLED_ENTRIES)
+        return _new_entries(self.get_changelog(str(pkg), pkg.reponame, _installed_since(installed)), installed)
+
+    def get_package_attributes(self, pkgs: list, attributes: list) -> list:
+        """ Get many attributes for many packages in a single call
+
+        Args:
+            pkgs: list of Packages or package nevras
+            attributes: attributes to return
+
+        Returns:
+            list with (packagename, reponame, dict with the attribute values) for each package found
+        """
+        GetPackageAttributes = self.get_async_method('GetPackageAttributes')
+        return GetPackageAttributes([str(pkg) for pkg in pkgs], list(attributes))
+
+    def refresh_repositories(self) -> dict:
+        """ Refresh the repository metadata, the sack is only reloaded if some repos have changed
+
+        Returns:
+            dict with the 'changed' repo ids, per repo load 'timings' and sack 'reload' time in seconds
+        """
+        RefreshRepositories = self.get_async_method('RefreshRepositories')
+        return RefreshRepositories()
+
+    @cached
     def get_categories(self):
         GetCategories = self.get_async_method('GetCategories')
         return GetCategories()
 
+    @cached
     def get_groups_by_category(self, cat_id):
         GetGroupsByCategory = self.get_async_method('GetGroupsByCategory')
-        return GetGroupsByCategory(cat_id)
\ No newline at end of file
+        return GetGroupsByCategory(cat_id)
+
+
+class AsyncDnfDbusClient:
+    """asyncio wrapper class for the dk.rasmil.DnfDbus Dbus object
+
+    All methods are coroutines, so many calls can be in flight at the same time
+    (Ex. asyncio.gather() for attributes of a list of packages).
+    timeout is the default timeout in seconds for each call (None = no timeout),
+    all methods take a timeout argument to override it for a single call.
+    """
+
+    def __init__(self, timeout: float = None, glib_thread: bool = True):
+        self.proxy = DNFDBUS.get_proxy()
+        self.proxy_v2 = DNFDBUS.get_proxy(DNFDBUS_V2)
+        self.timeout = timeout
+        self.async_dbus = AsyncioDbusCaller(glib_thread)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_traceback):
+        if exc_type:
+            log.debug(f'{exc_type=} {exc_value=} {exc_traceback=}')
+        await self.quit()
+
+    async def call(self, method: str, *args, timeout=DEFAULT_TIMEOUT):
+        """ Call a method on the v2 interface, returning native DBus types """
+        return await self._call(getattr(self.proxy_v2, method), *args, timeout=timeout)
+
+    async def _call(self, mth, *args, timeout=DEFAULT_TIMEOUT):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.timeout
+        return await self.async_dbus.call(mth, *args, timeout=timeout)
+
+    async def _get_property(self, name: str):
+        import asyncio  # imported when used, to keep the client import fast
+        # properties is read with a blocking call, so do it in a thread
+        return await asyncio.get_running_loop().run_in_executor(None, getattr, self.proxy, name)
+
+    async def get_version(self) -> str:
+        """ Get the version from dk.rasmil.DnfDbus daemon"""
+        return await self._get_property('Version')
+
+    async def get_state(self) -> str:
+        """ Get the package sack state from dk.rasmil.DnfDbus daemon ('idle', 'loading', 'ready', 'error')"""
+        return await self._get_property('State')
+
+    async def quit(self, timeout=DEFAULT_TIMEOUT) -> None:
+        """ Quit the dk.rasmil.DnfDbus daemon"""
+        await self._call(self.proxy.Quit, timeout=timeout)
+
+    async def get_repositories(self, timeout=DEFAULT_TIMEOUT) -> list:
+        """ Get all configured repositories """
+        repos = await self.call('GetRepositories', timeout=timeout)
+        return [Repository(repo) for repo in repos]
+
+    async def get_packages_by_key(self, key: str, fields: bool = False, timeout=DEFAULT_TIMEOUT) -> list:
+        """ Get packages that matches a key (see DnfDbusClient.get_packages_by_key) """
+        if fields:
+            pkgs = await self.call('GetPackagesByKeyFields', key, timeout=timeout)
+            return [Package.from_fields(*elem) for elem in pkgs]
+        pkgs = await self.call('GetPackagesByKey', key, timeout=timeout)
+        return [Package(elem[0], elem[1]) for elem in pkgs]
+
+    async def get_packages_by_filter(self, flt: str, extra: bool = False, compact: bool = False,
+                                     fields: bool = False, timeout=DEFAULT_TIMEOUT) -> list:
+        """ Get packages that matches a filter (see DnfDbusClient.get_packages_by_filter) """
+        if fields:
+            pkgs = await self.call('GetPackagesByFilterFields', flt, extra, timeout=timeout)
+            return [Package.from_fields(*elem) for elem in pkgs]
+        if compact:
+            columns = await self.call('GetPackagesByFilterColumns', flt, extra, timeout=timeout)
+            return _packages_from_columns(columns)
+        pkgs = await self.call('GetPackagesByFilter', flt, extra, timeout=timeout)
+        return [_make_package(elem) for elem in pkgs]
+
+    async def iter_packages_by_key(self, key: str, page_size: int = PAGE_SIZE, timeout=DEFAULT_TIMEOUT):
+        """ Iterate over packages that matches a key, fetching a page at the time """
+        async for elem in self._iter_pages('GetPackagesByKeyPaged', (key,), page_size, timeout):
+            yield _make_package(elem)
+
+    async def iter_packages_by_filter(self, flt: str, extra: bool = False, page_size: int = PAGE_SIZE,
+                                      timeout=DEFAULT_TIMEOUT):
+        """ Iterate over packages that matches a filter, fetching a page at the time """
+        async for elem in self._iter_pages('GetPackagesByFilterPaged', (flt, extra), page_size, timeout):
+            yield _make_package(elem)
+
+    async def _iter_pages(self, method: str, args: tuple, page_size: int, timeout):
+        """ Call the paged method until the daemon returns no more pages """
+        cursor = ''
+        while True:
+            elems, cursor = await self.call(method, *args, cursor, page_size, timeout=timeout)
+            for elem in elems:
+                yield elem
+            if not cursor:
+                break
+
+    async def get_package_attribute(self, pkg: str, reponame: str, attribute: str, timeout=DEFAULT_TIMEOUT):
+        """ Get Atrributes for a package filter (see DnfDbusClient.get_package_attribute) """
+        return await self.call('GetPackageAttribute', pkg, reponame, attribute, timeout=timeout)
+
+    async def get_package_attributes(self, pkgs: list, attributes: list, timeout=DEFAULT_TIMEOUT) -> list:
+        """ Get many attributes for many packages in a single call """
+        return await self.call('GetPackageAttributes', [str(pkg) for pkg in pkgs], list(attributes),
+                               timeout=timeout)
+
+    async def get_changelog(self, pkg: str, reponame: str = "", since: datetime.date = None, limit: int = 0,
+                            timeout=DEFAULT_TIMEOUT) -> list:
+        """ Get the newest changelog entries for package(s) (see DnfDbusClient.get_changelog) """
+        if limit > 0:
+            entries, _cursor = await self.call('GetPackageChangelog', pkg, reponame, _since(since), '', limit,
+                                               timeout=timeout)
+            return entries
+        return [entry async for entry in self.iter_changelog(pkg, reponame, since, timeout=timeout)]
+
+    async def iter_changelog(self, pkg: str, reponame: str = "", since: datetime.date = None,
+                             page_size: int = PAGE_SIZE, timeout=DEFAULT_TIMEOUT):
+        """ Iterate over the changelog entries for package(s), newest first, fetching a page at the time """
+        async for elem in self._iter_pages('GetPackageChangelog', (pkg, reponame, _since(since)),
+                                           page_size, timeout):
+            yield tuple(elem)
+
+    async def get_update_changelog(self, pkg: Package, timeout=DEFAULT_TIMEOUT) -> list:
+        """ Get the changelog entries for an update, there are newer than the installed version """
+        installed = await self.get_changelog(f'{pkg.name}.{pkg.arch}', '@System', limit=INSTALLED_ENTRIES,
+                                             timeout=timeout)
+        entries = await self.get_changelog(str(pkg), pkg.reponame, _installed_since(installed), timeout=timeout)
+        return _new_entries(entries, installed)
+
+    async def refresh_repositories(self, timeout=DEFAULT_TIMEOUT) -> dict:
+        """ Refresh the repository metadata, the sack is only reloaded if some repos have changed """
+        return await self.call('RefreshRepositories', timeout=timeout)
+
+    async def get_categories(self, timeout=DEFAULT_TIMEOUT):
+        return await self.call('GetCategories', timeout=timeout)
+
+    async def get_groups_by_category(self, cat_id, timeout=DEFAULT_TIMEOUT):
+        return await self.call('GetGroupsByCategory', cat_id, timeout=timeout)
@@ -0,0 +1,143 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+"""
+dnfdbus.idle module
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from dnfdbus.misc import log
+
+# Default location of the daemon state, kept between runs
+STATE_PATH = '/var/cache/dnfdbus/state.json'
+
+# Default number of seconds without calls, before the daemon exits (0 = never exit)
+IDLE_TIMEOUT = 600
+
+# Max. number of seconds between checking if the daemon is idle
+IDLE_CHECK_INTERVAL = 30
+
+
+class IdleMonitor:
+    """ Track the calls in progress and the time of the last call, to find out when the daemon is idle """
+
+    def __init__(self, timeout: int = IDLE_TIMEOUT) -> None:
+        self.timeout = timeout
+        self._active = 0
+        self._last_activity = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def check_interval(self) -> int:
+        """ Number of seconds between the idle checks """
+        return max(1, min(self.timeout, IDLE_CHECK_INTERVAL))
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def call_started(self) -> None:
+        with self._lock:
+            self._active += 1
+            self._last_activity = time.monotonic()
+
+    def call_ended(self) -> None:
+        with self._lock:
+            self._active -= 1
+            self._last_activity = time.monotonic()
+
+    def idle_time(self) -> float:
+        """ Seconds since the last call ended, 0 if calls are in progress """
+        with self._lock:
+            if self._active:
+                return 0.0
+            return time.monotonic() - self._last_activity
+
+    def is_idle(self) -> bool:
+        """ Has the daemon been without calls for the idle timeout """
+        return self.timeout > 0 and self.idle_time() >= self.timeout
+
+
+class Reactivation:
+    """
+    Metrics of how fast the daemon is ready to serve calls after it is started
+
+    The times are seconds since the process was started, the downtime is the seconds
+    since the previous run exited, when it exited because it was idle.
+    """
+
+    def __init__(self, started: Optional[float] = None) -> None:
+        self.started = time.monotonic() if started is None else started
+        self.started_at = time.time() - (time.monotonic() - self.started)
+        self.reactivated = False
+        self.downtime = None
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def previous_run(self, state: dict) -> None:
+        """ Set the state saved by the previous run """
+        exited = state.get('exited')
+        if state.get('reason') == 'idle' and isinstance(exited, (int, float)):
+            self.reactivated = True
+            self.downtime = round(max(0.0, self.started_at - exited), 3)
+            log.info(f'Reactivated after idle exit, down for {self.downtime}s')
+
+    def mark(self, name: str) -> None:
+        """ Record the time of the first time something happened (Ex. 'first_reply') """
+        with self._lock:
+            if name in self.metrics:
+                return
+            self.metrics[name] = round(time.monotonic() - self.started, 3)
+        log.info(f'Startup : {name} after {self.metrics[name]}s')
+
+    def as_dict(self) -> dict:
+        res = {'reactivated': self.reactivated, **self.metrics}
+        if self.downtime is not None:
+            res['downtime'] = self.downtime
+        return res
+
+
+def save_state(path: str, state: dict) -> None:
+    """ Write the daemon state, replacing the old one atomically """
+    dirname = os.path.dirname(path)
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.state-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_state(path: str) -> dict:
+    """ Read the daemon state, an empty dict if it is missing or unreadable """
+    try:
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        log.warning(f'Could not read the daemon state {path} : {e}')
+        return {}
+    return state if isinstance(state, dict) else {}
@@ -0,0 +1,87 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+""" Module with the DBus service identifiers, errors and types shared by the daemon and the clients
+
+It must stay lightweight, it is imported by the clients and must not import dnf or the backend.
+"""
+
+from dasbus.connection import SystemMessageBus
+from dasbus.error import DBusError, ErrorMapper, get_error_decorator
+from dasbus.identifier import DBusObjectIdentifier, DBusServiceIdentifier
+from dasbus.typing import Str, Tuple, UInt64
+
+# Constants
+SYSTEM_BUS = SystemMessageBus()
+
+DNFDBUS_NAMESPACE = ("dk", "rasmil", "DnfDbus")
+
+DNFDBUS = DBusServiceIdentifier(
+    namespace=DNFDBUS_NAMESPACE,
+    message_bus=SYSTEM_BUS
+)
+
+# v2 interface, using native DBus types instead of JSON strings
+DNFDBUS_V2 = DBusObjectIdentifier(
+    namespace=DNFDBUS_NAMESPACE,
+    basename="V2"
+)
+
+VERSION = "1.0"
+
+# Default number of packages returned in a page by the paged methods
+PAGE_SIZE = 500
+
+# Default number of worker threads running the backend calls
+WORKERS = 4
+
+# Default max. number of results in the result cache
+CACHE_SIZE = 64
+
+# Default max. size of the results in the daemon result cache (MiB)
+CACHE_MB = 32
+
+# Create an error mapper.
+ERROR_MAPPER = ErrorMapper()
+
+# Create a decorator for DBus errors and use it to map
+# the class ExampleError to the name my.example.Error.
+dbus_error = get_error_decorator(ERROR_MAPPER)
+
+
+@dbus_error("AccessDeniedError", namespace=DNFDBUS_NAMESPACE)
+class AccessDeniedError(DBusError):
+    pass
+
+
+@dbus_error("InvalidCursorError", namespace=DNFDBUS_NAMESPACE)
+class InvalidCursorError(DBusError):
+    pass
+
+
+@dbus_error("InvalidArgumentError", namespace=DNFDBUS_NAMESPACE)
+class InvalidArgumentError(DBusError):
+    pass
+
+
+# DBus types used by the v2 interface
+PackageType = Tuple[Str, Str]  # (nevra, reponame)
+PackageExtraType = Tuple[Str, Str, Str, UInt64]  # (nevra, reponame, summary, size)
+# (name, epoch, version, release, arch, reponame, summary, size)
+PackageFieldsType = Tuple[Str, Str, Str, Str, Str, Str, Str, UInt64]
+GroupType = Tuple[Str, Str, Str, Str]  # (id, name, ui_name, ui_description)
+ChangelogType = Tuple[Str, Str, Str, Str, Str]  # (nevra, reponame, date, author, text)
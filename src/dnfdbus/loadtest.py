@@ -0,0 +1,215 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+"""
+Concurrent load generator for the daemon
+
+Starts a number of client processes, each with its own bus connection like a desktop
+session, replaying a weighted mix of calls for a while, and reports the p50/p95/p99
+latency and the throughput of each call type.
+
+Usage: python3 -m dnfdbus.loadtest [--clients 8] [--duration 30] [--mix key=4,filter=1,attribute=4,groups=1]
+           [--address <bus address>]
+
+--address runs against a daemon on a private bus (Ex. benchmarks/bench_load.py), instead of the system bus.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+
+# Default number of client processes
+CLIENTS = 8
+
+# Default number of seconds to run the load
+DURATION = 30
+
+# Default weights of the call types
+MIX = {'key': 4, 'filter': 1, 'attribute': 4, 'groups': 1}
+
+KEYS = ('*python3*', 'bash', 'kernel*', 'dnf')
+PACKAGES = ('bash', 'dnf', 'glibc')
+FILTERS = ('installed', 'available', 'updates')
+
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(value: str) -> dict:
+    """ Parse a mix like 'key=4,filter=1' into {call type: weight} """
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in MIX:
+            raise ValueError(f'Unknown call type : {name} (use {", ".join(MIX)})')
+        mix[name] = int(weight) if weight else 1
+    # a zero weight leaves the call type out
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+    if not mix:
+        raise ValueError(f'No call types in mix : {value}')
+    return mix
+
+
+def percentile(values: list, pct: float) -> float:
+    """ Get the pct percentile of the sorted values (nearest rank), 0 if there are no values """
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def make_calls(client, config: dict) -> dict:
+    """ Get a function for each call type, choosing the arguments from the config at random """
+    return {
+        'key': lambda rnd: client.get_packages_by_key(rnd.choice(config['keys'])),
+        'filter': lambda rnd: client.get_packages_by_filter(rnd.choice(config['filters']), extra=True),
+        'attribute': lambda rnd: client.get_package_attribute(rnd.choice(config['packages']), '', 'summary'),
+        'groups': lambda rnd: client.get_groups_by_category(rnd.choice(config['categories'])),
+    }
+
+
+def run_client(index: int, config: dict, barrier, results) -> None:
+    """ Run a client process, putting the (call type, latency in s, error) of each call on the results queue """
+    from dnfdbus.client import DnfDbusClient
+
+    rnd = random.Random(config['seed'] + index)
+    names = list(config['mix'])
+    weights = [config['mix'][name] for name in names]
+    samples = []
+    try:
+        try:
+            calls = make_calls(DnfDbusClient(), config)
+        except BaseException:
+            barrier.abort()  # don't leave the other processes waiting for this one
+            raise
+        barrier.wait()
+        deadline = time.monotonic() + config['duration']
+        while time.monotonic() < deadline:
+            name = rnd.choices(names, weights)[0]
+            start = time.perf_counter()
+            error = None
+            try:
+                calls[name](rnd)
+            except Exception as e:  # pylint: disable=broad-except
+                error = type(e).__name__
+            samples.append((name, time.perf_counter() - start, error))
+    finally:
+        results.put(samples)
+
+
+def report(samples: list, elapsed: float) -> dict:
+    """ Get the count, errors, throughput and latency percentiles (ms) of each call type and in total """
+    by_name = {}
+    for name, latency, error in samples:
+        by_name.setdefault(name, []).append((latency, error))
+    by_name['total'] = [(latency, error) for _, latency, error in samples]
+    res = {}
+    for name, values in by_name.items():
+        latencies = sorted(latency * 1000 for latency, _ in values)
+        res[name] = {'calls': len(values), 'errors': sum(1 for _, error in values if error),
+                     'throughput': len(values) / elapsed if elapsed else 0.0,
+                     **{f'p{pct}_ms': percentile(latencies, pct) for pct in PERCENTILES}}
+    return res
+
+
+def warm_up(config: dict) -> None:
+    """ Make a call of each type, so the sack is loaded and the rows made before the load starts """
+    from dnfdbus.client import DnfDbusClient
+
+    calls = make_calls(DnfDbusClient(), config)
+    rnd = random.Random(config['seed'])
+    for name in config['mix']:
+        calls[name](rnd)
+
+
+def run(config: dict) -> dict:
+    """ Run the load with config['clients'] client processes and get the report """
+    if config.get('address'):
+        os.environ['DBUS_SYSTEM_BUS_ADDRESS'] = config['address']
+    # the warm-up and the clients only make the call types with a weight
+    config['mix'] = {name: weight for name, weight in config['mix'].items() if weight > 0}
+    if config['mix'].get('groups') and not config.get('categories'):
+        from dnfdbus.client import DnfDbusClient
+        config['categories'] = [cat[0] for cat in DnfDbusClient().get_categories()] or ['']
+    if config.get('warmup', True):
+        warm_up(config)
+    # spawn, so the clients don't share the GLib state & bus connection of this process
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(config['clients'] + 1)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=run_client, args=(index, config, barrier, results))
+             for index in range(config['clients'])]
+    for proc in procs:
+        proc.start()
+    barrier.wait()
+    start = time.monotonic()
+    samples = []
+    for _ in procs:
+        samples.extend(results.get())
+    elapsed = time.monotonic() - start
+    for proc in procs:
+        proc.join()
+    return report(samples, elapsed)
+
+
+def print_report(res: dict) -> None:
+    print(f'{"call":10} {"calls":>8} {"errors":>7} {"calls/s":>9} ' +
+          ' '.join(f'{"p" + str(pct) + " ms":>9}' for pct in PERCENTILES))
+    for name, values in res.items():
+        print(f'{name:10} {values["calls"]:8} {values["errors"]:7} {values["throughput"]:9.1f} ' +
+              ' '.join(f'{values[f"p{pct}_ms"]:9.1f}' for pct in PERCENTILES))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m dnfdbus.loadtest', description='Dnf D-Bus load generator')
+    parser.add_argument('-c', '--clients', type=int, default=CLIENTS,
+                        help=f'number of concurrent client processes (default: {CLIENTS})')
+    parser.add_argument('-d', '--duration', type=float, default=DURATION,
+                        help=f'seconds to run the load (default: {DURATION})')
+    parser.add_argument('--mix', default=','.join(f'{name}={weight}' for name, weight in MIX.items()),
+                        help='weights of the call types: key, filter, attribute & groups')
+    parser.add_argument('--key', action='append', dest='keys', help='key for GetPackagesByKey (repeatable)')
+    parser.add_argument('--package', action='append', dest='packages',
+                        help='package for GetPackageAttribute (repeatable)')
+    parser.add_argument('--filter', action='append', dest='filters', help='filter for GetPackagesByFilter (repeatable)')
+    parser.add_argument('--category', action='append', dest='categories',
+                        help='category for GetGroupsByCategory (repeatable, default: all categories)')
+    parser.add_argument('--address', help='address of the bus the daemon is on (default: the system bus)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random choice of calls')
+    parser.add_argument('--no-warmup', action='store_true', help="don't make a call of each type before the load")
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args(argv)
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    config = {'clients': args.clients, 'duration': args.duration, 'mix': mix, 'seed': args.seed,
+              'keys': args.keys or list(KEYS), 'packages': args.packages or list(PACKAGES),
+              'filters': args.filters or list(FILTERS), 'categories': args.categories,
+              'address': args.address, 'warmup': not args.no_warmup}
+    res = run(config)
+    print_report(res)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': config, 'report': res}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
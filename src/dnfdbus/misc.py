@@ -17,14 +17,27 @@
 
 """ Module with Misc. helper funtions and other stuff"""
 
+import itertools
 import logging
 import sys
 import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dasbus.loop import EventLoop
 
 
 log = logging.getLogger('dnfdbus.common')
 
+# Tracing spans is logged here as JSON, when it is enabled for DEBUG
+trace_log = logging.getLogger('dnfdbus.trace')
+
+# The tracing span being run, None outside spans
+SPAN = ContextVar('span', default=None)
+
+_span_ids = itertools.count(1)
+
 
 def to_nevra(pkg):
     """ convert pkg string to NEVRA (Name, Epoch, Version, Release, Arch) """
@@ -43,14 +56,86 @@ def to_nevra(pkg):
     return n, e, v, r, a
 
 
+def to_evr(evr):
+    """ convert evr string to EVR (Epoch, Version, Release) """
+    relIndex = evr.rfind('-')
+    r = evr[relIndex + 1:]
+    v = evr[:relIndex]
+    eIndex = v.find(':')
+    if eIndex == -1:
+        e = '0'
+    else:
+        e, v = v.split(':')
+    return e, v, r
+
+
+class Span:
+    """
+    A timed operation, nested in the span it is started in
+
+    The request id is the id of the outermost span, so all spans made for
+    a DBus call share it. The span is logged as JSON when it is finished.
+    """
+
+    __slots__ = ('name', 'span_id', 'parent_id', 'request_id', 'attrs', 'start')
+
+    def __init__(self, name: str, parent, attrs: dict) -> None:
+        self.name = name
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent else None
+        self.request_id = parent.request_id if parent else self.span_id
+        self.attrs = attrs
+        self.start = time.perf_counter()
+
+    def finish(self, error: str = None) -> None:
+        record = {'request_id': self.request_id, 'span': self.name, 'span_id': self.span_id,
+                  'parent_id': self.parent_id, 'duration_ms': round((time.perf_counter() - self.start) * 1000, 3),
+                  **self.attrs}
+        if error is not None:
+            record['error'] = error
+        trace_log.debug(json.dumps(record, default=str), extra={'trace': record})
+
+
+def start_span(name: str, **attrs):
+    """ Start a span nested in the current span, None if tracing is disabled
+
+    The span is not made the current span, and the caller must finish it.
+    """
+    if not trace_log.isEnabledFor(logging.DEBUG):
+        return None
+    return Span(name, SPAN.get(), attrs)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """ Run the block in a tracing span, the attrs is added to the logged record """
+    current = start_span(name, **attrs)
+    if current is None:
+        yield None
+        return
+    token = SPAN.set(current)
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        SPAN.reset(token)
+        current.finish(error)
+
+
 def logger(func):
     """
     This decorator that logs start of end of a called method or function
+
+    The call is run in a tracing span, named after the function.
     """
 
     def newFunc(*args, **kwargs):
         log.debug("=> %s started args: %s " % (func.__name__, repr(args[1:])))
-        rc = func(*args, **kwargs)
+        with span(func.__name__):
+            rc = func(*args, **kwargs)
         log.debug("=> %s ended" % func.__name__)
         return rc
 
@@ -72,6 +157,82 @@ def do_log_setup(logroot='dnfdbus', logfmt='%(asctime)s: %(message)s',
     log.addHandler(handler)
 
 
+class ReadWriteLock:
+    """
+    Lock allowing many concurrent readers or a single writer
+
+    Waiting writers are preferred over new readers. A thread can take
+    the lock again while holding it, and can read while holding the write
+    lock, but can't upgrade a read lock to a write lock.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = None
+        self._writer_count = 0
+        self._writers_waiting = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def acquire_read(self):
+        count = getattr(self._local, 'count', 0)
+        if count or self._writer == threading.get_ident():
+            self._local.count = count + 1
+            return
+        with self._cond:
+            while self._writer is not None or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        self._local.count = 1
+
+    def release_read(self):
+        self._local.count -= 1
+        if self._local.count or self._writer == threading.get_ident():
+            return
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_count += 1
+                return
+            if getattr(self._local, 'count', 0):
+                raise RuntimeError('Cannot upgrade a read lock to a write lock')
+            self._writers_waiting += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = me
+            self._writer_count = 1
+
+    def release_write(self):
+        with self._cond:
+            self._writer_count -= 1
+            if not self._writer_count:
+                self._writer = None
+                self._cond.notify_all()
+
+
 class AsyncDbusCaller:
     def __init__(self):
         self.res = None
@@ -82,8 +243,72 @@ class AsyncDbusCaller:
         self.loop.quit()
 
     def call(self, mth, *args, **kwargs):
+        """ Call a method returning a JSON string and return the decoded value """
+        return json.loads(self.call_native(mth, *args, **kwargs))
+
+    def call_native(self, mth, *args, **kwargs):
+        """ Call a method returning native DBus types and return the value """
         self.loop = EventLoop()
         mth(*args, **kwargs, callback=self.callback)
         self.loop.run()
-        return json.loads(self.res)
+        return self.res
+
+
+def _set_future_result(future, value):
+    if not future.done():
+        future.set_result(value)
+
+
+def _set_future_exception(future, exception):
+    if not future.done():
+        future.set_exception(exception)
+
+
+class AsyncioDbusCaller:
+    """
+    Call DBus methods from asyncio, with many calls in flight at the same time
+
+    The replies are dispatched by a GLib main loop running in a background thread,
+    or by the application, if it already runs a GLib main loop (glib_thread=False).
+    """
+
+    _glib_thread = None
+    _glib_thread_lock = threading.Lock()
+
+    def __init__(self, glib_thread: bool = True):
+        if glib_thread:
+            self.start_glib_thread()
+
+    @classmethod
+    def start_glib_thread(cls):
+        """ Start the GLib main loop thread, shared by all callers """
+        with cls._glib_thread_lock:
+            if cls._glib_thread is None:
+                loop = EventLoop()
+                cls._glib_thread = threading.Thread(target=loop.run, name='dnfdbus-glib', daemon=True)
+                cls._glib_thread.start()
+
+    async def call(self, mth, *args, timeout: float = None):
+        """ Call a method returning native DBus types and return the value
+
+        timeout is in seconds (None = no timeout), asyncio.TimeoutError is raised if it is exceeded
+        """
+        import asyncio  # imported when used, to keep the client import fast
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def callback(call):
+            # called from the GLib main loop
+            try:
+                res = call()
+            except Exception as e:  # pylint: disable=broad-except
+                loop.call_soon_threadsafe(_set_future_exception, future, e)
+            else:
+                loop.call_soon_threadsafe(_set_future_result, future, res)
 
+        if timeout is None:
+            mth(*args, callback=callback)
+            return await future
+        # give the DBus timeout a bit more, so the asyncio timeout is the one used
+        mth(*args, callback=callback, timeout=int(timeout * 1000) + 1000)
+        return await asyncio.wait_for(future, timeout)
@@ -16,36 +16,166 @@
 #    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 
-""" Module for PolicyKit Authentication 
+""" Module for PolicyKit Authentication
 
-Use Legacy python dbus, because dasbus don’t work with PolicyKit1
+The CheckAuthorization call is made directly on the Gio connection, because
+dasbus don't work with PolicyKit1, so it can be made without blocking the main loop.
 
 """
 
-import dbus
+import threading
+import time
+from concurrent.futures import Future
+from functools import partial
 
-bus = dbus.SystemBus()
-DBUS_SENDER = bus.get_unique_name()
+from gi.repository import Gio, GLib
 
+from dnfdbus.misc import log
 
-def check_permission(action):
-    proxy = bus.get_object('org.freedesktop.PolicyKit1',
-                           '/org/freedesktop/PolicyKit1/Authority')
-    authority = dbus.Interface(
-        proxy, dbus_interface='org.freedesktop.PolicyKit1.Authority')
-    subject = ('system-bus-name', {'name': DBUS_SENDER})
-    action_id = action
+POLKIT_NAME = 'org.freedesktop.PolicyKit1'
+POLKIT_PATH = '/org/freedesktop/PolicyKit1/Authority'
+POLKIT_INTERFACE = 'org.freedesktop.PolicyKit1.Authority'
+
+READ_ACTION = 'dk.rasmil.DnfDbus.read'
+WRITE_ACTION = 'dk.rasmil.DnfDbus.write'
+
+# Default number of seconds an authorization is cached
+AUTHORIZATION_TTL = 300
+
+ALLOW_USER_INTERACTION = 1
+
+
+def _check_parameters(sender, action):
+    subject = ('system-bus-name', {'name': GLib.Variant('s', sender)})
     details = {}
-    flags = 1  # AllowUserInteraction flag
     cancellation_id = ''  # No cancellation id
+    return GLib.Variant('((sa{sv})sa{ss}us)',
+                        (subject, action, details, ALLOW_USER_INTERACTION, cancellation_id))
+
+
+def check_permission(connection, sender, action) -> bool:
+    """ Check if the sender (unique bus name) is authorized for the action, blocking until PolicyKit answers """
+    result = connection.call_sync(
+        POLKIT_NAME, POLKIT_PATH, POLKIT_INTERFACE, 'CheckAuthorization',
+        _check_parameters(sender, action), GLib.VariantType.new('((bba{ss}))'),
+        Gio.DBusCallFlags.NONE, GLib.MAXINT, None)
+    (granted, _, _), = result.unpack()
+    return granted
+
+
+def check_permission_async(connection, sender, action, callback) -> None:
+    """ Check if the sender (unique bus name) is authorized for the action, without blocking
+
+    callback(granted) is called from the main context of the calling thread, when PolicyKit answers.
+    The timeout is disabled, so the user can take the time needed to answer an authentication prompt.
+    """
+    connection.call(
+        POLKIT_NAME, POLKIT_PATH, POLKIT_INTERFACE, 'CheckAuthorization',
+        _check_parameters(sender, action), GLib.VariantType.new('((bba{ss}))'),
+        Gio.DBusCallFlags.NONE, GLib.MAXINT, None, _check_done, callback)
+
+
+def _check_done(connection, result, callback):
+    try:
+        (granted, _, _), = connection.call_finish(result).unpack()
+    except GLib.Error as error:
+        log.error(f'PolicyKit1 CheckAuthorization failed : {error}')
+        granted = False
+    callback(granted)
+
+
+class Authorizer:
+    """ PolicyKit authorizations of the callers, cached on (unique bus name, action)
+
+    Only granted authorizations are cached, they expire after ttl seconds
+    or when the caller leaves the bus.
+    """
+
+    def __init__(self, message_bus, ttl=AUTHORIZATION_TTL):
+        self._message_bus = message_bus
+        self.ttl = ttl
+        self._granted = {}  # (sender, action) -> expire time
+        self._pending = {}  # (sender, action) -> Future
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._granted)
+
+    def watch(self):
+        """ Forget the authorizations of callers leaving the bus """
+        self._message_bus.proxy.NameOwnerChanged.connect(self._name_owner_changed)
+
+    def is_authorized(self, sender, action) -> bool:
+        """ Is there a cached authorization of the sender for the action """
+        key = (sender, action)
+        with self._lock:
+            expires = self._granted.get(key)
+            if expires is None:
+                return False
+            if expires > time.monotonic():
+                return True
+            del self._granted[key]
+            return False
+
+    def check(self, sender, action) -> bool:
+        """ Check the authorization of the sender for the action, blocking until PolicyKit answers """
+        if self.is_authorized(sender, action):
+            return True
+        granted = check_permission(self._message_bus.connection, sender, action)
+        self._checked(sender, action, granted)
+        return granted
+
+    def authorize(self, sender, action) -> Future:
+        """ Check the authorization of the sender for the action, without blocking
+
+        Must be called from the main loop, the returned Future gets the result (bool).
+        Calls made while a check is pending, shares the pending check.
+        """
+        key = (sender, action)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                return pending
+            future = Future()
+            self._pending[key] = future
+        try:
+            check_permission_async(self._message_bus.connection, sender, action,
+                                   partial(self._authorized, key, future))
+        except Exception as error:  # pylint: disable=broad-except
+            # the check was not started (ex. disconnected from the bus), the waiting calls fail
+            log.error(f'PolicyKit1 CheckAuthorization failed : {error}')
+            with self._lock:
+                self._pending.pop(key, None)
+            future.set_exception(error)
+        return future
+
+    def forget(self, sender) -> None:
+        """ Forget the cached authorizations of the sender """
+        with self._lock:
+            for key in [key for key in self._granted if key[0] == sender]:
+                del self._granted[key]
+
+    def _authorized(self, key, future, granted):
+        with self._lock:
+            self._pending.pop(key, None)
+        self._checked(*key, granted)
+        future.set_result(granted)
 
-    (granted, _, details) = authority.CheckAuthorization(
-        subject, action_id, details, flags, cancellation_id)
+    def _checked(self, sender, action, granted):
+        log.debug(f'PolicyKit1 {action} : granted : {granted} sender: {sender}')
+        if granted and self.ttl > 0:
+            with self._lock:
+                self._granted[(sender, action)] = time.monotonic() + self.ttl
 
-    return granted == dbus.Boolean(True)
+    def _name_owner_changed(self, name, old_owner, new_owner):
+        if old_owner and not new_owner:
+            self.forget(old_owner)
 
 
 if __name__ == "__main__":
-    print(f'Sender : {DBUS_SENDER}')
-    is_granted = check_permission('dk.rasmil.DnfDbus.read')
+    from dasbus.connection import SystemMessageBus
+    bus = SystemMessageBus()
+    sender = bus.connection.get_unique_name()
+    print(f'Sender : {sender}')
+    is_granted = check_permission(bus.connection, sender, READ_ACTION)
     print(is_granted)
@@ -0,0 +1,194 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+"""
+dnfdbus.profiler module
+"""
+
+import cProfile
+import datetime
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+
+from dnfdbus.misc import log
+
+# Default directory for the profile dumps
+PROFILE_DIR = '/var/cache/dnfdbus/profiles'
+
+MODES = ('cprofile', 'tracemalloc', 'sampling')
+
+# Default seconds between samples in the sampling mode
+SAMPLE_INTERVAL = 0.005
+
+# Default number of frames stored for each tracemalloc trace
+TRACEMALLOC_FRAMES = 10
+
+# Max. number of frames recorded for a sample
+MAX_DEPTH = 64
+
+
+class Profiler:
+    """
+    Profilers started & stopped in the running daemon
+
+    cprofile profiles the calls run in the worker pool, in a single profile enabled by one call at a time,
+    as the sys.monitoring based cProfile (Python >= 3.12) can't have more than one profile enabled.
+    Calls made while the profile is in use are run unprofiled and counted as skipped.
+    tracemalloc traces the memory allocations of the daemon.
+    sampling records the stacks of the worker threads at an interval, with the DBus method running in them.
+    Stopping a profiler dumps the result to a file in the profile directory.
+    """
+
+    def __init__(self, path: str = PROFILE_DIR) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._running = {}  # thread id -> DBus method running in the thread
+        self._profile = None  # cProfile.Profile, while cprofile is started
+        self._profile_lock = threading.Lock()  # held by the call using the profile
+        self._holder = None  # thread id of the call using the profile
+        self._profiled = 0
+        self._skipped = 0
+        self._sampler = None
+        self._sampler_stop = None
+        self._samples = Counter()
+
+    @property
+    def modes(self) -> list:
+        """ The started profilers """
+        modes = []
+        if self._profile is not None:
+            modes.append('cprofile')
+        if tracemalloc.is_tracing():
+            modes.append('tracemalloc')
+        if self._sampler is not None:
+            modes.append('sampling')
+        return modes
+
+    def run(self, method: str, fn, *args):
+        """ Run a call of method in a worker thread, profiling it if cprofile is started """
+        ident = threading.get_ident()
+        self._running[ident] = method
+        try:
+            if self._profile is None:
+                return fn(*args)
+            if not self._profile_lock.acquire(blocking=False):
+                self._skipped += 1
+                return fn(*args)
+            self._holder = ident
+            try:
+                return self._run_profiled(fn, *args)
+            finally:
+                self._holder = None
+                self._profile_lock.release()
+        finally:
+            del self._running[ident]
+
+    def _run_profiled(self, fn, *args):
+        profile = self._profile
+        if profile is None:
+            return fn(*args)
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiling tool is active (Python >= 3.12)
+            self._skipped += 1
+            return fn(*args)
+        self._profiled += 1
+        try:
+            return fn(*args)
+        finally:
+            profile.disable()
+
+    def start(self, mode: str, options: dict = None) -> None:
+        """ Start a profiler, ValueError is raised for unknown or already started modes
+
+        options: 'interval' (seconds) for sampling, 'frames' for tracemalloc
+        """
+        options = options or {}
+        with self._lock:
+            self._check_mode(mode, started=False)
+            if mode == 'cprofile':
+                self._profiled = self._skipped = 0
+                self._profile = cProfile.Profile()
+            elif mode == 'tracemalloc':
+                tracemalloc.start(int(options.get('frames', TRACEMALLOC_FRAMES)))
+            else:
+                self._samples = Counter()
+                self._sampler_stop = threading.Event()
+                self._sampler = threading.Thread(
+                    target=self._sample, args=(float(options.get('interval', SAMPLE_INTERVAL)), self._sampler_stop),
+                    name='dnfdbus-sampler', daemon=True)
+                self._sampler.start()
+        log.info(f'Profiling started : {mode}')
+
+    def stop(self, mode: str) -> str:
+        """ Stop a profiler and dump the result, return the path of the dump """
+        with self._lock:
+            self._check_mode(mode, started=True)
+            path = self._dump_path(mode)
+            if mode == 'cprofile':
+                if self._holder == threading.get_ident():
+                    # stopped by the call using the profile (StopProfiling), it is dumped without waiting
+                    profile, self._profile = self._profile, None
+                else:
+                    # wait for the call using the profile
+                    with self._profile_lock:
+                        profile, self._profile = self._profile, None
+                stats = pstats.Stats(profile) if self._profiled else pstats.Stats()
+                stats.dump_stats(path)
+                log.info(f'Profiled calls : {self._profiled}, skipped while in use : {self._skipped}')
+            elif mode == 'tracemalloc':
+                tracemalloc.take_snapshot().dump(path)
+                tracemalloc.stop()
+            else:
+                self._sampler_stop.set()
+                self._sampler.join()
+                self._sampler = None
+                with open(path, 'w') as f:
+                    for stack, count in self._samples.most_common():
+                        f.write(f'{stack} {count}\n')
+        log.info(f'Profiling stopped : {mode} written to {path}')
+        return path
+
+    def _check_mode(self, mode: str, started: bool) -> None:
+        if mode not in MODES:
+            raise ValueError(f'Unknown profiling mode : {mode} (use {", ".join(MODES)})')
+        if (mode in self.modes) != started:
+            raise ValueError(f'Profiling is {"not started" if started else "already started"} : {mode}')
+
+    def _dump_path(self, mode: str) -> str:
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+        ext = {'cprofile': 'pstats', 'tracemalloc': 'tracemalloc', 'sampling': 'folded'}[mode]
+        timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.path, f'{mode}-{timestamp}.{ext}')
+
+    def _sample(self, interval: float, stop: threading.Event) -> None:
+        """ Count the stacks of the threads running a DBus method, in the collapsed (flame graph) format """
+        while not stop.wait(interval):
+            frames = sys._current_frames()
+            for ident, method in list(self._running.items()):
+                frame = frames.get(ident)
+                names = []
+                while frame is not None and len(names) < MAX_DEPTH:
+                    code = frame.f_code
+                    # no spaces, they separate the stack and the count in the collapsed format
+                    names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}'.replace(' ', '_'))
+                    frame = frame.f_back
+                self._samples[';'.join([method, *reversed(names)])] += 1
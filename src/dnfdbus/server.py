@@ -17,44 +17,211 @@
 
 """ Module for DBus Backend Daemon """
 
+import contextvars
+import datetime
 import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial, wraps
 
-from dasbus.connection import SystemMessageBus
-from dasbus.error import DBusError, ErrorMapper, get_error_decorator
-from dasbus.identifier import DBusServiceIdentifier
-from dasbus.server.interface import dbus_interface, dbus_signal
+from dasbus.server.handler import ServerObjectHandler
+from dasbus.server.interface import dbus_interface, dbus_signal, returns_multiple_arguments
 from dasbus.server.publishable import Publishable
 from dasbus.server.template import InterfaceTemplate
 from dasbus.signal import Signal
-from dasbus.typing import Str, Double
+from dasbus.typing import (Bool, Dict, Double, Int, Int64, List, Str, Tuple,
+                           UInt16, UInt64, Variant, get_variant)
 
-from dnfdbus.backend import DnfBackend
-from dnfdbus.misc import log, logger
-from dnfdbus.polkit import DBUS_SENDER, check_permission
+from gi.repository import GLib
 
-# Constants
-SYSTEM_BUS = SystemMessageBus()
+from dnfdbus.backend import STATE_LOADING, STATE_READY, DnfBackend, read_rpmdb_cookie
+from dnfdbus.cache import ResultCache
+from dnfdbus.idle import STATE_PATH, IdleMonitor, Reactivation, load_state, save_state
+from dnfdbus.interface import (CACHE_MB, CACHE_SIZE, DNFDBUS, DNFDBUS_V2, PAGE_SIZE, SYSTEM_BUS, VERSION, WORKERS,
+                               AccessDeniedError, ChangelogType, GroupType, InvalidArgumentError,
+                               InvalidCursorError, PackageExtraType, PackageFieldsType, PackageType)
+from dnfdbus.misc import SPAN, log, logger, span, start_span
+from dnfdbus.polkit import AUTHORIZATION_TTL, READ_ACTION, WRITE_ACTION, Authorizer
+from dnfdbus.profiler import PROFILE_DIR, Profiler
+from dnfdbus.snapshot import FILTERS, SNAPSHOT_PATH, Snapshot
+from dnfdbus.stats import CALL, CallStats, CallTimer, run_timed, timed
+from dnfdbus.watcher import DirectoryWatcher
 
-DNFDBUS_NAMESPACE = ("dk", "rasmil", "DnfDbus")
+# Unique bus name of the caller of the DBus method being handled, None for calls not made over DBus
+CALLER = contextvars.ContextVar('caller', default=None)
 
-DNFDBUS = DBusServiceIdentifier(
-    namespace=DNFDBUS_NAMESPACE,
-    message_bus=SYSTEM_BUS
-)
+# Action the caller is already authorized for, set in the context of the calls run in the worker pool
+_GRANTED = contextvars.ContextVar('granted', default=None)
 
-VERSION = "1.0"
 
-# Create an error mapper.
-ERROR_MAPPER = ErrorMapper()
+def _dumps(value) -> str:
+    """ Encode the result of a v1 method as JSON, timed as serialization """
+    with timed('serialize'), span('serialize'):
+        return json.dumps(value)
 
-# Create a decorator for DBus errors and use it to map
-# the class ExampleError to the name my.example.Error.
-dbus_error = get_error_decorator(ERROR_MAPPER)
 
+def to_variant(value) -> Variant:
+    """ Convert a package attribute value to a Variant """
+    if value is None:
+        return get_variant(Str, '')
+    if isinstance(value, bool):
+        return get_variant(Bool, value)
+    if isinstance(value, int):
+        return get_variant(Int64, value)
+    if isinstance(value, float):
+        return get_variant(Double, value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return get_variant(Str, value.isoformat())
+    if isinstance(value, dict):
+        return get_variant(Dict[Str, Variant], {str(key): to_variant(val) for key, val in value.items()})
+    if isinstance(value, (list, tuple)):
+        return get_variant(List[Variant], [to_variant(val) for val in value])
+    return get_variant(Str, str(value))
 
-@dbus_error("AccessDeniedError", namespace=DNFDBUS_NAMESPACE)
-class AccessDeniedError(DBusError):
-    pass
+
+def in_worker(method=None, *, action=READ_ACTION):
+    """
+    Run an interface method in the worker pool of the implementation
+
+    The method returns a Future and DnfDbusServerObjectHandler sends the
+    reply when it is done, so the main loop is not blocked by long calls.
+    The caller must be authorized for the PolicyKit action, it is checked before
+    the method is run, use @in_worker(action=WRITE_ACTION) for the write methods.
+    """
+    if method is None:
+        return partial(in_worker, action=action)
+
+    @wraps(method)
+    def wrapper(self, *args):
+        return self.implementation.submit(method, self, *args, action=action)
+
+    return wrapper
+
+
+def _copy_result(source: Future, target: Future) -> None:
+    """ Set the result (or exception) of the target future from the done source future """
+    error = source.exception()
+    if error is not None:
+        target.set_exception(error)
+    else:
+        target.set_result(source.result())
+
+
+def cached(method):
+    """
+    Cache the result of a read method in the result cache of the implementation
+
+    The result is keyed on the method name, arguments and the sack generation,
+    the read permission is checked before a cached result is returned.
+    """
+
+    @wraps(method)
+    def wrapper(self, *args):
+        self.check_permission_read()
+        self.backend.setup()  # make sure the generation don't change because the sack is loaded
+        key = (method.__name__, *(tuple(arg) if isinstance(arg, list) else arg for arg in args))
+        return self.cache.get_or_call(key, self.backend.generation, lambda: method(self, *args))
+
+    return wrapper
+
+
+def from_snapshot(dump):
+    """
+    Answer a by filter method from the package snapshot, while the sack is not loaded yet
+
+    dump is called with the (nevra, reponame, summary, size) rows and the extra flag,
+    to make the result in the format of the method.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, flt, extra):
+            rows = self.snapshot_rows(flt)
+            if rows is not None:
+                return dump(rows, extra)
+            return method(self, flt, extra)
+
+        return wrapper
+
+    return decorator
+
+
+def _dump_snapshot_json(rows: list, extra: bool) -> str:
+    if extra:
+        return _dumps(rows)
+    else:
+        return _dumps([row[:2] for row in rows])
+
+
+def _dump_snapshot_v2(rows: list, extra: bool) -> list:
+    if extra:
+        return [tuple(row) for row in rows]
+    else:
+        return [(nevra, reponame, '', 0) for nevra, reponame, _summary, _size in rows]
+
+
+class DnfDbusServerObjectHandler(ServerObjectHandler):
+    """ Object handler sending the reply of methods returning a Future, when it is done
+
+    The unique bus name of the caller is available in CALLER, while the method is handled.
+    The calls are timed and recorded in the statistics of the implementation, and run
+    in a tracing span, so the spans made while handling the call share its request id.
+    """
+
+    def _method_callback(self, invocation, interface_name, method_name, parameters):
+        sender = invocation.get_sender()
+        caller = CALLER.set(sender)
+        call = CALL.set(CallTimer())
+        root = SPAN.set(start_span(f'{interface_name}.{method_name}', caller=sender))
+        try:
+            super()._method_callback(invocation, interface_name, method_name, parameters)
+        finally:
+            SPAN.reset(root)
+            CALL.reset(call)
+            CALLER.reset(caller)
+
+    def _handle_method_result(self, invocation, method_spec, method_reply):
+        if isinstance(method_reply, Future):
+            context = contextvars.copy_context()
+            method_reply.add_done_callback(partial(self._future_done, context, invocation, method_spec))
+        else:
+            self._send_reply(invocation, method_spec, method_reply)
+
+    def _future_done(self, context, invocation, method_spec, future):
+        # futures done in the main loop is replied at once, so the reply is sent even if the loop is quit
+        if threading.current_thread() is threading.main_thread():
+            context.run(self._handle_future_result, invocation, method_spec, future)
+        else:
+            GLib.idle_add(context.run, self._handle_future_result, invocation, method_spec, future)
+
+    def _handle_future_result(self, invocation, method_spec, future):
+        try:
+            self._send_reply(invocation, method_spec, future.result())
+        except Exception as error:  # pylint: disable=broad-except
+            self._handle_method_error(invocation, method_spec.interface_name, method_spec.name, error)
+        return False
+
+    def _send_reply(self, invocation, method_spec, method_reply):
+        with timed('serialize'), span('reply'):
+            reply_value = self._server._get_reply_value(method_spec.out_type, method_reply)
+        invocation.return_value(reply_value)
+        self._record(method_spec.interface_name, method_spec.name,
+                     size=reply_value.get_size() if reply_value is not None else 0)
+
+    def _handle_method_error(self, invocation, interface_name, method_name, error):
+        super()._handle_method_error(invocation, interface_name, method_name, error)
+        self._record(interface_name, method_name, error=type(error).__name__)
+
+    def _record(self, interface_name, method_name, error=None, size=0):
+        """ Record the finished call in the statistics and finish its span """
+        timer = CALL.get()
+        if timer is not None:
+            self._object.implementation.stats.record(f'{interface_name}.{method_name}', timer,
+                                                     error is not None, size)
+        root = SPAN.get()
+        if root is not None:
+            root.finish(error)
 
 
 # DBus interface
@@ -70,35 +237,74 @@ class DnfDbusInterface(InterfaceTemplate):
         self.implementation.signal_message.connect(self.Message)
         self.implementation.signal_progress.connect(self.Progress)
         self.implementation.signal_quitting.connect(self.Quitting)
+        self.implementation.signal_state_changed.connect(self._state_changed)
+        self.implementation.signal_sack_changed.connect(self._sack_changed)
+
+    def _sack_changed(self, generation):
+        self.report_changed_property('Generation')
+        self.flush_changes()
+        self.SackChanged(generation)
+
+    def _state_changed(self, state):
+        self.report_changed_property('State')
+        self.flush_changes()
+        if state == STATE_READY:
+            self.Ready()
 
     @property
     def Version(self) -> Str:
         """ Get Version of DBUS Daemon"""
         return self.implementation.version()
 
+    @property
+    def State(self) -> Str:
+        """ Get the state of the package sack ('idle', 'loading', 'ready' or 'error')"""
+        return self.implementation.state
+
+    @property
+    def Generation(self) -> UInt64:
+        """ Get the package sack generation, it changes every time the sack is (re)loaded"""
+        return self.implementation.generation
+
     def Quit(self) -> None:
         """ Quit the DBUS Daemon"""
-        return self.implementation.quit()
+        return self.implementation.run_authorized(self.implementation.quit)
 
+    @in_worker
     def GetRepositories(self) -> Str:
         """ Get Repositories"""
         return self.implementation.get_repositories()
 
+    @in_worker
     def GetPackagesByKey(self, key: Str) -> Str:
         """ Get Backages by key """
         return self.implementation.get_packages_by_key(key)
 
+    @in_worker
     def GetPackagesByFilter(self, flt: Str, extra: bool) -> Str:
         """ Get Backages by key """
         return self.implementation.get_packages_by_filter(flt, extra)
 
+    @in_worker
+    def GetPackagesByKeyPaged(self, key: Str, cursor: Str, limit: Int) -> Str:
+        """ Get a page of packages by key """
+        return self.implementation.get_packages_by_key_paged(key, cursor, limit)
+
+    @in_worker
+    def GetPackagesByFilterPaged(self, flt: Str, extra: bool, cursor: Str, limit: Int) -> Str:
+        """ Get a page of packages by filter """
+        return self.implementation.get_packages_by_filter_paged(flt, extra, cursor, limit)
+
+    @in_worker
     def GetPackageAttribute(self, pkg: str, reponame: str, attribute: str) -> Str:
         """ Get attribute for a given package """
         return self.implementation.get_package_attribute(pkg, reponame, attribute)
 
+    @in_worker
     def GetCategories(self) -> Str:
         return self.implementation.get_categories()
     
+    @in_worker
     def GetGroupsByCategory(self, cat_id: str) -> Str:
         return self.implementation.get_groups_by_category(cat_id)
 
@@ -117,25 +323,186 @@ class DnfDbusInterface(InterfaceTemplate):
     def Quitting(self):  # type: ignore
         pass
 
+    @dbus_signal
+    def Ready(self):  # type: ignore
+        pass
+
+    @dbus_signal
+    def SackChanged(self, generation: UInt64):  # type: ignore
+        pass
+
+
+# noinspection PyPep8Naming
+@dbus_interface(DNFDBUS_V2.interface_name)
+class DnfDbusInterfaceV2(InterfaceTemplate):
+    """ v2 interface returning native DBus types """
+
+    @in_worker
+    def GetRepositories(self) -> List[Dict[Str, Variant]]:
+        """ Get Repositories"""
+        return self.implementation.get_repositories_v2()
+
+    @in_worker
+    def GetPackagesByKey(self, key: Str) -> List[PackageType]:
+        """ Get Packages by key """
+        return self.implementation.get_packages_by_key_v2(key)
+
+    @in_worker
+    def GetPackagesByFilter(self, flt: Str, extra: Bool) -> List[PackageExtraType]:
+        """ Get Packages by filter (summary & size are empty if extra is False) """
+        return self.implementation.get_packages_by_filter_v2(flt, extra)
+
+    @returns_multiple_arguments
+    @in_worker
+    def GetPackagesByKeyPaged(self, key: Str, cursor: Str, limit: Int) -> Tuple[List[PackageType], Str]:
+        """ Get a page of packages by key and the cursor for the next page """
+        return self.implementation.get_packages_by_key_paged_v2(key, cursor, limit)
+
+    @returns_multiple_arguments
+    @in_worker
+    def GetPackagesByFilterPaged(self, flt: Str, extra: Bool, cursor: Str,
+                                 limit: Int) -> Tuple[List[PackageExtraType], Str]:
+        """ Get a page of packages by filter and the cursor for the next page """
+        return self.implementation.get_packages_by_filter_paged_v2(flt, extra, cursor, limit)
+
+    @in_worker
+    def GetPackagesByFilterColumns(self, flt: Str, extra: Bool) -> Dict[Str, Variant]:
+        """ Get Packages by filter in the compact columnar format
+
+        names, evrs, arch_index, repo_index (and summaries, sizes if extra) are arrays
+        with a row for each package, arch_index & repo_index are indexes into the
+        arches & repos lookup tables.
+        """
+        return self.implementation.get_packages_by_filter_columns(flt, extra)
+
+    @in_worker
+    def GetPackagesByKeyFields(self, key: Str) -> List[PackageFieldsType]:
+        """ Get Packages by key, with the nevra split in fields (summary & size are empty) """
+        return self.implementation.get_packages_by_key_fields(key)
+
+    @in_worker
+    def GetPackagesByFilterFields(self, flt: Str, extra: Bool) -> List[PackageFieldsType]:
+        """ Get Packages by filter, with the nevra split in fields (summary & size are empty if extra is False) """
+        return self.implementation.get_packages_by_filter_fields(flt, extra)
+
+    @in_worker
+    def GetPackageAttribute(self, pkg: Str, reponame: Str, attribute: Str) -> List[Tuple[Str, Str, Variant]]:
+        """ Get attribute for a given package """
+        return self.implementation.get_package_attribute_v2(pkg, reponame, attribute)
+
+    @in_worker
+    def GetPackageAttributes(self, pkgs: List[Str],
+                             attributes: List[Str]) -> List[Tuple[Str, Str, Dict[Str, Variant]]]:
+        """ Get many attributes for many packages (nevras) in one call
+
+        Returns a (nevra, reponame, {attribute: value}) row for each package found
+        """
+        return self.implementation.get_package_attributes(pkgs, attributes)
+
+    @returns_multiple_arguments
+    @in_worker
+    def GetPackageChangelog(self, pkg: Str, reponame: Str, since: Str, cursor: Str,
+                            limit: Int) -> Tuple[List[ChangelogType], Str]:
+        """ Get a page of changelog entries for package(s), newest first, and the cursor for the next page
+
+        since is an ISO date ('YYYY-MM-DD'), only entries newer than it is returned ('' = all entries)
+        """
+        return self.implementation.get_package_changelog(pkg, reponame, since, cursor, limit)
+
+    @in_worker
+    def GetCategories(self) -> List[GroupType]:
+        return self.implementation.get_categories_v2()
+
+    @in_worker(action=WRITE_ACTION)
+    def RefreshRepositories(self) -> Dict[Str, Variant]:
+        """ Refresh the repository metadata, reloading the sack if some repos have changed
+
+        Needs the write permission, as it downloads metadata and reloads the sack.
+        Returns the changed repo ids (as), the per repo load timings (a{sd}) and the sack reload time (d)
+        """
+        return self.implementation.refresh_repositories()
+
+    @in_worker
+    def GetReactivation(self) -> Dict[Str, Variant]:
+        """ Get the startup metrics of the daemon
+
+        reactivated (b) is True if the previous run exited because it was idle, then downtime (d) is the
+        seconds it was down. registered, first_reply & sack_ready (d) is the seconds from the process
+        was started until it happened (missing if it has not happened yet).
+        """
+        return self.implementation.get_reactivation()
+
+    @in_worker
+    def GetStats(self) -> Dict[Str, Variant]:
+        """ Get the call statistics of each method ('<interface>.<method>')
+
+        Each method has calls & errors counts, histograms of the latency, of the time spent in the
+        polkit, backend and serialize phases (seconds) and of the reply size (bytes).
+        A histogram has count, sum, max and buckets ([upper bound, count], the last bound is -1).
+        """
+        return self.implementation.get_stats()
+
+    @in_worker(action=WRITE_ACTION)
+    def StartProfiling(self, mode: Str, options: Dict[Str, Variant]) -> None:
+        """ Start a profiler in the daemon, needs the write permission
+
+        mode is 'cprofile' (the calls run by the workers), 'tracemalloc' (memory allocations, options: frames (i))
+        or 'sampling' (the worker stacks and the method running in them, options: interval (d) seconds)
+        """
+        self.implementation.start_profiling(mode, options)
+
+    @in_worker(action=WRITE_ACTION)
+    def StopProfiling(self, mode: Str) -> Str:
+        """ Stop a profiler and return the path of the dump (pstats, tracemalloc snapshot or collapsed stacks) """
+        return self.implementation.stop_profiling(mode)
+
+    @in_worker
+    def GetProfiling(self) -> List[Str]:
+        """ Get the started profilers """
+        return self.implementation.get_profiling()
+
+    @in_worker
+    def GetGroupsByCategory(self, cat_id: Str) -> List[GroupType]:
+        return self.implementation.get_groups_by_category_v2(cat_id)
+
 
 # Implementation of the DnfDbusInterface
 
 class DnfDbus(Publishable):
 
-    def __init__(self, loop) -> None:
+    def __init__(self, loop, workers=WORKERS, cache_size=CACHE_SIZE, snapshot_path=SNAPSHOT_PATH,
+                 auth_ttl=AUTHORIZATION_TTL, idle_timeout=0, state_path=STATE_PATH, started=None,
+                 profile_dir=PROFILE_DIR, cache_mb=CACHE_MB) -> None:
         super().__init__()
-        self.authorized_sender_read = set()
-        self.authorized_sender_write = set()
+        self.profiler = Profiler(profile_dir)
+        self.idle = IdleMonitor(idle_timeout)
+        self.state_path = state_path
+        self.reactivation = Reactivation(started)
+        self.authorizer = Authorizer(SYSTEM_BUS, auth_ttl)
+        self.stats = CallStats()
         self._is_working = False
         self.loop = loop
-        self.backend = DnfBackend()
+        # seeded from the start time, so the generations of an earlier run (in cursors & client caches) don't match
+        self.backend = DnfBackend(generation=int(time.time() * 1000))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dnfdbus-worker')
+        self.cache = ResultCache(cache_size, cache_mb * 1024 * 1024)
         self._signal_message = Signal()
         self._signal_progress = Signal()
         self._signal_quitting = Signal()
+        self._signal_state_changed = Signal()
+        self._signal_sack_changed = Signal()
+        self.watcher = None
+        self.snapshot_path = snapshot_path
+        self.snapshot = None
+        self.backend.state_changed.connect(self._backend_state_changed)
+        self.backend.sack_changed.connect(self._sack_changed)
 
     def for_publication(self):
         return DnfDbusInterface(self)
 
+    def for_publication_v2(self):
+        return DnfDbusInterfaceV2(self)
+
     @property
     def signal_message(self):
         return self._signal_message
@@ -148,6 +515,259 @@ class DnfDbus(Publishable):
     def signal_quitting(self):
         return self._signal_quitting
 
+    @property
+    def signal_state_changed(self):
+        return self._signal_state_changed
+
+    @property
+    def signal_sack_changed(self):
+        return self._signal_sack_changed
+
+    @property
+    def state(self) -> str:
+        return self.backend.state
+
+    @property
+    def generation(self) -> int:
+        return self.backend.generation
+
+    def submit(self, fn, *args, action=READ_ACTION) -> Future:
+        """ Run fn in the worker pool, when the caller is authorized for the PolicyKit action
+
+        The authorization is checked without blocking the main loop or a worker,
+        so a caller waiting for a PolicyKit prompt don't hold up the other callers.
+        """
+        context = contextvars.copy_context()
+        method = getattr(fn, '__qualname__', str(fn))
+        self.idle.call_started()
+        result = Future()
+        result.add_done_callback(self._call_ended)
+
+        def run(authorized):
+            try:
+                authorized.result()
+                work = self.executor.submit(context.run, self.profiler.run, method, run_timed, fn, *args)
+            except Exception as error:  # pylint: disable=broad-except
+                result.set_exception(error)
+            else:
+                work.add_done_callback(partial(_copy_result, target=result))
+
+        self._authorize(action, context).add_done_callback(run)
+        return result
+
+    def run_authorized(self, fn, *args, action=READ_ACTION) -> Future:
+        """ Run fn in the main loop, when the caller is authorized for the PolicyKit action """
+        context = contextvars.copy_context()
+        result = Future()
+
+        def run(authorized):
+            try:
+                authorized.result()
+                value = context.run(fn, *args)
+            except Exception as error:  # pylint: disable=broad-except
+                result.set_exception(error)
+            else:
+                result.set_result(value)
+
+        self._authorize(action, context).add_done_callback(run)
+        return result
+
+    def _authorize(self, action: str, context: contextvars.Context) -> Future:
+        """ Check the caller of the call in context is authorized for action, without blocking
+
+        The future is done in the main loop, when the check is, with an AccessDeniedError if
+        the caller is not authorized, the action is granted in context, so it is not checked again.
+        """
+        sender = context.get(CALLER)
+        result = Future()
+        if sender is None or self.authorizer.is_authorized(sender, action):
+            context.run(_GRANTED.set, action)
+            result.set_result(True)
+            return result
+        started = time.perf_counter()
+
+        def authorized(check):
+            timer = context.get(CALL)
+            if timer is not None:
+                timer.add('polkit', time.perf_counter() - started)
+            try:
+                if not check.result():
+                    raise AccessDeniedError
+            except Exception as error:  # pylint: disable=broad-except
+                result.set_exception(error)
+            else:
+                context.run(_GRANTED.set, action)
+                result.set_result(True)
+
+        self.authorizer.authorize(sender, action).add_done_callback(authorized)
+        return result
+
+    def _call_ended(self, _future):
+        self.idle.call_ended()
+        self.reactivation.mark('first_reply')
+
+    def load_state(self) -> None:
+        """ Load the state saved by the previous run, to find out if the daemon is reactivated """
+        if self.state_path:
+            self.reactivation.previous_run(load_state(self.state_path))
+
+    def save_state(self, reason: str) -> None:
+        """ Save the reason and time of the exit, and the startup metrics of this run """
+        if not self.state_path:
+            return
+        try:
+            save_state(self.state_path, {'reason': reason, 'exited': time.time(),
+                                         'reactivation': self.reactivation.as_dict()})
+        except OSError:
+            log.exception(f'Saving the daemon state failed : {self.state_path}')
+
+    def exit_when_idle(self) -> None:
+        """ Exit the daemon, when there have been no calls for the idle timeout
+
+        DBus activation starts the daemon again at the next call, and the
+        package snapshot saved when the sack was loaded makes it fast to answer.
+        """
+        if self.idle.timeout > 0:
+            log.info(f'Exit when idle for {self.idle.timeout}s')
+            GLib.timeout_add_seconds(self.idle.check_interval, self._check_idle)
+
+    def log_stats_every(self, interval: int) -> None:
+        """ Write the call statistics to the log every interval seconds (0 = never) """
+        if interval > 0:
+            GLib.timeout_add_seconds(interval, self._log_stats)
+
+    def _log_stats(self):
+        for line in self.stats.summary():
+            log.info(f'Stats : {line}')
+        return True
+
+    def _check_idle(self):
+        if self.backend.state == STATE_LOADING or not self.idle.is_idle():
+            return True
+        if self.profiler.modes:
+            # exiting would lose the profile, it is dumped by StopProfiling
+            return True
+        log.info(f'Idle for {self.idle.timeout}s, exiting')
+        self.signal_quitting.emit()
+        if self.watcher:
+            self.watcher.stop()
+        # new calls start a new daemon by DBus activation, while this one finish the calls in progress
+        self.release_name()
+        thread = threading.Thread(target=self._exit_when_done, name='dnfdbus-exit', daemon=True)
+        thread.start()
+        return False
+
+    def _exit_when_done(self):
+        # wait for the calls in progress and the snapshot to be saved, the main loop sends the replies
+        self.executor.shutdown(wait=True)
+        self.save_state('idle')
+        GLib.idle_add(self.loop.quit)
+
+    def release_name(self) -> None:
+        """ Unpublish the objects and release the service name """
+        SYSTEM_BUS.unpublish_object(DNFDBUS.object_path)
+        SYSTEM_BUS.unpublish_object(DNFDBUS_V2.object_path)
+        SYSTEM_BUS.unregister_service(DNFDBUS.service_name)
+
+    def shutdown(self) -> None:
+        """ Stop watching & the worker pool and quit the main loop """
+        self.signal_quitting.emit()
+        if self.watcher:
+            self.watcher.stop()
+        self.executor.shutdown(wait=False)
+        self.loop.quit()
+
+    def warm_up(self):
+        """ Start loading the package sack in the background, so the first call don't have to wait for it """
+        log.info("Loading the package sack in the background")
+        self.backend.setup_in_background()
+
+    def watch(self):
+        """ Reload the sack when the rpmdb or the dnf metadata cache changes """
+        self.watcher = DirectoryWatcher({'rpmdb': self.backend.rpmdb_path, 'cache': self.backend.cache_path})
+        self.watcher.changed.connect(self._watched_changed)
+        self.watcher.start()
+
+    def load_snapshot(self) -> bool:
+        """ Load the package snapshot, if it is still valid
+
+        The snapshot is used to answer by filter calls until the sack is loaded,
+        and the sack loading is started in the background.
+        """
+        if not self.snapshot_path:
+            return False
+        snapshot = Snapshot.load(self.snapshot_path)
+        if snapshot is None:
+            return False
+        if not snapshot.is_valid(read_rpmdb_cookie(), self.backend.repo_checksums()):
+            log.info(f'Package snapshot is outdated : {self.snapshot_path}')
+            return False
+        log.info(f'Using package snapshot : {self.snapshot_path}')
+        self.snapshot = snapshot
+        self.warm_up()
+        return True
+
+    def save_snapshot(self) -> None:
+        """ Save the package listings of the current sack, to be used at the next startup """
+        try:
+            rpmdb_cookie, repos = self.backend.sack_source()
+            with self.backend.lock.read():
+                listings = {flt: [pkg.dump_list for pkg in self.backend.packages.by_filter(flt)]
+                            for flt in FILTERS}
+            Snapshot(rpmdb_cookie, repos, listings).save(self.snapshot_path)
+            log.debug(f'Package snapshot saved : {self.snapshot_path}')
+        except Exception:  # pylint: disable=broad-except
+            log.exception(f'Saving the package snapshot failed : {self.snapshot_path}')
+
+    def snapshot_rows(self, flt: str):
+        """ Get the snapshot rows for a filter, None if the sack is loaded or there is no snapshot """
+        snapshot = self.snapshot
+        if snapshot is None or self.backend.is_setup:
+            return None
+        self.check_permission_read()
+        return snapshot.rows(flt)
+
+    def _watched_changed(self, name):
+        # Skip if the sack is not used yet, or it is loading, then the changes is our own
+        if not self.backend.is_setup or self.backend.state == STATE_LOADING:
+            return
+        refresh = self.backend.refresh_installed if name == 'rpmdb' else self.backend.refresh_cache
+        try:
+            self.executor.submit(refresh).add_done_callback(self._refresh_done)
+        except RuntimeError:  # the executor is shut down
+            pass
+
+    @staticmethod
+    def _refresh_done(future):
+        error = future.exception()
+        if error is not None:
+            log.error('Reloading the package sack failed', exc_info=error)
+
+    def _backend_state_changed(self, state):
+        # The backend can change state in a background thread, so emit the signal from the main loop
+        GLib.idle_add(self._emit_state_changed, state)
+
+    def _emit_state_changed(self, state):
+        if state == STATE_READY:
+            self.reactivation.mark('sack_ready')
+        self.signal_state_changed.emit(state)
+        return False
+
+    def _sack_changed(self, generation):
+        log.debug(f'Sack changed : {generation=} cache: {self.cache.stats}')
+        self.cache.clear()
+        self.snapshot = None
+        if self.snapshot_path:
+            try:
+                self.executor.submit(self.save_snapshot)
+            except RuntimeError:  # the executor is shut down
+                pass
+        GLib.idle_add(self._emit_sack_changed, generation)
+
+    def _emit_sack_changed(self, generation):
+        self.signal_sack_changed.emit(generation)
+        return False
+
     # ========================= Interface Implementation ===================================
     @logger
     def version(self) -> Str:
@@ -159,8 +779,8 @@ class DnfDbus(Publishable):
         """ Quit the DBUS Daemon"""
         self.working_start(write=False)
         log.info("Quiting dk.rasmil.DnfDbus")
-        self.signal_quitting.emit()
-        self.loop.quit()
+        self.save_state('quit')
+        self.shutdown()
         self.working_ended()
 
     @logger
@@ -168,42 +788,223 @@ class DnfDbus(Publishable):
         """ Get Repositories"""
         self.working_start(write=False)
         repos = self.backend.get_repositories()
-        return self.working_ended(json.dumps([repo.dump for repo in repos]))
+        return self.working_ended(_dumps([repo.dump for repo in repos]))
 
     @logger
+    @cached
     def get_packages_by_key(self, key: Str) -> Str:
         """ Get Packages by key """
         self.working_start(write=False)
         pkgs = self.backend.packages.by_key(key)
-        return self.working_ended(json.dumps([pkg.dump for pkg in pkgs]))
+        return self.working_ended(_dumps([pkg.dump for pkg in pkgs]))
 
     @logger
+    @from_snapshot(_dump_snapshot_json)
+    @cached
     def get_packages_by_filter(self, flt: Str, extra: bool) -> Str:
         """ Get Packages by key """
         self.working_start(write=False)
         pkgs = self.backend.packages.by_filter(flt)
         if extra:
-            return self.working_ended(json.dumps([pkg.dump_list for pkg in pkgs]))
+            return self.working_ended(_dumps([pkg.dump_list for pkg in pkgs]))
+        else:
+            return self.working_ended(_dumps([pkg.dump for pkg in pkgs]))
+
+    @logger
+    @cached
+    def get_packages_by_key_paged(self, key: Str, cursor: Str, limit: int) -> Str:
+        """ Get a page of packages by key """
+        self.working_start(write=False)
+        pkgs = self.backend.packages.by_key(key)
+        page, next_cursor = self._get_page(pkgs, cursor, limit)
+        value = {'packages': [pkg.dump for pkg in page], 'cursor': next_cursor}
+        return self.working_ended(_dumps(value))
+
+    @logger
+    @cached
+    def get_packages_by_filter_paged(self, flt: Str, extra: bool, cursor: Str, limit: int) -> Str:
+        """ Get a page of packages by filter """
+        self.working_start(write=False)
+        pkgs = self.backend.packages.by_filter(flt)
+        page, next_cursor = self._get_page(pkgs, cursor, limit)
+        if extra:
+            value = {'packages': [pkg.dump_list for pkg in page], 'cursor': next_cursor}
         else:
-            return self.working_ended(json.dumps([pkg.dump for pkg in pkgs]))
+            value = {'packages': [pkg.dump for pkg in page], 'cursor': next_cursor}
+        return self.working_ended(_dumps(value))
 
     @logger
+    @cached
     def get_package_attribute(self, pkg: str, reponame: str, attribute: str) -> str:
         self.working_start(write=False)
         value = self.backend.get_attribute(pkg, reponame, attribute)
-        return self.working_ended(json.dumps(value))
+        return self.working_ended(_dumps(value))
 
     @logger
+    @cached
     def get_categories(self) -> str:
         self.working_start(write=False)
         value = self.backend.get_categories()
-        return self.working_ended(json.dumps(value))
+        return self.working_ended(_dumps(value))
     
     @logger
+    @cached
     def get_groups_by_category(self, cat_id) -> str:
         self.working_start(write=False)
         value = self.backend.get_groups_by_category(cat_id)
-        return self.working_ended(json.dumps(value))
+        return self.working_ended(_dumps(value))
+
+    # ========================= v2 Interface Implementation ================================
+    @logger
+    def get_repositories_v2(self) -> list:
+        """ Get Repositories"""
+        self.working_start(write=False)
+        repos = self.backend.get_repositories()
+        return self.working_ended([{'id': get_variant(Str, repo.id),
+                                    'name': get_variant(Str, repo.name),
+                                    'enabled': get_variant(Bool, repo.enabled)} for repo in repos])
+
+    @logger
+    @cached
+    def get_packages_by_key_v2(self, key: Str) -> list:
+        """ Get Packages by key """
+        self.working_start(write=False)
+        pkgs = self.backend.packages.by_key(key)
+        return self.working_ended([tuple(pkg.dump) for pkg in pkgs])
+
+    @logger
+    @from_snapshot(_dump_snapshot_v2)
+    @cached
+    def get_packages_by_filter_v2(self, flt: Str, extra: bool) -> list:
+        """ Get Packages by filter """
+        self.working_start(write=False)
+        pkgs = self.backend.packages.by_filter(flt)
+        return self.working_ended(self._dump_extra(pkgs, extra))
+
+    @logger
+    @cached
+    def get_packages_by_key_paged_v2(self, key: Str, cursor: Str, limit: int) -> tuple:
+        """ Get a page of packages by key """
+        self.working_start(write=False)
+        pkgs = self.backend.packages.by_key(key)
+        page, next_cursor = self._get_page(pkgs, cursor, limit)
+        return self.working_ended(([tuple(pkg.dump) for pkg in page], next_cursor))
+
+    @logger
+    @cached
+    def get_packages_by_filter_paged_v2(self, flt: Str, extra: bool, cursor: Str, limit: int) -> tuple:
+        """ Get a page of packages by filter """
+        self.working_start(write=False)
+        pkgs = self.backend.packages.by_filter(flt)
+        page, next_cursor = self._get_page(pkgs, cursor, limit)
+        return self.working_ended((self._dump_extra(page, extra), next_cursor))
+
+    @logger
+    @cached
+    def get_packages_by_filter_columns(self, flt: Str, extra: bool) -> dict:
+        """ Get Packages by filter in the compact columnar format """
+        self.working_start(write=False)
+        pkgs = self.backend.packages.by_filter(flt)
+        return self.working_ended(self._dump_columns(pkgs, extra))
+
+    @logger
+    @cached
+    def get_packages_by_key_fields(self, key: Str) -> list:
+        """ Get Packages by key with split nevra fields """
+        self.working_start(write=False)
+        pkgs = self.backend.packages.by_key(key)
+        return self.working_ended(self._dump_fields(pkgs, False))
+
+    @logger
+    @cached
+    def get_packages_by_filter_fields(self, flt: Str, extra: bool) -> list:
+        """ Get Packages by filter with split nevra fields """
+        self.working_start(write=False)
+        pkgs = self.backend.packages.by_filter(flt)
+        return self.working_ended(self._dump_fields(pkgs, extra))
+
+    @logger
+    @cached
+    def get_package_attribute_v2(self, pkg: str, reponame: str, attribute: str) -> list:
+        self.working_start(write=False)
+        value = self.backend.get_attribute(pkg, reponame, attribute)
+        return self.working_ended([(nevra, repo, to_variant(val)) for nevra, repo, val in value])
+
+    @logger
+    @cached
+    def get_package_attributes(self, pkgs: list, attributes: list) -> list:
+        self.working_start(write=False)
+        value = self.backend.get_attributes(pkgs, attributes)
+        return self.working_ended([(nevra, repo, {attribute: to_variant(val) for attribute, val in values.items()})
+                                   for nevra, repo, values in value])
+
+    @logger
+    @cached
+    def get_package_changelog(self, pkg: str, reponame: str, since: str, cursor: str, limit: int) -> tuple:
+        self.working_start(write=False)
+        entries = self.backend.get_changelog(pkg, reponame, self._parse_date(since))
+        page, next_cursor = self._get_page(entries, cursor, limit)
+        return self.working_ended(([(nevra, repo, entry['timestamp'].isoformat(), entry['author'], entry['text'])
+                                    for nevra, repo, entry in page], next_cursor))
+
+    @logger
+    @cached
+    def get_categories_v2(self) -> list:
+        self.working_start(write=False)
+        value = self.backend.get_categories()
+        return self.working_ended([tuple(elem) for elem in value])
+
+    @logger
+    @cached
+    def get_groups_by_category_v2(self, cat_id) -> list:
+        self.working_start(write=False)
+        value = self.backend.get_groups_by_category(cat_id)
+        return self.working_ended([tuple(elem) for elem in value])
+
+    @logger
+    def refresh_repositories(self) -> dict:
+        self.working_start(write=True)
+        value = self.backend.refresh_repos()
+        return self.working_ended({'changed': get_variant(List[Str], value['changed']),
+                                   'timings': get_variant(Dict[Str, Double], value['timings']),
+                                   'reload': get_variant(Double, value['reload'])})
+
+    @logger
+    def get_reactivation(self) -> dict:
+        self.working_start(write=False)
+        value = self.reactivation.as_dict()
+        return self.working_ended({key: get_variant(Bool, val) if key == 'reactivated' else get_variant(Double, val)
+                                   for key, val in value.items()})
+
+    @logger
+    def get_stats(self) -> dict:
+        self.working_start(write=False)
+        return self.working_ended({method: to_variant(value) for method, value in self.stats.as_dict().items()})
+
+    @logger
+    def start_profiling(self, mode: str, options: dict) -> None:
+        self.working_start(write=True)
+        try:
+            self.profiler.start(mode, options)
+        except ValueError as error:
+            raise InvalidArgumentError(str(error))
+        finally:
+            self.working_ended()
+
+    @logger
+    def stop_profiling(self, mode: str) -> str:
+        self.working_start(write=True)
+        try:
+            return self.profiler.stop(mode)
+        except ValueError as error:
+            raise InvalidArgumentError(str(error))
+        finally:
+            self.working_ended()
+
+    @logger
+    def get_profiling(self) -> list:
+        self.working_start(write=False)
+        return self.working_ended(self.profiler.modes)
 
     @logger
     def test_signals(self):
@@ -212,6 +1013,91 @@ class DnfDbus(Publishable):
         self.signal_message.emit("some message")
 
     # ======================= Helpers ====================================
+    def _get_page(self, pkgs: list, cursor: str, limit: int) -> tuple:
+        """ Get a page of packages starting at cursor and the cursor for the next page
+
+        The cursor is an opaque '<generation>:<offset>' string, tied to the sack
+        generation it was created from, an empty cursor starts from the first package.
+        The returned cursor is empty when there are no more pages.
+        """
+        offset = self._parse_cursor(cursor)
+        if limit <= 0:
+            limit = PAGE_SIZE
+        end = offset + limit
+        if end < len(pkgs):
+            next_cursor = f'{self.backend.generation}:{end}'
+        else:
+            next_cursor = ''
+        return pkgs[offset:end], next_cursor
+
+    @staticmethod
+    def _dump_extra(pkgs: list, extra: bool) -> list:
+        """ Get (nevra, reponame, summary, size) tuples, summary & size are empty if not extra """
+        if extra:
+            return [tuple(pkg.dump_list) for pkg in pkgs]
+        else:
+            return [(*pkg.dump, '', 0) for pkg in pkgs]
+
+    @staticmethod
+    def _dump_fields(pkgs: list, extra: bool) -> list:
+        """ Get (name, epoch, version, release, arch, reponame, summary, size), summary & size are empty if not extra """
+        if extra:
+            return [pkg.dump_fields for pkg in pkgs]
+        else:
+            return [(pkg.name, str(pkg.epoch), pkg.version, pkg.release, pkg.arch, pkg.reponame, '', 0)
+                    for pkg in pkgs]
+
+    @staticmethod
+    def _dump_columns(pkgs: list, extra: bool) -> dict:
+        """ Get packages as column arrays, with arch & reponame interned in lookup tables """
+        arches = {}
+        repos = {}
+        names = []
+        evrs = []
+        arch_index = []
+        repo_index = []
+        for pkg in pkgs:
+            names.append(pkg.name)
+            evrs.append(pkg.evr)
+            arch_index.append(arches.setdefault(pkg.arch, len(arches)))
+            repo_index.append(repos.setdefault(pkg.reponame, len(repos)))
+        columns = {
+            'names': get_variant(List[Str], names),
+            'evrs': get_variant(List[Str], evrs),
+            'arches': get_variant(List[Str], list(arches)),
+            'arch_index': get_variant(List[UInt16], arch_index),
+            'repos': get_variant(List[Str], list(repos)),
+            'repo_index': get_variant(List[UInt16], repo_index)
+        }
+        if extra:
+            columns['summaries'] = get_variant(List[Str], [pkg.summary for pkg in pkgs])
+            columns['sizes'] = get_variant(List[UInt64], [pkg.size for pkg in pkgs])
+        return columns
+
+    def _parse_cursor(self, cursor: str) -> int:
+        """ Get the offset from a cursor, checking it belongs to the current sack """
+        if not cursor:
+            return 0
+        try:
+            generation, offset = (int(elem) for elem in cursor.split(':'))
+        except ValueError:
+            raise InvalidCursorError(f'Malformed cursor : {cursor}')
+        if offset < 0:
+            raise InvalidCursorError(f'Malformed cursor : {cursor}')
+        if generation != self.backend.generation:
+            raise InvalidCursorError(f'Cursor is from an outdated package sack : {cursor}')
+        return offset
+
+    @staticmethod
+    def _parse_date(value: str):
+        """ Get a date from an ISO date string, None if it is empty """
+        if not value:
+            return None
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            raise InvalidArgumentError(f'Invalid date : {value}')
+
     def working_start(self, write=True):
         """ Check permission and set work is being done flag """
         if write:
@@ -227,28 +1113,17 @@ class DnfDbus(Publishable):
 
     def check_permission_write(self):
         """ Check for senders permission to update system packages"""
-        if DBUS_SENDER in self.authorized_sender_write:
-            return
-        else:
-            permission = 'dk.rasmil.DnfDbus.write'
-            granted = check_permission(permission)
-            log.debug(
-                f'PolicyKit1 {permission} : granted : {granted} sender: {DBUS_SENDER}')
-            if granted:
-                self.authorized_sender_write.add(DBUS_SENDER)
-            else:
-                raise AccessDeniedError
+        self._check_permission(WRITE_ACTION)
 
     def check_permission_read(self):
         """ Check for senders permission to read system packages"""
-        if DBUS_SENDER in self.authorized_sender_read:
+        self._check_permission(READ_ACTION)
+
+    def _check_permission(self, action):
+        sender = CALLER.get()
+        if sender is None or _GRANTED.get() == action:
             return
-        else:
-            permission = 'dk.rasmil.DnfDbus.read'
-            granted = check_permission(permission)
-            log.debug(
-                f'PolicyKit1 {permission} : granted : {granted} sender: {DBUS_SENDER}')
-            if granted:
-                self.authorized_sender_read.add(DBUS_SENDER)
-            else:
-                raise AccessDeniedError
+        with timed('polkit'):
+            granted = self.authorizer.check(sender, action)
+        if not granted:
+            raise AccessDeniedError
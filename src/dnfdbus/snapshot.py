@@ -0,0 +1,91 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+dnfdbus.snapshot module
+"""
+
+import gzip
+import json
+import os
+import tempfile
+from typing import Optional
+
+from dnfdbus.misc import log
+
+# Default location of the package snapshot
+SNAPSHOT_PATH = '/var/cache/dnfdbus/snapshot.json.gz'
+
+# Bumped when the snapshot format changes, older snapshots are ignored
+SNAPSHOT_VERSION = 1
+
+# The filters stored in the snapshot
+FILTERS = ('installed', 'available', 'updates')
+
+
+class Snapshot:
+    """
+    Package listings saved to disk, to answer by filter calls at startup, before the sack is loaded
+
+    The listings have a (nevra, reponame, summary, size) row for each package, and the
+    snapshot is only valid for the rpmdb cookie & repo checksums it was made from.
+    """
+
+    def __init__(self, rpmdb_cookie: str, repos: dict, listings: dict) -> None:
+        self.rpmdb_cookie = rpmdb_cookie
+        self.repos = repos
+        self.listings = listings
+
+    def rows(self, flt: str) -> Optional[list]:
+        """ Get the rows for a filter, None if it is not in the snapshot """
+        return self.listings.get(flt)
+
+    def is_valid(self, rpmdb_cookie: str, repos: dict) -> bool:
+        """ Check if the snapshot is made from the current rpmdb & repo metadata """
+        if not rpmdb_cookie or not all(repos.values()):  # unknown state, can't be checked
+            return False
+        return rpmdb_cookie == self.rpmdb_cookie and repos == self.repos
+
+    def save(self, path: str) -> None:
+        """ Write the snapshot, replacing the old one atomically """
+        data = {'version': SNAPSHOT_VERSION, 'rpmdb_cookie': self.rpmdb_cookie,
+                'repos': self.repos, 'listings': self.listings}
+        dirname = os.path.dirname(path)
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.snapshot-')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> Optional['Snapshot']:
+        """ Read a snapshot, None if it is missing, unreadable or from another format version """
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            log.warning(f'Could not read the package snapshot {path} : {e}')
+            return None
+        if not isinstance(data, dict) or data.get('version') != SNAPSHOT_VERSION:
+            return None
+        return cls(data['rpmdb_cookie'], data['repos'], data['listings'])
@@ -0,0 +1,169 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+"""
+dnfdbus.stats module
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds (seconds) of the latency histogram buckets, the last bucket has no upper bound
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+# Upper bounds (bytes) of the reply size histogram buckets, the last bucket has no upper bound
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Phases of a call, timed separately
+PHASES = ('polkit', 'backend', 'serialize')
+
+# CallTimer of the DBus call being handled, None outside DBus calls
+CALL = ContextVar('call', default=None)
+
+
+class Histogram:
+    """ Count of values in buckets, with the sum and max. of the values """
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, bounds: tuple) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def add(self, value) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def as_dict(self) -> dict:
+        """ The histogram as a dict, buckets is [upper bound, count] pairs (the last bound is -1 = no bound) """
+        return {'count': self.count, 'sum': self.sum, 'max': self.max,
+                'buckets': [[bound, count] for bound, count in zip(self.bounds + (-1,), self.counts)]}
+
+
+class CallTimer:
+    """ Time spent in the phases of a single call """
+
+    __slots__ = ('started', 'phases')
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase: str):
+    """ Add the time spent in the block to a phase of the call being handled """
+    timer = CALL.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(phase, time.perf_counter() - start)
+
+
+def run_timed(fn, *args):
+    """ Run fn, adding the time not spent in the other phases to the backend phase of the call being handled """
+    timer = CALL.get()
+    if timer is None:
+        return fn(*args)
+    other = sum(timer.phases.values())
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        timer.add('backend', time.perf_counter() - start - (sum(timer.phases.values()) - other))
+
+
+class MethodStats:
+    """ Statistics for calls of a method """
+
+    __slots__ = ('calls', 'errors', 'latency', 'phases', 'reply_size')
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.phases = {phase: Histogram(LATENCY_BUCKETS) for phase in PHASES}
+        self.reply_size = Histogram(SIZE_BUCKETS)
+
+    def as_dict(self) -> dict:
+        return {'calls': self.calls, 'errors': self.errors, 'latency': self.latency.as_dict(),
+                'phases': {phase: hist.as_dict() for phase, hist in self.phases.items()},
+                'reply_size': self.reply_size.as_dict()}
+
+
+class CallStats:
+    """ Per method call counts, error counts, latency histograms and reply sizes """
+
+    def __init__(self) -> None:
+        self._methods = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._methods)
+
+    def record(self, method: str, timer: CallTimer, error: bool = False, size: int = 0) -> None:
+        """ Record a finished call of method (Ex. 'dk.rasmil.DnfDbus.V2.GetRepositories') """
+        elapsed = timer.elapsed
+        with self._lock:
+            stats = self._methods.get(method)
+            if stats is None:
+                stats = self._methods[method] = MethodStats()
+            stats.calls += 1
+            if error:
+                stats.errors += 1
+            stats.latency.add(elapsed)
+            for phase, hist in stats.phases.items():
+                if phase in timer.phases:
+                    hist.add(timer.phases[phase])
+            if not error:
+                stats.reply_size.add(size)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {method: stats.as_dict() for method, stats in self._methods.items()}
+
+    def summary(self) -> list:
+        """ A line for each method, with counts, mean & max latency and the mean phase times in ms """
+        lines = []
+        with self._lock:
+            for method, stats in sorted(self._methods.items()):
+                mean = stats.latency.sum / stats.calls * 1000
+                phases = ' '.join(f'{phase}={hist.sum / hist.count * 1000:.1f}'
+                                  for phase, hist in stats.phases.items() if hist.count)
+                lines.append(f'{method} : calls={stats.calls} errors={stats.errors} '
+                             f'mean={mean:.1f} max={stats.latency.max * 1000:.1f} {phases} '
+                             f'bytes={stats.reply_size.sum}')
+        return lines
@@ -0,0 +1,73 @@
+#    Copyright (C) 2021 Tim Lauridsen < tla[at]rasmil.dk >
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to
+#    the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+dnfdbus.watcher module
+
+Watch directories for changes using Gio file monitors (inotify on Linux)
+"""
+
+from dasbus.signal import Signal
+from gi.repository import Gio, GLib
+
+from dnfdbus.misc import log
+
+# Default number of seconds without changes, before a change is reported
+DELAY = 2.0
+
+
+class DirectoryWatcher:
+    """
+    Watch a set of directories for changes
+
+    Bursts of changes are debounced, the changed signal is emitted with the
+    name of the changed directory, when it has been unchanged for delay seconds.
+    """
+
+    def __init__(self, paths: dict, delay: float = DELAY) -> None:
+        self.paths = paths  # name -> directory path
+        self.delay = delay
+        self.changed = Signal()
+        self._monitors = []
+        self._timeouts = {}
+
+    def start(self):
+        for name, path in self.paths.items():
+            log.debug(f'Watching {name} : {path}')
+            monitor = Gio.File.new_for_path(path).monitor_directory(Gio.FileMonitorFlags.NONE, None)
+            monitor.connect('changed', self._on_changed, name)
+            self._monitors.append(monitor)
+
+    def stop(self):
+        for monitor in self._monitors:
+            monitor.cancel()
+        self._monitors = []
+        for source_id in self._timeouts.values():
+            GLib.source_remove(source_id)
+        self._timeouts = {}
+
+    def _on_changed(self, monitor, file, other_file, event_type, name):
+        # restart the delay on every change
+        if name in self._timeouts:
+            GLib.source_remove(self._timeouts[name])
+        self._timeouts[name] = GLib.timeout_add(int(self.delay * 1000), self._emit_changed, name)
+
+    def _emit_changed(self, name):
+        del self._timeouts[name]
+        log.debug(f'{name} changed')
+        self.changed.emit(name)
+        return False
@@ -1,5 +1,8 @@
 """ Unit Test for dnfdbus.backend """
 
+import datetime
+import os
+import tempfile
 import unittest
 from collections import namedtuple
 from unittest.mock import MagicMock, Mock, patch
@@ -7,7 +10,8 @@ from unittest.mock import MagicMock, Mock, patch
 import dnfdbus.client as client
 from dnfdbus.backend.repo import DnfRepository
 from dnfdbus.backend.packages import DnfPkg
-from dnfdbus.backend import DnfBackend
+from dnfdbus.backend import STATE_ERROR, STATE_IDLE, STATE_LOADING, STATE_READY, DnfBackend
+from dnfdbus.backend.changelogs import DnfChangelogs
 
 FakeDnfPkg = namedtuple(
     'DnfPkg', "name epoch version release arch reponame summary description")
@@ -57,6 +61,8 @@ def dnf_mock():
     repo3.name = 'id3'
     repo3.enabled = False
     base.repos = {"id1": repo1, "id2": repo2, "id3": repo3}
+    for repo in base.repos.values():
+        repo._repo.getCachedir.return_value = f'/nonexisting/cache/{repo.id}'
     return base
 
 
@@ -101,6 +107,131 @@ class TestDnfBackend(unittest.TestCase):
         self.base.read_all_repos.assert_called_once()
         self.base.fill_sack.assert_called_once()
 
+    def test_generation(self):
+        """ Testing the sack generation is bumped when the sack is loaded"""
+        self.assertEqual(self.backend.generation, 0)
+        self.backend.setup()
+        self.assertEqual(self.backend.generation, 1)
+        self.backend.setup()
+        self.assertEqual(self.backend.generation, 1)
+        self.backend.setup(refresh=True)
+        self.assertEqual(self.backend.generation, 2)
+
+    def test_sack_changed(self):
+        """ Testing the sack_changed signal is emitted when the sack is loaded"""
+        generations = []
+        self.backend.sack_changed.connect(generations.append)
+        self.backend.setup()
+        self.backend.setup()
+        self.backend.setup(refresh=True)
+        self.assertEqual(generations, [1, 2])
+
+    def test_generation_seed(self):
+        backend = DnfBackend(self.base, generation=1000)
+        backend.setup()
+        self.assertEqual(backend.generation, 1001)
+
+    @patch('dnfdbus.backend.read_rpmdb_cookie')
+    def test_refresh_installed(self, mock_cookie):
+        """ Testing the sack is only reloaded when the rpmdb has changed"""
+        mock_cookie.return_value = 'cookie1'
+        # nothing to refresh, before the sack is loaded
+        self.assertEqual(self.backend.refresh_installed(), False)
+        self.backend.setup()
+        self.assertEqual(self.backend.refresh_installed(), False)
+        self.base.fill_sack_from_repos_in_cache.assert_not_called()
+        mock_cookie.return_value = 'cookie2'
+        self.assertEqual(self.backend.refresh_installed(), True)
+        self.base.fill_sack_from_repos_in_cache.assert_called_once()
+        self.assertEqual(self.backend.generation, 2)
+
+    def test_refresh_cache(self):
+        """ Testing the sack is only reloaded when the cached repo metadata has changed"""
+        self.backend.repo_checksums = MagicMock(return_value={'id1': 'aaa'})
+        self.assertEqual(self.backend.refresh_cache(), False)
+        self.backend.setup()
+        # the solv files written while loading the sack don't change the checksums
+        self.assertEqual(self.backend.refresh_cache(), False)
+        self.base.fill_sack_from_repos_in_cache.assert_not_called()
+        self.backend.repo_checksums.return_value = {'id1': 'bbb'}
+        self.assertEqual(self.backend.refresh_cache(), True)
+        self.base.fill_sack_from_repos_in_cache.assert_called_once()
+        self.assertEqual(self.backend.generation, 2)
+        self.assertEqual(self.backend.refresh_cache(), False)
+
+    def test_refresh_repos(self):
+        """ Testing the sack is only reloaded, when a repo has changed"""
+        repos = self.base.repos
+        repos['id1'].get_metadata_path.return_value = '/cache/id1/aaa-primary.xml.gz'
+        repos['id2'].get_metadata_path.return_value = '/cache/id2/bbb-primary.xml.gz'
+        self.backend.setup()
+        # the repos is loaded holding the repo lock
+        repos['id1'].load.side_effect = lambda: self.assertTrue(self.backend.repo_lock.locked())
+        res = self.backend.refresh_repos()
+        self.assertEqual(res['changed'], [])
+        self.assertEqual(sorted(res['timings']), ['id1', 'id2'])
+        repos['id1'].load.assert_called_once()
+        repos['id3'].load.assert_not_called()
+        self.base.fill_sack_from_repos_in_cache.assert_not_called()
+        # new metadata for id2
+        repos['id2'].get_metadata_path.return_value = '/cache/id2/ccc-primary.xml.gz'
+        res = self.backend.refresh_repos()
+        self.assertEqual(res['changed'], ['id2'])
+        self.base.fill_sack_from_repos_in_cache.assert_called_once()
+        self.assertEqual(self.backend.generation, 2)
+        # the new metadata is now loaded
+        res = self.backend.refresh_repos()
+        self.assertEqual(res['changed'], [])
+
+    def test_repo_checksums(self):
+        """ Testing the checksums of the cached repomd.xml files"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.makedirs(os.path.join(tmpdir, 'repodata'))
+            with open(os.path.join(tmpdir, 'repodata', 'repomd.xml'), 'w') as f:
+                f.write('<repomd/>')
+            self.base.repos['id1']._repo.getCachedir.return_value = tmpdir
+            checksums = self.backend.repo_checksums()
+        self.base.read_all_repos.assert_called_once()
+        self.assertEqual(len(checksums['id1']), 64)
+        # not cached
+        self.assertEqual(checksums['id2'], '')
+        self.assertNotIn('id3', checksums)
+
+    @patch('dnfdbus.backend.read_rpmdb_cookie')
+    def test_sack_source(self, mock_cookie):
+        """ Testing the rpmdb cookie & repo checksums of the loaded sack"""
+        mock_cookie.return_value = 'cookie1'
+        self.backend.setup()
+        mock_cookie.return_value = 'cookie2'
+        self.assertEqual(self.backend.sack_source(), ('cookie1', {'id1': '', 'id2': ''}))
+
+    def test_state(self):
+        """ Testing the state changes when the sack is loaded"""
+        states = []
+        self.backend.state_changed.connect(states.append)
+        self.assertEqual(self.backend.state, STATE_IDLE)
+        self.backend.setup()
+        self.assertEqual(self.backend.state, STATE_READY)
+        self.assertEqual(states, [STATE_LOADING, STATE_READY])
+
+    def test_state_error(self):
+        """ Testing the state is error, when loading the sack fails"""
+        self.base.fill_sack.side_effect = RuntimeError('failed')
+        with self.assertRaises(RuntimeError):
+            self.backend.setup()
+        self.assertEqual(self.backend.state, STATE_ERROR)
+        self.assertEqual(self.backend.is_setup, False)
+
+    def test_setup_in_background(self):
+        """ Testing loading the sack in the background"""
+        thread = self.backend.setup_in_background()
+        thread.join()
+        self.assertEqual(self.backend.is_setup, True)
+        self.assertEqual(self.backend.state, STATE_READY)
+        # later calls don't load the sack again
+        self.backend.get_repositories()
+        self.base.fill_sack.assert_called_once()
+
     def test_get_repositories(self):
         res = self.backend.get_repositories()
         self.assertIsInstance(res, list)
@@ -123,6 +254,117 @@ class TestDnfBackend(unittest.TestCase):
         self.assertEqual(reponame, 'myrepo')
         self.assertEqual(desc, "description")
 
+    @patch('dnf.subject.Subject')
+    def test_get_attribute_changelog(self, mock_sbj):
+        """ Testing changelogs is read from the changelog store, not by reloading the sack"""
+        mock_sbj().get_best_selector().matches.return_value = [FAKE_PKG_1]
+        self.backend._changelogs = MagicMock()
+        # read without holding the sack lock, it can download metadata
+        self.backend._changelogs.get.side_effect = \
+            lambda pkgs: self.assertEqual(self.backend.lock._readers, 0) or [['changelog']]
+        res = self.backend.get_attribute('AtomicParsley', "", 'changelog')
+        self.assertEqual(res, [('AtomicParsley-0.9.5-17.fc34.x86_64', 'myrepo', ['changelog'])])
+        self.base.fill_sack.assert_called_once()
+
+    @patch('dnf.subject.Subject')
+    def test_get_changelog(self, mock_sbj):
+        """ Testing the changelog entries can be limited by date"""
+        mock_sbj().get_best_selector().matches.return_value = [FAKE_PKG_1, FAKE_PKG_2]
+        entries = [{'timestamp': datetime.date(2021, 5, 1), 'author': 'Jane', 'text': '- new'},
+                   {'timestamp': datetime.date(2021, 1, 1), 'author': 'John', 'text': '- old'}]
+        self.backend._changelogs = MagicMock()
+        self.backend._changelogs.get.return_value = [entries, entries[1:]]
+        res = self.backend.get_changelog('AtomicParsley', "")
+        self.assertEqual(len(res), 3)
+        self.assertEqual(res[2], ('AtomicParsley-0.9.5-17.fc34.x86_64', '@System', entries[1]))
+        res = self.backend.get_changelog('AtomicParsley', "", since=datetime.date(2021, 1, 1))
+        self.assertEqual(res, [('AtomicParsley-0.9.5-17.fc34.x86_64', 'myrepo', entries[0])])
+
+    @patch('dnf.subject.Subject')
+    def test_get_changelog_packages(self, mock_sbj):
+        """ Testing the changelog entries of several packages (ex. installed kernels) is merged newest first"""
+        mock_sbj().get_best_selector().matches.return_value = [FAKE_PKG_2, FAKE_PKG_1]
+        old = [{'timestamp': datetime.date(2021, 3, 1), 'author': 'John', 'text': '- old 2'},
+               {'timestamp': datetime.date(2021, 1, 1), 'author': 'John', 'text': '- old 1'}]
+        new = [{'timestamp': datetime.date(2021, 5, 1), 'author': 'Jane', 'text': '- new'}] + old
+        self.backend._changelogs = MagicMock()
+        self.backend._changelogs.get.return_value = [old, new]
+        res = self.backend.get_changelog('AtomicParsley', "")
+        self.assertEqual([entry['text'] for nevra, reponame, entry in res],
+                         ['- new', '- old 2', '- old 2', '- old 1', '- old 1'])
+        self.assertEqual(res[0][1], 'myrepo')
+        res = self.backend.get_changelog('AtomicParsley', "", since=datetime.date(2021, 2, 1))
+        self.assertEqual([entry['text'] for nevra, reponame, entry in res], ['- new', '- old 2', '- old 2'])
+
+    def test_get_attributes(self):
+        self.base.sack.query().filter.return_value = [FAKE_PKG_1, FAKE_PKG_2]
+        nevras = ['AtomicParsley-0.9.5-17.fc34.x86_64', 'Box2D-2.4.1-5.fc34.x86_64']
+        res = self.backend.get_attributes(nevras, ['summary', 'description', 'notfound'])
+        # all packages is found in one query
+        self.base.sack.query().filter.assert_called_once_with(nevra=nevras)
+        self.assertEqual(len(res), 2)
+        nevra, reponame, values = res[1]
+        self.assertEqual(nevra, 'AtomicParsley-0.9.5-17.fc34.x86_64')
+        self.assertEqual(reponame, '@System')
+        self.assertEqual(values, {'summary': 'summary', 'description': 'description', 'notfound': None})
+
+
+class TestDnfChangelogs(unittest.TestCase):
+
+    def setUp(self):
+        self.base = dnf_mock()
+        self.base.repos = MagicMock()
+        self.base.conf = MagicMock()
+        self.backend = DnfBackend(self.base)
+        self.changelogs = DnfChangelogs(self.backend)
+
+    @patch('dnfdbus.backend.changelogs.rpm')
+    def test_rpmdb_changelog(self, mock_rpm):
+        hdr = {mock_rpm.RPMTAG_VERSION: '0.9.5', mock_rpm.RPMTAG_RELEASE: '17.fc34',
+               mock_rpm.RPMTAG_ARCH: 'x86_64', mock_rpm.RPMTAG_EPOCH: None,
+               mock_rpm.RPMTAG_CHANGELOGTIME: [1600000000, 1500000000],
+               mock_rpm.RPMTAG_CHANGELOGNAME: ['Jane <jane@example.com> - 0.9.5-17', 'John - 0.9.4-1'],
+               mock_rpm.RPMTAG_CHANGELOGTEXT: ['- rebuild', '- update']}
+        mock_rpm.TransactionSet().dbMatch.return_value = [hdr]
+        res = self.changelogs.get([DnfPkg(FAKE_PKG_2)])
+        mock_rpm.TransactionSet().dbMatch.assert_called_with('name', 'AtomicParsley')
+        self.assertEqual(len(res[0]), 2)
+        self.assertEqual(res[0][0]['text'], '- rebuild')
+        self.assertEqual(res[0][0]['timestamp'], datetime.date.fromtimestamp(1600000000))
+        # the main sack is not touched
+        self.base.fill_sack.assert_not_called()
+
+    @patch('dnfdbus.backend.changelogs.hawkey')
+    def test_repo_changelog(self, mock_hawkey):
+        mock_hawkey.SYSTEM_REPO_NAME = '@System'
+        sack = mock_hawkey.Sack.return_value
+        old = {'timestamp': datetime.date(2020, 1, 1), 'author': 'John', 'text': '- old'}
+        new = {'timestamp': datetime.date(2021, 1, 1), 'author': 'Jane', 'text': '- new'}
+        sack.query().filter.return_value = [Mock(changelogs=[old, new])]
+        repo = self.base.repos.get.return_value
+        repo._repo.getCachedir.return_value = '/cache/myrepo'
+        repo.get_metadata_path.side_effect = lambda md: f'/cache/myrepo/repodata/{md}.xml.zst'
+        repo.load.side_effect = lambda: self.assertTrue(self.backend.repo_lock.locked())
+        res = self.changelogs.get([DnfPkg(FAKE_PKG_1), DnfPkg(FAKE_PKG_1)])
+        # newest entries first
+        self.assertEqual(res, [[new, old], [new, old]])
+        # the other metadata is only loaded once for the repo, in the changelog sack
+        repo.load.assert_called_once()
+        metadata = mock_hawkey.Repo.return_value
+        mock_hawkey.Repo.assert_called_once_with('myrepo')
+        self.assertEqual(metadata.repomd_fn, '/cache/myrepo/repodata/repomd.xml')
+        self.assertEqual(metadata.primary_fn, '/cache/myrepo/repodata/primary.xml.zst')
+        self.assertEqual(metadata.other_fn, '/cache/myrepo/repodata/other.xml.zst')
+        # the libdnf repo is not attached to the changelog sack
+        sack.load_repo.assert_called_once_with(metadata, build_cache=False, load_filelists=False,
+                                               load_presto=False, load_updateinfo=False, load_other=True)
+        self.assertEqual(repo.load_metadata_other, False)
+        self.base.fill_sack.assert_not_called()
+        # dropped when the main sack is reloaded
+        self.backend.generation += 1
+        self.changelogs.get([DnfPkg(FAKE_PKG_1)])
+        self.assertEqual(sack.load_repo.call_count, 2)
+
 
 class TestDnfPackages(unittest.TestCase):
 
@@ -150,6 +392,29 @@ class TestDnfPackages(unittest.TestCase):
         res = pkgs.installed
         self._assert_test_packages(res)
 
+    def test_pkg_rows_cached(self):
+        """ Testing the package rows is only made once for a sack generation"""
+        self.base.sack.query().installed.return_value = TEST_PKG_LIST
+        pkgs = self.backend.packages
+        res = pkgs.installed
+        self.assertIs(pkgs.by_filter('installed'), res)
+        self.base.sack.query().installed.assert_called_once()
+        self.backend.setup(refresh=True)
+        self.assertIsNot(pkgs.installed, res)
+        self._assert_test_packages(pkgs.installed)
+
+    def test_pkg_nevra(self):
+        """ Testing the nevra is made once and hawkey int epochs is handled"""
+        po = DnfPkg(FAKE_PKG_1._replace(epoch=0))
+        self.assertEqual(str(po), 'AtomicParsley-0.9.5-17.fc34.x86_64')
+        self.assertIs(str(po), str(po))
+        self.assertEqual(po.evr, '0.9.5-17.fc34')
+        self.assertEqual(po.dump, ['AtomicParsley-0.9.5-17.fc34.x86_64', 'myrepo'])
+        po = DnfPkg(FAKE_PKG_1._replace(epoch=2))
+        self.assertEqual(str(po), 'AtomicParsley-2:0.9.5-17.fc34.x86_64')
+        with self.assertRaises(AttributeError):
+            po.other = 1
+
     def test_pkg_available(self):
         self.base.sack.query().available().latest.return_value = TEST_PKG_LIST
         pkgs = self.backend.packages
@@ -167,6 +432,29 @@ class TestDnfPackages(unittest.TestCase):
         # returns list of DnfPkg
         self._assert_test_packages(res)
 
+    @patch('dnf.subject.Subject')
+    def test_pkg_by_key_index(self, mock_sbj):
+        """ Testing name globs is found in the name index"""
+        self.base.sack.query.return_value = TEST_PKG_LIST
+        pkgs = self.backend.packages
+        res = pkgs.by_key("NetworkManager*")
+        self.assertEqual([str(pkg.pkg) for pkg in res],
+                         [str(pkg) for pkg in TEST_PKG_LIST[7:]])
+        res = pkgs.by_key("*Manager*")
+        self.assertEqual(len(res), 5)
+        mock_sbj.assert_not_called()
+        # the index is only build once for a sack generation
+        self.assertIs(pkgs.name_index, pkgs.name_index)
+        index = pkgs.name_index
+        self.backend.setup(refresh=True)
+        self.assertIsNot(pkgs.name_index, index)
+        # not a name glob or no matches, resolved by dnf
+        mock_sbj().get_best_query.return_value = TEST_PKG_LIST
+        pkgs.by_key("NetworkManager-1:1.30.4-1.fc34.x86_64")
+        mock_sbj.assert_called_with("NetworkManager-1:1.30.4-1.fc34.x86_64")
+        pkgs.by_key("*notfound*")
+        mock_sbj.assert_called_with("*notfound*")
+
     def test_pkg_by_filter_installed(self):
         self.base.sack.query().installed.return_value = TEST_PKG_LIST
         pkgs = self.backend.packages
@@ -0,0 +1,81 @@
+import unittest
+from unittest.mock import MagicMock
+
+from dnfdbus.cache import ResultCache, estimate_size
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResultCache(2)
+
+    def test_get_put(self):
+        self.assertEqual(self.cache.get(('foo',), 1), None)
+        self.cache.put(('foo',), 1, 'bar')
+        self.assertEqual(self.cache.get(('foo',), 1), 'bar')
+        # other generation
+        self.assertEqual(self.cache.get(('foo',), 2), None)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_lru(self):
+        self.cache.put(('a',), 1, 'a')
+        self.cache.put(('b',), 1, 'b')
+        # use a, so b is the least recently used
+        self.cache.get(('a',), 1)
+        self.cache.put(('c',), 1, 'c')
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.get(('b',), 1), None)
+        self.assertEqual(self.cache.get(('a',), 1), 'a')
+        self.assertEqual(self.cache.get(('c',), 1), 'c')
+
+    def test_get_or_call(self):
+        func = MagicMock(return_value='value')
+        self.assertEqual(self.cache.get_or_call(('foo',), 1, func), 'value')
+        self.assertEqual(self.cache.get_or_call(('foo',), 1, func), 'value')
+        func.assert_called_once()
+        self.assertEqual(self.cache.stats, {'size': 1, 'maxsize': 2, 'bytes': 0, 'maxbytes': 0,
+                                            'hits': 1, 'misses': 1})
+
+    def test_clear(self):
+        self.cache.put(('foo',), 1, 'bar')
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.get(('foo',), 1), None)
+
+    def test_disabled(self):
+        cache = ResultCache(0)
+        cache.put(('foo',), 1, 'bar')
+        self.assertEqual(len(cache), 0)
+
+    def test_maxbytes(self):
+        """ test the least recently used results is dropped, when the results is too large in total """
+        cache = ResultCache(10, maxbytes=10)
+        cache.put(('a',), 1, 'aaaa')
+        cache.put(('b',), 1, 'bbbb')
+        self.assertEqual(cache.nbytes, 8)
+        cache.put(('c',), 1, 'cccc')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.nbytes, 8)
+        self.assertEqual(cache.get(('a',), 1), None)
+        # replacing a result
+        cache.put(('c',), 1, 'cc')
+        self.assertEqual(cache.nbytes, 6)
+        # a result larger than maxbytes is not cached
+        cache.put(('d',), 1, 'd' * 11)
+        self.assertEqual(cache.get(('d',), 1), None)
+        self.assertEqual(len(cache), 2)
+        cache.clear()
+        self.assertEqual(cache.nbytes, 0)
+
+    def test_estimate_size(self):
+        self.assertEqual(estimate_size('abc'), 3)
+        self.assertEqual(estimate_size([]), 0)
+        self.assertEqual(estimate_size({'key': 'value'}), 8)
+        variant = MagicMock()
+        variant.get_size.return_value = 100
+        self.assertEqual(estimate_size({'names': variant}), 105)
+        # large lists is estimated from a sample
+        rows = [('foo-1.0-1.fc34.noarch', 'fedora')] * 10000
+        self.assertEqual(estimate_size(rows), 10000 * 27)
+        self.assertEqual(estimate_size(([('a', 1)], 'cursor')), 1 + 8 + 6)
@@ -1,8 +1,10 @@
+import asyncio
+import datetime
 import json
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
-from dnfdbus.client import DnfDbusClient, Package, Repository
+from dnfdbus.client import AsyncDnfDbusClient, DnfDbusClient, Package, Repository
 
 
 class TestPackage(unittest.TestCase):
@@ -19,6 +21,18 @@ class TestPackage(unittest.TestCase):
         self.assertEqual(
             repr(pkg), 'Package(foo-too-loo-3:2.3.0-1.fc34.noarch)')
 
+    def testPackageFromFields(self):
+        pkg = Package.from_fields('foo-too-loo', '3', '2.3.0', '1.fc34', 'noarch', 'myrepo')
+        self.assertEqual(pkg, Package('foo-too-loo-3:2.3.0-1.fc34.noarch', 'myrepo'))
+        pkg = Package.from_fields('foo-too-loo', '3', '2.3.0', '1.fc34', 'noarch', 'myrepo', 'summary', 100)
+        self.assertNotEqual(pkg, Package('foo-too-loo-3:2.3.0-1.fc34.noarch', 'myrepo'))
+        self.assertEqual(str(pkg), 'foo-too-loo-3:2.3.0-1.fc34.noarch')
+        self.assertEqual(pkg.summary, 'summary')
+        self.assertEqual(pkg.size, 100)
+        # lightweight objects, without a __dict__
+        with self.assertRaises(AttributeError):
+            pkg.other = 1
+
 
 class TestRepository(unittest.TestCase):
 
@@ -40,6 +54,46 @@ class TestClient(unittest.TestCase):
         self.client.get_async_method = self.mock_async
         self.mock_async.return_value = self.mock_async_method
 
+    @patch('dnfdbus.client.SYSTEM_BUS')
+    def testCache(self, mock_bus):
+        """ Test the client cache is used until the sack changes"""
+        self.client.proxy.Generation = 1
+        self.client.enable_cache()
+        self.client.proxy.SackChanged.connect.assert_called_with(self.client._sack_changed)
+        self.mock_async_method.return_value = [['foo-too-loo-3:2.3.0-1.fc34.noarch', 'myrepo']]
+        pkgs = self.client.get_packages_by_filter("installed")
+        self.assertIs(self.client.get_packages_by_filter("installed"), pkgs)
+        self.client.get_packages_by_filter("installed", extra=True)
+        self.assertEqual(self.mock_async_method.call_count, 2)
+        # the daemon signals the sack has changed
+        self.client._sack_changed(2)
+        self.assertEqual(self.client.generation, 2)
+        self.assertIsNot(self.client.get_packages_by_filter("installed"), pkgs)
+        self.assertEqual(self.mock_async_method.call_count, 3)
+
+    @patch('dnfdbus.client.SYSTEM_BUS')
+    def testCacheDaemonExit(self, mock_bus):
+        """ Test the client cache is cleared when the daemon exits"""
+        self.client.proxy.Generation = 1
+        self.client.enable_cache()
+        mock_bus.proxy.NameOwnerChanged.connect.assert_called_with(self.client._name_owner_changed)
+        self.mock_async_method.return_value = [['foo-too-loo-3:2.3.0-1.fc34.noarch', 'myrepo']]
+        self.client.get_packages_by_filter("installed")
+        # other names is ignored
+        self.client._name_owner_changed('org.example.Foo', ':1.42', '')
+        self.client.get_packages_by_filter("installed")
+        self.assertEqual(self.mock_async_method.call_count, 1)
+        self.client._name_owner_changed('dk.rasmil.DnfDbus', ':1.42', '')
+        self.client.get_packages_by_filter("installed")
+        self.assertEqual(self.mock_async_method.call_count, 2)
+
+    def testNoCache(self):
+        """ Test the results is not cached by default"""
+        self.mock_async_method.return_value = ["Category"]
+        self.client.get_categories()
+        self.client.get_categories()
+        self.assertEqual(self.mock_async_method.call_count, 2)
+
     def testVersion(self):
         """ Test version property """
         self.client.proxy.Version = '7.0'
@@ -117,6 +171,59 @@ class TestClient(unittest.TestCase):
         self.assertEqual(pkg.size, 100000)
         self.assertEqual(pkg.summary, 'package summary')
 
+    def testGetPackagesByFilterCompact(self):
+        """ Test get_packages_by_filter() method with the columnar format"""
+        self.mock_async_method.return_value = {
+            'names': ['foo-too-loo', 'bar'],
+            'evrs': ['3:2.3.0-1.fc34', '1.0-1.fc34'],
+            'arches': ['noarch', 'x86_64'],
+            'arch_index': [0, 1],
+            'repos': ['myrepo'],
+            'repo_index': [0, 0],
+            'summaries': ['package summary', 'other summary'],
+            'sizes': [100000, 200]
+        }
+        pkgs = self.client.get_packages_by_filter("installed", True, compact=True)
+        self.mock_async.assert_called_with("GetPackagesByFilterColumns")
+        self.mock_async_method.assert_called_with("installed", True)
+        self.assertEqual(len(pkgs), 2)
+        pkg = pkgs[0]
+        self.assertIsInstance(pkg, Package)
+        self.assertEqual(str(pkg), 'foo-too-loo-3:2.3.0-1.fc34.noarch')
+        self.assertEqual(pkg.reponame, 'myrepo')
+        self.assertEqual(pkg.summary, 'package summary')
+        self.assertEqual(pkg.size, 100000)
+        self.assertEqual(str(pkgs[1]), 'bar-1.0-1.fc34.x86_64')
+
+    def testIterPackagesByFilter(self):
+        """ Test iter_packages_by_filter() method"""
+        self.mock_async_method.side_effect = [
+            ([('foo-too-loo-3:2.3.0-1.fc34.noarch', 'myrepo', 'package summary', 100000)], '1:1'),
+            ([('bar-1.0-1.fc34.noarch', 'myrepo', 'other summary', 200)], '')]
+        pkgs = self.client.iter_packages_by_filter("installed", True, page_size=1)
+        # nothing is fetched before the generator is consumed
+        self.mock_async_method.assert_not_called()
+        pkgs = list(pkgs)
+        self.mock_async.assert_called_with("GetPackagesByFilterPaged")
+        self.mock_async_method.assert_any_call("installed", True, '', 1)
+        self.mock_async_method.assert_called_with("installed", True, '1:1', 1)
+        self.assertEqual(len(pkgs), 2)
+        self.assertIsInstance(pkgs[0], Package)
+        self.assertEqual(pkgs[0].name, 'foo-too-loo')
+        self.assertEqual(pkgs[0].size, 100000)
+        self.assertEqual(pkgs[1].name, 'bar')
+        self.assertEqual(pkgs[1].summary, 'other summary')
+
+    def testIterPackagesByKey(self):
+        """ Test iter_packages_by_key() method"""
+        self.mock_async_method.return_value = (
+            [('foo-too-loo-3:2.3.0-1.fc34.noarch', 'myrepo')], '')
+        pkgs = list(self.client.iter_packages_by_key("*too-loo*"))
+        self.mock_async.assert_called_with("GetPackagesByKeyPaged")
+        self.mock_async_method.assert_called_with("*too-loo*", '', 500)
+        self.assertEqual(len(pkgs), 1)
+        self.assertEqual(pkgs[0].reponame, 'myrepo')
+
     def testGetPackageAttribute(self):
         """ Test get_package_attribues() method"""
         self.mock_async_method.return_value = [('qt6-assistant-6.1.0-2.fc34.x86_64', '@System', 'Documentation browser for Qt6.'),
@@ -134,8 +241,149 @@ class TestClient(unittest.TestCase):
         self.assertEqual(reponame, '@System')
         self.assertEqual(desc, 'Documentation browser for Qt6.')
 
+    def testGetPackagesByFilterFields(self):
+        """ Test get_packages_by_filter() with split nevra fields"""
+        self.mock_async_method.return_value = [
+            ('foo-too-loo', '3', '2.3.0', '1.fc34', 'noarch', 'myrepo', 'package summary', 100000)]
+        pkgs = self.client.get_packages_by_filter("installed", True, fields=True)
+        self.mock_async.assert_called_with("GetPackagesByFilterFields")
+        self.mock_async_method.assert_called_with("installed", True)
+        self.assertEqual(str(pkgs[0]), 'foo-too-loo-3:2.3.0-1.fc34.noarch')
+        self.assertEqual(pkgs[0].summary, 'package summary')
+        self.assertEqual(pkgs[0].size, 100000)
+        pkgs = self.client.get_packages_by_key("foo*", fields=True)
+        self.mock_async.assert_called_with("GetPackagesByKeyFields")
+        self.assertEqual(pkgs[0].reponame, 'myrepo')
+
+    def testGetChangelog(self):
+        """ Test get_changelog() & iter_changelog() methods"""
+        entry = ('foo-1.0-2.fc34.noarch', 'updates', '2021-05-01', 'Jane - 1.0-2', '- fix')
+        self.mock_async_method.return_value = ([entry], '1:1')
+        res = self.client.get_changelog('foo', 'updates', since=datetime.date(2021, 1, 1), limit=1)
+        self.mock_async.assert_called_with("GetPackageChangelog")
+        self.mock_async_method.assert_called_with('foo', 'updates', '2021-01-01', '', 1)
+        self.assertEqual(res, [entry])
+        # all entries, fetched a page at the time
+        self.mock_async_method.side_effect = [([entry], '1:1'), ([entry], '')]
+        res = self.client.get_changelog('foo')
+        self.mock_async_method.assert_called_with('foo', '', '', '1:1', 500)
+        self.assertEqual(res, [entry, entry])
+
+    def testGetUpdateChangelog(self):
+        """ Test get_update_changelog() method"""
+        installed = ('foo-1.0-1.fc34.noarch', '@System', '2021-01-01', 'Jane - 1.0-1', '- initial')
+        entry = ('foo-1.0-2.fc34.noarch', 'updates', '2021-05-01', 'Jane - 1.0-2', '- fix')
+        self.mock_async_method.side_effect = [([installed], '1:1'), ([entry], '')]
+        res = self.client.get_update_changelog(Package('foo-1.0-2.fc34.noarch', 'updates'))
+        self.mock_async_method.assert_any_call('foo.noarch', '@System', '', '', 20)
+        self.mock_async_method.assert_called_with('foo-1.0-2.fc34.noarch', 'updates', '2020-12-31', '', 500)
+        self.assertEqual(res, [entry])
+
+    def testGetUpdateChangelogSameDay(self):
+        """ Test entries from the same day as the newest installed entry is not dropped"""
+        installed = ('foo-1.0-1.fc34.noarch', '@System', '2021-01-01', 'Jane - 1.0-1', '- initial')
+        rebuild = ('foo-1.0-2.fc34.noarch', 'updates', '2021-01-01', 'Jane - 1.0-2', '- rebuild')
+        # the installed entry is in the update changelog too
+        same = ('foo-1.0-2.fc34.noarch', 'updates', *installed[2:])
+        self.mock_async_method.side_effect = [([installed], ''), ([rebuild, same], '')]
+        res = self.client.get_update_changelog(Package('foo-1.0-2.fc34.noarch', 'updates'))
+        self.assertEqual(res, [rebuild])
+
+    def testGetPackageAttributes(self):
+        """ Test get_package_attributes() method"""
+        self.mock_async_method.return_value = [
+            ('foo-too-loo-3:2.3.0-1.fc34.noarch', 'myrepo', {'summary': 'Foo', 'size': 1000})]
+        pkg = Package('foo-too-loo-3:2.3.0-1.fc34.noarch', 'myrepo')
+        res = self.client.get_package_attributes([pkg, 'bar-1.0-1.fc34.noarch'], ('summary', 'size'))
+        self.mock_async.assert_called_with("GetPackageAttributes")
+        self.mock_async_method.assert_called_with(
+            ['foo-too-loo-3:2.3.0-1.fc34.noarch', 'bar-1.0-1.fc34.noarch'], ['summary', 'size'])
+        nevra, reponame, values = res[0]
+        self.assertEqual(values['summary'], 'Foo')
+
     def test_GetCategories(self):
         self.mock_async_method.return_value = ["Category"]
         res = self.client.get_categories()
         self.mock_async.assert_called_with("GetCategories")
         self.assertEqual(res, ['Category'])
+
+
+class FakeAsyncMethod:
+    """ Fake DBus proxy method, replying with the values in order (None = never reply) """
+
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = []
+
+    def __call__(self, *args, callback, timeout=None):
+        self.calls.append((args, timeout))
+        value = self.values.pop(0) if len(self.values) > 1 else self.values[0]
+        if value is not None:
+            callback(lambda: value)
+
+
+class TestAsyncClient(unittest.TestCase):
+
+    def setUp(self):
+        self.client = AsyncDnfDbusClient(glib_thread=False)
+        self.client.proxy = MagicMock()
+        self.client.proxy_v2 = MagicMock()
+
+    def testGetPackagesByKey(self):
+        """ Test get_packages_by_key() coroutine"""
+        method = FakeAsyncMethod([('foo-too-loo-3:2.3.0-1.fc34.noarch', 'myrepo')])
+        self.client.proxy_v2.GetPackagesByKey = method
+        pkgs = asyncio.run(self.client.get_packages_by_key("*too-loo*"))
+        self.assertEqual(method.calls, [(("*too-loo*",), None)])
+        self.assertEqual(pkgs[0].name, 'foo-too-loo')
+        self.assertEqual(pkgs[0].reponame, 'myrepo')
+
+    def testConcurrent(self):
+        """ Test many calls can be in flight at the same time"""
+        self.client.proxy_v2.GetPackageAttribute = FakeAsyncMethod(
+            [('foo-1.0-1.fc34.noarch', 'myrepo', 'summary')])
+
+        async def gather():
+            return await asyncio.gather(*(self.client.get_package_attribute(f'pkg{i}', '', 'summary')
+                                          for i in range(10)))
+
+        res = asyncio.run(gather())
+        self.assertEqual(len(res), 10)
+        self.assertEqual(res[0][0][2], 'summary')
+
+    def testTimeout(self):
+        """ Test the default and per call timeouts"""
+        method = FakeAsyncMethod(None)
+        self.client.proxy_v2.GetCategories = method
+        self.client.timeout = 0.01
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(self.client.get_categories())
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(self.client.get_categories(timeout=0.02))
+        self.assertEqual([timeout for _args, timeout in method.calls], [1010, 1020])
+
+    def testError(self):
+        """ Test errors from the daemon is raised by the coroutine"""
+
+        def failing(*args, callback, timeout=None):
+            def call():
+                raise RuntimeError('failed')
+            callback(call)
+
+        self.client.proxy_v2.GetRepositories = failing
+        with self.assertRaises(RuntimeError):
+            asyncio.run(self.client.get_repositories())
+
+    def testIterPackagesByFilter(self):
+        """ Test iter_packages_by_filter() async generator"""
+        method = FakeAsyncMethod(
+            ([('foo-too-loo-3:2.3.0-1.fc34.noarch', 'myrepo', 'package summary', 100000)], '1:1'),
+            ([('bar-1.0-1.fc34.noarch', 'myrepo', 'other summary', 200)], ''))
+        self.client.proxy_v2.GetPackagesByFilterPaged = method
+
+        async def collect():
+            return [pkg async for pkg in self.client.iter_packages_by_filter("installed", True, page_size=1)]
+
+        pkgs = asyncio.run(collect())
+        self.assertEqual([str(pkg) for pkg in pkgs], ['foo-too-loo-3:2.3.0-1.fc34.noarch', 'bar-1.0-1.fc34.noarch'])
+        self.assertEqual(method.calls[1][0], ("installed", True, '1:1', 1))
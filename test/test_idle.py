@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from dnfdbus.idle import IdleMonitor, Reactivation, load_state, save_state
+
+
+class TestIdleMonitor(unittest.TestCase):
+
+    @patch('dnfdbus.idle.time')
+    def test_is_idle(self, mock_time):
+        mock_time.monotonic.return_value = 100.0
+        idle = IdleMonitor(60)
+        mock_time.monotonic.return_value = 159.0
+        self.assertFalse(idle.is_idle())
+        mock_time.monotonic.return_value = 160.0
+        self.assertTrue(idle.is_idle())
+        # never idle while calls are in progress
+        idle.call_started()
+        mock_time.monotonic.return_value = 500.0
+        self.assertEqual(idle.idle_time(), 0.0)
+        self.assertFalse(idle.is_idle())
+        idle.call_ended()
+        self.assertFalse(idle.is_idle())
+        mock_time.monotonic.return_value = 560.0
+        self.assertTrue(idle.is_idle())
+
+    def test_disabled(self):
+        idle = IdleMonitor(0)
+        self.assertFalse(idle.is_idle())
+
+    def test_check_interval(self):
+        self.assertEqual(IdleMonitor(5).check_interval, 5)
+        self.assertEqual(IdleMonitor(600).check_interval, 30)
+
+
+class TestReactivation(unittest.TestCase):
+
+    def test_mark(self):
+        reactivation = Reactivation()
+        reactivation.mark('registered')
+        first = reactivation.metrics['registered']
+        reactivation.mark('registered')
+        self.assertEqual(reactivation.metrics['registered'], first)
+        self.assertEqual(reactivation.as_dict(), {'reactivated': False, 'registered': first})
+
+    def test_previous_run(self):
+        reactivation = Reactivation()
+        reactivation.previous_run({'reason': 'quit', 'exited': reactivation.started_at - 10})
+        self.assertFalse(reactivation.reactivated)
+        reactivation.previous_run({'reason': 'idle', 'exited': reactivation.started_at - 10})
+        self.assertTrue(reactivation.reactivated)
+        self.assertAlmostEqual(reactivation.as_dict()['downtime'], 10.0, places=2)
+
+
+class TestState(unittest.TestCase):
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'dnfdbus', 'state.json')
+            self.assertEqual(load_state(path), {})
+            save_state(path, {'reason': 'idle', 'exited': 1000.0})
+            self.assertEqual(load_state(path), {'reason': 'idle', 'exited': 1000.0})
+            self.assertEqual(os.listdir(os.path.dirname(path)), ['state.json'])
+            with open(path, 'w') as f:
+                f.write('garbage')
+            self.assertEqual(load_state(path), {})
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Max. cumulative import time of dnfdbus.client in seconds (incl. gi and dasbus)
+CLIENT_IMPORT_BUDGET = 0.3
+
+# Modules the client must not import
+DAEMON_MODULES = ('dnf', 'rpm', 'hawkey', 'libdnf', 'dnfdbus.server', 'dnfdbus.backend', 'dnfdbus.polkit')
+
+
+def import_times(module: str) -> dict:
+    """ Import a module in a new interpreter and get the cumulative import time (seconds) of each module """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [SRC_DIR, env.get('PYTHONPATH')]))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise AssertionError(f'import {module} failed :\n{proc.stderr}')
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1_000_000
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_client_modules(self):
+        """ test the client don't import dnf or the daemon implementation """
+        times = import_times('dnfdbus.client')
+        self.assertIn('dnfdbus.interface', times)
+        for name in DAEMON_MODULES:
+            self.assertNotIn(name, times)
+        self.assertNotIn('asyncio', times)
+
+    def test_interface_modules(self):
+        times = import_times('dnfdbus.interface')
+        for name in DAEMON_MODULES:
+            self.assertNotIn(name, times)
+
+    def test_client_budget(self):
+        # best of some runs, so a busy machine don't make it fail
+        best = min(import_times('dnfdbus.client')['dnfdbus.client'] for _ in range(3))
+        self.assertLess(best, CLIENT_IMPORT_BUDGET)
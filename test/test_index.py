@@ -0,0 +1,55 @@
+import unittest
+from collections import namedtuple
+
+from dnfdbus.backend.index import NameIndex
+
+FakePkg = namedtuple('FakePkg', 'name arch')
+
+NAMES = ['qt6-qtbase', 'qt5-qtbase', 'qt6-qtbase-devel', 'python3-qt5', 'kf5-kio', 'qt6-qtbase',
+         'libqt6', 'firefox', 'fish']
+
+
+class TestNameIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.pkgs = [FakePkg(name, 'x86_64') for name in NAMES]
+        self.index = NameIndex(self.pkgs)
+
+    def _names(self, key):
+        return [pkg.name for pkg in self.index.match(key)]
+
+    def test_is_name_glob(self):
+        self.assertEqual(NameIndex.is_name_glob('*qt6*'), True)
+        self.assertEqual(NameIndex.is_name_glob('qt6-*'), True)
+        self.assertEqual(NameIndex.is_name_glob('qt6'), False)
+        self.assertEqual(NameIndex.is_name_glob('qt6-6.1*.x86_64'), False)
+        self.assertEqual(NameIndex.is_name_glob('/usr/bin/*'), False)
+        self.assertEqual(NameIndex.is_name_glob('qt?-*'), False)
+        self.assertEqual(self.index.match('qt6'), None)
+
+    def test_prefix(self):
+        self.assertEqual(self._names('qt6*'), ['qt6-qtbase', 'qt6-qtbase-devel', 'qt6-qtbase'])
+        self.assertEqual(self._names('f*'), ['firefox', 'fish'])
+        self.assertEqual(self._names('x*'), [])
+
+    def test_substring(self):
+        # same order as the packages
+        self.assertEqual(self._names('*qt6*'), ['qt6-qtbase', 'qt6-qtbase-devel', 'qt6-qtbase', 'libqt6'])
+        self.assertEqual(self._names('*qt5'), ['python3-qt5'])
+        self.assertEqual(self._names('*qt*base*'), ['qt6-qtbase', 'qt5-qtbase', 'qt6-qtbase-devel', 'qt6-qtbase'])
+        self.assertEqual(self._names('qt*devel'), ['qt6-qtbase-devel'])
+        self.assertEqual(self._names('*i*'), ['kf5-kio', 'libqt6', 'firefox', 'fish'])
+        self.assertEqual(self._names('*'), NAMES)
+        self.assertEqual(self._names('*notfound*'), [])
+
+    def test_all_versions(self):
+        """ test all versions and archs of a name is found, as by the name form of dnf, not only the latest """
+        pkgs = [FakePkg('qt6-qtbase', 'x86_64'), FakePkg('qt6-qtbase', 'i686'), FakePkg('qt6-qtbase', 'src'),
+                FakePkg('qt6-qtbase', 'x86_64')]
+        index = NameIndex(pkgs)
+        self.assertEqual(index.match('qt6-*'), pkgs)
+        self.assertEqual(index.match('*base'), pkgs)
+
+    def test_len(self):
+        self.assertEqual(len(self.index), len(NAMES))
+        self.assertEqual(len(self.index.names), len(NAMES) - 1)
@@ -0,0 +1,43 @@
+import unittest
+from unittest.mock import patch
+
+from dnfdbus.loadtest import parse_mix, percentile, report, run
+
+
+class TestLoadTest(unittest.TestCase):
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('key=4,filter=1'), {'key': 4, 'filter': 1})
+        self.assertEqual(parse_mix('groups'), {'groups': 1})
+        with self.assertRaises(ValueError):
+            parse_mix('foo=1')
+        with self.assertRaises(ValueError):
+            parse_mix('key=0')
+        self.assertEqual(parse_mix('key=4,groups=0'), {'key': 4})
+
+    @patch('dnfdbus.loadtest.warm_up')
+    def test_run_mix(self, mock_warm_up):
+        """ test the call types with a zero weight is left out of the warm-up and the clients """
+        config = {'clients': 0, 'duration': 0, 'mix': {'key': 1, 'groups': 0}, 'seed': 0}
+        res = run(config)
+        self.assertEqual(mock_warm_up.call_args[0][0]['mix'], {'key': 1})
+        self.assertEqual(res['total']['calls'], 0)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_report(self):
+        samples = [('key', 0.001, None), ('key', 0.003, None), ('filter', 0.010, 'DBusError')]
+        res = report(samples, 2.0)
+        self.assertEqual(res['key']['calls'], 2)
+        self.assertEqual(res['key']['errors'], 0)
+        self.assertAlmostEqual(res['key']['p50_ms'], 1.0)
+        self.assertAlmostEqual(res['key']['p99_ms'], 3.0)
+        self.assertEqual(res['filter']['errors'], 1)
+        self.assertEqual(res['total']['calls'], 3)
+        self.assertAlmostEqual(res['total']['throughput'], 1.5)
@@ -1,6 +1,8 @@
+import json
+import threading
 import unittest
 
-from dnfdbus.misc import to_nevra
+from dnfdbus.misc import ReadWriteLock, logger, span, to_evr, to_nevra
 
 
 class TestMisc(unittest.TestCase):
@@ -42,3 +44,102 @@ class TestMisc(unittest.TestCase):
         self.assertEqual(v, '6.0.1')
         self.assertEqual(r, '1.fc34')
         self.assertEqual(a, 'x86_64')
+
+    def test_evr(self):
+        self.assertEqual(to_evr('7:2.3.0-1.fc34'), ('7', '2.3.0', '1.fc34'))
+        self.assertEqual(to_evr('2.3.0-1.fc34'), ('0', '2.3.0', '1.fc34'))
+
+
+class TestReadWriteLock(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = ReadWriteLock()
+
+    def test_readers(self):
+        """ test many readers can hold the lock at the same time """
+        barrier = threading.Barrier(3, timeout=5)
+
+        def reader():
+            with self.lock.read():
+                barrier.wait()
+
+        threads = [threading.Thread(target=reader) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        # all readers is inside the lock at the same time
+        barrier.wait()
+        for thread in threads:
+            thread.join()
+
+    def test_writer(self):
+        """ test the writer waits for the readers """
+        events = []
+        reading = threading.Event()
+
+        def writer():
+            reading.wait()
+            with self.lock.write():
+                events.append('write')
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        with self.lock.read():
+            reading.set()
+            thread.join(0.1)
+            events.append('read')
+        thread.join()
+        self.assertEqual(events, ['read', 'write'])
+
+    def test_reentrant(self):
+        with self.lock.write():
+            with self.lock.write():
+                with self.lock.read():
+                    pass
+        with self.lock.read():
+            with self.lock.read():
+                pass
+            with self.assertRaises(RuntimeError):
+                with self.lock.write():
+                    pass
+        # the lock is released again
+        with self.lock.write():
+            pass
+
+
+class TestTracing(unittest.TestCase):
+
+    def test_disabled(self):
+        with span('foo') as current:
+            self.assertIsNone(current)
+
+    def test_nested_spans(self):
+        with self.assertLogs('dnfdbus.trace', 'DEBUG') as logs:
+            with span('outer', key='*qt6*'):
+                with span('inner'):
+                    pass
+        inner, outer = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertEqual(outer['span'], 'outer')
+        self.assertEqual(outer['key'], '*qt6*')
+        self.assertIsNone(outer['parent_id'])
+        self.assertEqual(outer['request_id'], outer['span_id'])
+        self.assertEqual(inner['span'], 'inner')
+        self.assertEqual(inner['parent_id'], outer['span_id'])
+        self.assertEqual(inner['request_id'], outer['request_id'])
+        self.assertGreaterEqual(outer['duration_ms'], inner['duration_ms'])
+        self.assertEqual(logs.records[0].trace, inner)
+
+    def test_error(self):
+        with self.assertLogs('dnfdbus.trace', 'DEBUG') as logs:
+            with self.assertRaises(ValueError):
+                with span('fail'):
+                    raise ValueError
+        self.assertEqual(json.loads(logs.records[0].getMessage())['error'], 'ValueError')
+
+    def test_logger(self):
+        @logger
+        def get_foo(self, value):
+            return value
+
+        with self.assertLogs('dnfdbus.trace', 'DEBUG') as logs:
+            self.assertEqual(get_foo(None, 'foo'), 'foo')
+        self.assertEqual(json.loads(logs.records[0].getMessage())['span'], 'get_foo')
@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from dnfdbus.polkit import READ_ACTION, WRITE_ACTION, Authorizer
+
+
+class TestAuthorizer(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = MagicMock()
+        self.authorizer = Authorizer(self.bus, ttl=60)
+
+    @patch('dnfdbus.polkit.check_permission')
+    def test_check_cached(self, mock_cp):
+        mock_cp.return_value = True
+        self.assertTrue(self.authorizer.check(':1.42', READ_ACTION))
+        self.assertTrue(self.authorizer.check(':1.42', READ_ACTION))
+        mock_cp.assert_called_once_with(self.bus.connection, ':1.42', READ_ACTION)
+        # other caller and other action is checked
+        self.authorizer.check(':1.43', READ_ACTION)
+        self.authorizer.check(':1.42', WRITE_ACTION)
+        self.assertEqual(mock_cp.call_count, 3)
+
+    @patch('dnfdbus.polkit.check_permission')
+    def test_check_denied(self, mock_cp):
+        """ test denied authorizations is not cached """
+        mock_cp.return_value = False
+        self.assertFalse(self.authorizer.check(':1.42', READ_ACTION))
+        self.assertFalse(self.authorizer.is_authorized(':1.42', READ_ACTION))
+        self.assertEqual(len(self.authorizer), 0)
+
+    @patch('dnfdbus.polkit.time')
+    @patch('dnfdbus.polkit.check_permission')
+    def test_ttl(self, mock_cp, mock_time):
+        mock_cp.return_value = True
+        mock_time.monotonic.return_value = 100.0
+        self.authorizer.check(':1.42', READ_ACTION)
+        mock_time.monotonic.return_value = 159.0
+        self.assertTrue(self.authorizer.is_authorized(':1.42', READ_ACTION))
+        mock_time.monotonic.return_value = 161.0
+        self.assertFalse(self.authorizer.is_authorized(':1.42', READ_ACTION))
+        self.assertEqual(len(self.authorizer), 0)
+
+    @patch('dnfdbus.polkit.check_permission')
+    def test_ttl_disabled(self, mock_cp):
+        mock_cp.return_value = True
+        authorizer = Authorizer(self.bus, ttl=0)
+        authorizer.check(':1.42', READ_ACTION)
+        authorizer.check(':1.42', READ_ACTION)
+        self.assertEqual(mock_cp.call_count, 2)
+
+    @patch('dnfdbus.polkit.check_permission_async')
+    def test_authorize(self, mock_cpa):
+        first = self.authorizer.authorize(':1.42', READ_ACTION)
+        # a pending check is shared
+        self.assertIs(self.authorizer.authorize(':1.42', READ_ACTION), first)
+        mock_cpa.assert_called_once()
+        self.assertFalse(first.done())
+        callback = mock_cpa.call_args[0][3]
+        callback(True)
+        self.assertTrue(first.result())
+        self.assertTrue(self.authorizer.is_authorized(':1.42', READ_ACTION))
+        # a new check is made, when the pending check is done
+        self.assertIsNot(self.authorizer.authorize(':1.42', READ_ACTION), first)
+
+    @patch('dnfdbus.polkit.check_permission_async')
+    def test_authorize_failed(self, mock_cpa):
+        """ test a check that can't be started fails the future, and is not left pending """
+        mock_cpa.side_effect = RuntimeError('disconnected')
+        future = self.authorizer.authorize(':1.42', READ_ACTION)
+        self.assertIsInstance(future.exception(timeout=0), RuntimeError)
+        self.assertFalse(self.authorizer.is_authorized(':1.42', READ_ACTION))
+        mock_cpa.side_effect = None
+        future = self.authorizer.authorize(':1.42', READ_ACTION)
+        self.assertEqual(mock_cpa.call_count, 2)
+        self.assertFalse(future.done())
+
+    @patch('dnfdbus.polkit.check_permission')
+    def test_name_owner_changed(self, mock_cp):
+        mock_cp.return_value = True
+        self.authorizer.check(':1.42', READ_ACTION)
+        self.authorizer.check(':1.42', WRITE_ACTION)
+        self.authorizer.check(':1.43', READ_ACTION)
+        self.authorizer.watch()
+        self.bus.proxy.NameOwnerChanged.connect.assert_called_once_with(self.authorizer._name_owner_changed)
+        # a new owner of a well-known name is not a caller leaving
+        self.authorizer._name_owner_changed('org.example.Foo', ':1.42', ':1.50')
+        self.assertEqual(len(self.authorizer), 3)
+        self.authorizer._name_owner_changed(':1.42', ':1.42', '')
+        self.assertFalse(self.authorizer.is_authorized(':1.42', READ_ACTION))
+        self.assertFalse(self.authorizer.is_authorized(':1.42', WRITE_ACTION))
+        self.assertTrue(self.authorizer.is_authorized(':1.43', READ_ACTION))
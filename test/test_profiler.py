@@ -0,0 +1,133 @@
+import cProfile
+import marshal
+import os
+import pstats
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+from unittest.mock import MagicMock
+
+from dnfdbus.profiler import Profiler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+    return 'done'
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.profiler = Profiler(os.path.join(self.tmpdir.name, 'profiles'))
+
+    def tearDown(self):
+        for mode in self.profiler.modes:
+            self.profiler.stop(mode)
+        self.tmpdir.cleanup()
+
+    def test_run(self):
+        """ test calls is run, when no profilers is started """
+        self.assertEqual(self.profiler.run('Iface.Method', busy, 0), 'done')
+        self.assertEqual(self.profiler.modes, [])
+        self.assertEqual(self.profiler._running, {})
+
+    def test_modes(self):
+        with self.assertRaises(ValueError):
+            self.profiler.start('unknown')
+        with self.assertRaises(ValueError):
+            self.profiler.stop('cprofile')
+        self.profiler.start('cprofile')
+        with self.assertRaises(ValueError):
+            self.profiler.start('cprofile')
+        self.assertEqual(self.profiler.modes, ['cprofile'])
+
+    def test_cprofile(self):
+        self.profiler.start('cprofile')
+        self.assertEqual(self.profiler.run('Iface.Method', busy, 0.01), 'done')
+        path = self.profiler.stop('cprofile')
+        self.assertTrue(path.endswith('.pstats'))
+        stats = pstats.Stats(path)
+        calls = {func[2]: value[0] for func, value in stats.stats.items()}
+        self.assertEqual(calls['busy'], 1)
+        # a new profile is made, when profiling is started again
+        self.profiler.start('cprofile')
+        self.profiler.run('Iface.Method', busy, 0)
+        self.assertEqual(self.profiler._profiled, 1)
+
+    def test_cprofile_concurrent(self):
+        """ test concurrent calls is run, only one of them is profiled """
+        self.profiler.start('cprofile')
+        barrier = threading.Barrier(2)
+        results = []
+
+        def call():
+            barrier.wait(timeout=5)
+            busy(0.05)
+            return 'done'
+
+        threads = [threading.Thread(target=lambda: results.append(self.profiler.run('Iface.Method', call)))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['done', 'done'])
+        self.assertEqual((self.profiler._profiled, self.profiler._skipped), (1, 1))
+        stats = pstats.Stats(self.profiler.stop('cprofile'))
+        self.assertIn('busy', {func[2] for func in stats.stats})
+
+    def test_cprofile_stop_in_call(self):
+        """ test cprofile can be stopped by the profiled call, as StopProfiling is """
+        self.profiler.start('cprofile')
+        thread = threading.Thread(target=self.profiler.run, args=('V2.StopProfiling', self.profiler.stop, 'cprofile'))
+        thread.start()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self.profiler.modes, [])
+        self.assertFalse(self.profiler._profile_lock.locked())
+
+    def test_cprofile_in_use(self):
+        """ test the call is run unprofiled, when another profiling tool is active """
+        self.profiler.start('cprofile')
+        self.profiler._profile = MagicMock()
+        self.profiler._profile.enable.side_effect = ValueError('Another profiling tool is already active')
+        self.assertEqual(self.profiler.run('Iface.Method', busy, 0), 'done')
+        self.assertEqual(self.profiler._skipped, 1)
+        self.profiler._profile.disable.assert_not_called()
+        self.profiler._profile = cProfile.Profile()
+
+    def test_cprofile_no_calls(self):
+        self.profiler.start('cprofile')
+        path = self.profiler.stop('cprofile')
+        with open(path, 'rb') as f:
+            self.assertEqual(marshal.load(f), {})
+
+    def test_tracemalloc(self):
+        if tracemalloc.is_tracing():
+            self.skipTest('tracemalloc is already tracing')
+        self.profiler.start('tracemalloc', {'frames': 5})
+        self.assertEqual(tracemalloc.get_traceback_limit(), 5)
+        path = self.profiler.stop('tracemalloc')
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertIsInstance(tracemalloc.Snapshot.load(path), tracemalloc.Snapshot)
+
+    def test_sampling(self):
+        self.profiler.start('sampling', {'interval': 0.001})
+        self.profiler.run('Iface.Method', busy, 0.2)
+        path = self.profiler.stop('sampling')
+        self.assertTrue(path.endswith('.folded'))
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith('Iface.Method;'))
+            self.assertNotIn(' ', stack)
+            self.assertGreater(int(count), 0)
+        self.assertTrue(any(line.rsplit(' ', 1)[0].endswith('test_profiler.py:busy') for line in lines))
+        self.assertEqual(self.profiler.modes, [])
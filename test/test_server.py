@@ -1,10 +1,20 @@
+import contextvars
+import datetime
+import os
+import pstats
+import tempfile
+import threading
 import unittest
 import json
+from concurrent.futures import Future
 from dataclasses import dataclass
 from unittest.mock import MagicMock, patch
-from dnfdbus.server import DnfDbus, AccessDeniedError
+from dnfdbus.server import (CALLER, DnfDbus, DnfDbusInterfaceV2, DnfDbusServerObjectHandler, AccessDeniedError,
+                            InvalidArgumentError, InvalidCursorError)
 from dnfdbus.backend.packages import DnfPkg
 from dnfdbus.backend.repo import DnfRepository
+from dnfdbus.snapshot import Snapshot
+from dnfdbus.stats import CallTimer
 
 
 @dataclass
@@ -37,39 +47,163 @@ class TestDnfDbus(unittest.TestCase):
 
     def setUp(self):
         self.mock_loop = MagicMock()
-        self.dbus = DnfDbus(self.mock_loop)
+        self.dbus = DnfDbus(self.mock_loop, snapshot_path=None, state_path=None)
         self.dbus.backend = MagicMock()
         self.perm_mock = MagicMock(return_value=True)
 
     def tearDown(self):
-        pass
+        self.dbus.executor.shutdown()
 
     def _overload_permission(self):
         """ Overload the methods used to check for PolicyKit Access """
         self.dbus.check_permission_read = self.perm_mock
         self.dbus.check_permission_write = self.perm_mock
 
-    @patch('dnfdbus.server.check_permission')
-    @patch('dnfdbus.server.DBUS_SENDER')
-    def test_permission_checks(self, mock_sender, mock_cp):
-        mock_cp.return_value = True
+    @patch('dnfdbus.server.time')
+    def test_generation_seed(self, mock_time):
+        """ test the generations is unique across restarts of the daemon """
+        mock_time.time.return_value = 1700000000.5
+        dbus = DnfDbus(self.mock_loop, snapshot_path=None, state_path=None)
+        self.assertEqual(dbus.generation, 1700000000500)
+        dbus.executor.shutdown()
+
+    def test_permission_checks(self):
+        self.dbus.authorizer = MagicMock()
+        self.dbus.authorizer.check.return_value = True
+        token = CALLER.set(':1.42')
+        try:
+            self.dbus.working_start()
+            self.dbus.authorizer.check.assert_called_with(':1.42', 'dk.rasmil.DnfDbus.write')
+            self.assertEqual(self.dbus._is_working, True)
+            self.dbus.working_start(write=False)
+            self.dbus.authorizer.check.assert_called_with(':1.42', 'dk.rasmil.DnfDbus.read')
+            self.assertEqual(self.dbus._is_working, True)
+        finally:
+            CALLER.reset(token)
+        # calls not made over DBus is not checked
         self.dbus.working_start()
-        mock_cp.assert_called_with('dk.rasmil.DnfDbus.write')
-        self.assertIn(mock_sender, self.dbus.authorized_sender_write)
-        self.assertEqual(self.dbus._is_working, True)
-        self.dbus.working_start(write=False)
-        mock_cp.assert_called_with('dk.rasmil.DnfDbus.read')
-        self.assertIn(mock_sender, self.dbus.authorized_sender_read)
-        self.assertEqual(self.dbus._is_working, True)
+        self.assertEqual(self.dbus.authorizer.check.call_count, 2)
 
-    @patch('dnfdbus.server.check_permission')
-    @patch('dnfdbus.server.DBUS_SENDER')
-    def test_permission_fail(self, mock_sender, mock_cp):
+    def test_permission_fail(self):
         """ test AccessDeniedError exception if permission is not granted """
-        mock_cp.return_value = False
+        self.dbus.authorizer = MagicMock()
+        self.dbus.authorizer.check.return_value = False
+        token = CALLER.set(':1.42')
+        try:
+            with self.assertRaises(AccessDeniedError):
+                self.dbus.working_start()
+        finally:
+            CALLER.reset(token)
+        self.dbus.authorizer.check.assert_called_with(':1.42', 'dk.rasmil.DnfDbus.write')
+
+    def test_submit_authorized(self):
+        """ test the read permission is checked before the call is run in the worker pool """
+        self.dbus.authorizer = MagicMock()
+        self.dbus.authorizer.is_authorized.return_value = False
+        check = Future()
+        self.dbus.authorizer.authorize.return_value = check
+        token = CALLER.set(':1.42')
+        try:
+            res = self.dbus.submit(lambda: self.dbus.check_permission_read() or CALLER.get())
+        finally:
+            CALLER.reset(token)
+        self.dbus.authorizer.authorize.assert_called_with(':1.42', 'dk.rasmil.DnfDbus.read')
+        self.assertFalse(res.done())
+        check.set_result(True)
+        self.assertEqual(res.result(timeout=5), ':1.42')
+        # the granted read permission is not checked again in the worker
+        self.dbus.authorizer.check.assert_not_called()
+
+    def test_submit_denied(self):
+        self.dbus.authorizer = MagicMock()
+        self.dbus.authorizer.is_authorized.return_value = False
+        check = Future()
+        check.set_result(False)
+        self.dbus.authorizer.authorize.return_value = check
+        fn = MagicMock()
+        token = CALLER.set(':1.42')
+        try:
+            res = self.dbus.submit(fn)
+        finally:
+            CALLER.reset(token)
         with self.assertRaises(AccessDeniedError):
-            self.dbus.working_start()
-        mock_cp.assert_called_with('dk.rasmil.DnfDbus.write')
+            res.result(timeout=5)
+        fn.assert_not_called()
+
+    def test_submit_write(self):
+        """ test the write methods is authorized for the write action before they are run """
+        self.dbus.authorizer = MagicMock()
+        self.dbus.authorizer.is_authorized.return_value = False
+        check = Future()
+        self.dbus.authorizer.authorize.return_value = check
+        token = CALLER.set(':1.42')
+        try:
+            res = self.dbus.submit(lambda: self.dbus.check_permission_write() or CALLER.get(),
+                                   action='dk.rasmil.DnfDbus.write')
+        finally:
+            CALLER.reset(token)
+        self.dbus.authorizer.authorize.assert_called_with(':1.42', 'dk.rasmil.DnfDbus.write')
+        self.assertFalse(res.done())
+        check.set_result(True)
+        self.assertEqual(res.result(timeout=5), ':1.42')
+        # no blocking check in the worker
+        self.dbus.authorizer.check.assert_not_called()
+
+    def test_in_worker_action(self):
+        interface = DnfDbusInterfaceV2(MagicMock())
+        interface.StopProfiling('cprofile')
+        _method, _self, mode = interface.implementation.submit.call_args[0]
+        self.assertEqual(mode, 'cprofile')
+        self.assertEqual(interface.implementation.submit.call_args[1], {'action': 'dk.rasmil.DnfDbus.write'})
+        interface.GetStats()
+        self.assertEqual(interface.implementation.submit.call_args[1], {'action': 'dk.rasmil.DnfDbus.read'})
+
+    def test_run_authorized(self):
+        """ test Quit is run in the main loop, when the caller is authorized """
+        self.dbus.authorizer = MagicMock()
+        self.dbus.authorizer.is_authorized.return_value = False
+        check = Future()
+        self.dbus.authorizer.authorize.return_value = check
+        self.dbus._signal_quitting = MagicMock()
+        token = CALLER.set(':1.42')
+        try:
+            res = self.dbus.run_authorized(self.dbus.quit)
+        finally:
+            CALLER.reset(token)
+        self.mock_loop.quit.assert_not_called()
+        check.set_result(True)
+        self.assertTrue(res.done())
+        self.mock_loop.quit.assert_called()
+        self.dbus.authorizer.check.assert_not_called()
+        # denied
+        self.mock_loop.reset_mock()
+        check = Future()
+        check.set_result(False)
+        self.dbus.authorizer.authorize.return_value = check
+        token = CALLER.set(':1.42')
+        try:
+            res = self.dbus.run_authorized(self.dbus.quit)
+        finally:
+            CALLER.reset(token)
+        with self.assertRaises(AccessDeniedError):
+            res.result()
+        self.mock_loop.quit.assert_not_called()
+
+    @patch('dnfdbus.server.GLib')
+    def test_future_done(self, mock_glib):
+        """ test the reply of a future done in the main loop is sent at once, else from the main loop """
+        handler = MagicMock()
+        future = Future()
+        future.set_result('value')
+        DnfDbusServerObjectHandler._future_done(handler, contextvars.copy_context(), 'invocation', 'spec', future)
+        handler._handle_future_result.assert_called_once_with('invocation', 'spec', future)
+        mock_glib.idle_add.assert_not_called()
+        thread = threading.Thread(target=DnfDbusServerObjectHandler._future_done,
+                                  args=(handler, contextvars.copy_context(), 'invocation', 'spec', future))
+        thread.start()
+        thread.join()
+        mock_glib.idle_add.assert_called_once()
+        self.assertEqual(handler._handle_future_result.call_count, 1)
 
     def test_working_start(self):
         self._overload_permission()
@@ -83,10 +217,147 @@ class TestDnfDbus(unittest.TestCase):
         self.assertEqual(self.dbus._is_working, False)
         self.assertEqual(res, 'foobar')
 
+    def test_in_worker(self):
+        """ test interface methods is run in the worker pool """
+        self._overload_permission()
+        self.dbus.backend.get_groups_by_category.return_value = [
+            ['grp_id', 'grp_name', 'grp_ui_name', 'grp_ui_description']
+        ]
+        interface = DnfDbusInterfaceV2(self.dbus)
+        res = interface.GetGroupsByCategory('cat_id')
+        self.assertIsInstance(res, Future)
+        self.assertEqual(
+            res.result(), [('grp_id', 'grp_name', 'grp_ui_name', 'grp_ui_description')])
+
     def test_version(self):
         res = self.dbus.version()
         self.assertEqual(res, 'Version : 1.0')
 
+    def test_state(self):
+        self.dbus.backend.state = 'loading'
+        self.assertEqual(self.dbus.state, 'loading')
+
+    def test_generation(self):
+        self.dbus.backend.generation = 3
+        self.assertEqual(self.dbus.generation, 3)
+
+    def test_warm_up(self):
+        self.dbus.warm_up()
+        self.dbus.backend.setup_in_background.assert_called_once()
+
+    @patch('dnfdbus.server.GLib')
+    def test_backend_state_changed(self, mock_glib):
+        """ test backend state changes is emitted from the main loop """
+        self.dbus._signal_state_changed = MagicMock()
+        self.dbus._backend_state_changed('ready')
+        self.dbus._signal_state_changed.emit.assert_not_called()
+        callback, state = mock_glib.idle_add.call_args[0]
+        callback(state)
+        self.dbus._signal_state_changed.emit.assert_called_with('ready')
+
+    def test_watched_changed(self):
+        """ test the sack is reloaded when the watched directories changes """
+        self.dbus.executor = MagicMock()
+        self.dbus.backend.is_setup = True
+        self.dbus.backend.state = 'ready'
+        self.dbus._watched_changed('rpmdb')
+        self.dbus.executor.submit.assert_called_with(self.dbus.backend.refresh_installed)
+        self.dbus.executor.submit.return_value.add_done_callback.assert_called_with(self.dbus._refresh_done)
+        self.dbus._watched_changed('cache')
+        self.dbus.executor.submit.assert_called_with(self.dbus.backend.refresh_cache)
+        # ignore changes while loading
+        self.dbus.executor.reset_mock()
+        self.dbus.backend.state = 'loading'
+        self.dbus._watched_changed('rpmdb')
+        self.dbus.executor.submit.assert_not_called()
+
+    @patch('dnfdbus.server.log')
+    def test_refresh_done(self, mock_log):
+        """ test a failed reload is logged """
+        future = Future()
+        future.set_result(True)
+        self.dbus._refresh_done(future)
+        mock_log.error.assert_not_called()
+        future = Future()
+        future.set_exception(OSError('no space left'))
+        self.dbus._refresh_done(future)
+        mock_log.error.assert_called_once()
+
+    @patch('dnfdbus.server.GLib')
+    def test_sack_changed(self, mock_glib):
+        """ test the SackChanged signal is emitted from the main loop """
+        self.dbus._signal_sack_changed = MagicMock()
+        self.dbus._sack_changed(3)
+        callback, generation = mock_glib.idle_add.call_args[0]
+        callback(generation)
+        self.dbus._signal_sack_changed.emit.assert_called_with(3)
+
+    def test_sack_changed_snapshot(self):
+        """ test the snapshot is dropped and saved again, when the sack changes """
+        self.dbus.executor = MagicMock()
+        self.dbus.snapshot = MagicMock()
+        self.dbus.snapshot_path = '/tmp/snapshot.json.gz'
+        self.dbus._sack_changed(1)
+        self.assertEqual(self.dbus.snapshot, None)
+        self.dbus.executor.submit.assert_called_with(self.dbus.save_snapshot)
+
+    @patch('dnfdbus.server.read_rpmdb_cookie')
+    @patch('dnfdbus.server.Snapshot')
+    def test_load_snapshot(self, mock_snapshot, mock_cookie):
+        self.assertEqual(self.dbus.load_snapshot(), False)
+        self.dbus.snapshot_path = '/tmp/snapshot.json.gz'
+        mock_snapshot.load.return_value.is_valid.return_value = False
+        self.assertEqual(self.dbus.load_snapshot(), False)
+        self.assertEqual(self.dbus.snapshot, None)
+        self.dbus.backend.setup_in_background.assert_not_called()
+        mock_snapshot.load.return_value.is_valid.return_value = True
+        self.assertEqual(self.dbus.load_snapshot(), True)
+        self.assertEqual(self.dbus.snapshot, mock_snapshot.load.return_value)
+        # the sack is loaded in the background, while the snapshot is used
+        self.dbus.backend.setup_in_background.assert_called_once()
+
+    def test_save_snapshot(self):
+        pkgs_mock = MagicMock()
+        self.dbus.backend.packages = pkgs_mock
+        self.dbus.backend.sack_source.return_value = ('cookie', {'myrepo': 'aaa'})
+        fake_po = DnfPkg(FakePkg())
+        pkgs_mock.by_filter.return_value = [fake_po]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.dbus.snapshot_path = os.path.join(tmpdir, 'snapshot.json.gz')
+            self.dbus.save_snapshot()
+            snapshot = Snapshot.load(self.dbus.snapshot_path)
+        self.assertEqual(snapshot.is_valid('cookie', {'myrepo': 'aaa'}), True)
+        self.assertEqual(snapshot.rows('installed'), [fake_po.dump_list])
+        self.assertEqual(snapshot.rows('updates'), [fake_po.dump_list])
+
+    def test_get_packages_by_filter_snapshot(self):
+        """ test packages by filter is answered from the snapshot, until the sack is loaded """
+        self._overload_permission()
+        pkgs_mock = MagicMock()
+        self.dbus.backend.packages = pkgs_mock
+        self.dbus.backend.is_setup = False
+        fake_po = DnfPkg(FakePkg())
+        pkgs_mock.by_filter.return_value = [fake_po]
+        row = ['bar-1.0-1.fc34.noarch', '@System', 'Bar summary', 1000]
+        self.dbus.snapshot = Snapshot('cookie', {}, {'installed': [row]})
+        res = self.dbus.get_packages_by_filter("installed", False)
+        self.assertEqual(res, '[["bar-1.0-1.fc34.noarch", "@System"]]')
+        res = json.loads(self.dbus.get_packages_by_filter("installed", True))
+        self.assertEqual(res, [row])
+        res = self.dbus.get_packages_by_filter_v2("installed", False)
+        self.assertEqual(res, [('bar-1.0-1.fc34.noarch', '@System', '', 0)])
+        res = self.dbus.get_packages_by_filter_v2("installed", True)
+        self.assertEqual(res, [tuple(row)])
+        pkgs_mock.by_filter.assert_not_called()
+        self.perm_mock.assert_called()
+        # not in the snapshot
+        self.dbus.get_packages_by_filter("available", False)
+        pkgs_mock.by_filter.assert_called_with("available")
+        # the sack is loaded
+        self.dbus.backend.is_setup = True
+        res = self.dbus.get_packages_by_filter_v2("installed", False)
+        self.assertEqual(res, [(*fake_po.dump, '', 0)])
+
     def test_quit(self):
         self._overload_permission()
         self.dbus._signal_quitting = MagicMock()
@@ -94,6 +365,143 @@ class TestDnfDbus(unittest.TestCase):
         self.dbus._signal_quitting.emit.assert_called()
         self.mock_loop.quit.assert_called()
 
+    @patch('dnfdbus.server.GLib')
+    def test_exit_when_idle(self, mock_glib):
+        self.dbus.exit_when_idle()
+        mock_glib.timeout_add_seconds.assert_not_called()
+        self.dbus.idle.timeout = 60
+        self.dbus.exit_when_idle()
+        mock_glib.timeout_add_seconds.assert_called_with(30, self.dbus._check_idle)
+
+    def test_check_idle(self):
+        self.dbus._signal_quitting = MagicMock()
+        self.dbus.backend.state = 'ready'
+        self.dbus.idle = MagicMock()
+        self.dbus.idle.is_idle.return_value = False
+        self.assertTrue(self.dbus._check_idle())
+        self.mock_loop.quit.assert_not_called()
+        # don't exit while the sack is loading
+        self.dbus.idle.is_idle.return_value = True
+        self.dbus.backend.state = 'loading'
+        self.assertTrue(self.dbus._check_idle())
+        self.mock_loop.quit.assert_not_called()
+        self.dbus.backend.state = 'ready'
+        # don't exit while profiling
+        self.dbus.profiler = MagicMock(modes=['cprofile'])
+        self.assertTrue(self.dbus._check_idle())
+        self.mock_loop.quit.assert_not_called()
+        self.dbus.profiler.modes = []
+        quit = threading.Event()
+        self.mock_loop.quit.side_effect = quit.set
+        release = threading.Event()
+        res = self.dbus.submit(release.wait, 5)
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                patch('dnfdbus.server.SYSTEM_BUS') as mock_bus, patch('dnfdbus.server.GLib') as mock_glib:
+            mock_glib.idle_add.side_effect = lambda fn, *args: fn(*args)
+            self.dbus.state_path = os.path.join(tmpdir, 'state.json')
+            self.assertFalse(self.dbus._check_idle())
+            # the name is released before the call in progress is done
+            mock_bus.unregister_service.assert_called_with('dk.rasmil.DnfDbus')
+            self.assertEqual(mock_bus.unpublish_object.call_count, 2)
+            self.assertFalse(quit.is_set())
+            release.set()
+            self.assertTrue(quit.wait(timeout=5))
+            self.assertTrue(res.result(timeout=5))
+            with open(self.dbus.state_path) as f:
+                state = json.load(f)
+        self.assertEqual(state['reason'], 'idle')
+        self.dbus._signal_quitting.emit.assert_called()
+
+    def test_submit_idle(self):
+        """ test calls in progress is tracked for the idle exit """
+        fn = MagicMock(return_value='value')
+        res = self.dbus.submit(fn, 'arg')
+        self.assertEqual(res.result(timeout=5), 'value')
+        fn.assert_called_with('arg')
+        self.assertEqual(self.dbus.idle.active, 0)
+        self.assertIn('first_reply', self.dbus.reactivation.metrics)
+
+    def test_get_reactivation(self):
+        self._overload_permission()
+        self.dbus.reactivation.previous_run({'reason': 'idle', 'exited': self.dbus.reactivation.started_at - 5})
+        self.dbus.reactivation.mark('registered')
+        res = self.dbus.get_reactivation()
+        self.assertEqual(res['reactivated'].unpack(), True)
+        self.assertAlmostEqual(res['downtime'].unpack(), 5.0, places=2)
+        self.assertIn('registered', res)
+
+    def test_get_stats(self):
+        self._overload_permission()
+        timer = CallTimer()
+        timer.add('backend', 0.01)
+        self.dbus.stats.record('dk.rasmil.DnfDbus.V2.GetRepositories', timer, size=100)
+        res = self.dbus.get_stats()
+        stats = res['dk.rasmil.DnfDbus.V2.GetRepositories'].unpack()
+        self.assertEqual(stats['calls'], 1)
+        self.assertEqual(stats['errors'], 0)
+        self.assertEqual(stats['reply_size']['sum'], 100)
+        self.assertEqual(stats['phases']['backend']['count'], 1)
+
+    def test_profiling(self):
+        self.dbus.authorizer = MagicMock()
+        self.dbus.authorizer.check.return_value = True
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.dbus.profiler.path = tmpdir
+            token = CALLER.set(':1.42')
+            try:
+                self.dbus.start_profiling('sampling', {'interval': 0.01})
+                # starting and stopping a profiler needs the write permission
+                self.dbus.authorizer.check.assert_called_with(':1.42', 'dk.rasmil.DnfDbus.write')
+                self.assertEqual(self.dbus.get_profiling(), ['sampling'])
+                with self.assertRaises(InvalidArgumentError):
+                    self.dbus.start_profiling('sampling', {})
+                with self.assertRaises(InvalidArgumentError):
+                    self.dbus.stop_profiling('cprofile')
+                path = self.dbus.stop_profiling('sampling')
+            finally:
+                CALLER.reset(token)
+            self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.dbus.get_profiling(), [])
+        self.assertFalse(self.dbus._is_working)
+
+    def test_profiling_denied(self):
+        self.dbus.authorizer = MagicMock()
+        self.dbus.authorizer.check.return_value = False
+        token = CALLER.set(':1.42')
+        try:
+            with self.assertRaises(AccessDeniedError):
+                self.dbus.start_profiling('cprofile', {})
+        finally:
+            CALLER.reset(token)
+        self.assertEqual(self.dbus.profiler.modes, [])
+
+    def test_submit_profiling(self):
+        """ test calls run by the workers is profiled """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.dbus.profiler.path = tmpdir
+            self._overload_permission()
+            self.dbus.start_profiling('cprofile', {})
+            interface = MagicMock(implementation=self.dbus)
+            res = self.dbus.submit(DnfDbusInterfaceV2.GetStats.__wrapped__, interface)
+            self.assertEqual(res.result(timeout=5), {})
+            self.assertEqual(self.dbus.profiler._profiled, 1)
+            stats = pstats.Stats(self.dbus.stop_profiling('cprofile'))
+            self.assertIn('get_stats', {func[2] for func in stats.stats})
+
+    def test_submit_stop_profiling(self):
+        """ test cprofile is stopped by StopProfiling run by the workers, while it profiles the call """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.dbus.profiler.path = tmpdir
+            self._overload_permission()
+            interface = MagicMock(implementation=self.dbus)
+            res = self.dbus.submit(DnfDbusInterfaceV2.StartProfiling.__wrapped__, interface, 'cprofile', {},
+                                   action='dk.rasmil.DnfDbus.write')
+            res.result(timeout=5)
+            res = self.dbus.submit(DnfDbusInterfaceV2.StopProfiling.__wrapped__, interface, 'cprofile',
+                                   action='dk.rasmil.DnfDbus.write')
+            self.assertTrue(os.path.exists(res.result(timeout=5)))
+            self.assertEqual(self.dbus.profiler.modes, [])
+
     def test_get_repositories(self):
         self._overload_permission()
         self.dbus.backend.get_repositories.return_value = [
@@ -128,6 +536,190 @@ class TestDnfDbus(unittest.TestCase):
         self.assertIsInstance(res, list)
         self.assertEqual(res[0], fake_po.dump_list)
 
+    def test_cached(self):
+        """ test read results is cached until the sack changes """
+        self._overload_permission()
+        pkgs_mock = MagicMock()
+        self.dbus.backend.packages = pkgs_mock
+        self.dbus.backend.generation = 1
+        pkgs_mock.by_filter.return_value = [DnfPkg(FakePkg())]
+        res = self.dbus.get_packages_by_filter("installed", False)
+        self.assertEqual(res, self.dbus.get_packages_by_filter("installed", False))
+        pkgs_mock.by_filter.assert_called_once()
+        self.assertEqual(self.dbus.cache.hits, 1)
+        # permission is still checked for cached results
+        self.assertEqual(self.perm_mock.call_count, 3)
+        # new sack generation
+        self.dbus.backend.generation = 2
+        self.dbus._sack_changed(2)
+        self.assertEqual(len(self.dbus.cache), 0)
+        self.dbus.get_packages_by_filter("installed", False)
+        self.assertEqual(pkgs_mock.by_filter.call_count, 2)
+
+    def test_get_packages_by_filter_paged(self):
+        self._overload_permission()
+        pkgs_mock = MagicMock()
+        self.dbus.backend.packages = pkgs_mock
+        self.dbus.backend.generation = 1
+        fake_po = DnfPkg(FakePkg())
+        pkgs_mock.by_filter.return_value = [fake_po] * 5
+        res = json.loads(self.dbus.get_packages_by_filter_paged("installed", False, "", 2))
+        self.assertEqual(len(res['packages']), 2)
+        self.assertEqual(res['packages'][0], fake_po.dump)
+        self.assertEqual(res['cursor'], '1:2')
+        res = json.loads(self.dbus.get_packages_by_filter_paged("installed", True, '1:4', 2))
+        self.assertEqual(len(res['packages']), 1)
+        self.assertEqual(res['packages'][0], fake_po.dump_list)
+        self.assertEqual(res['cursor'], '')
+
+    def test_get_packages_by_key_paged(self):
+        self._overload_permission()
+        pkgs_mock = MagicMock()
+        self.dbus.backend.packages = pkgs_mock
+        self.dbus.backend.generation = 1
+        pkgs_mock.by_key.return_value = [DnfPkg(FakePkg())] * 3
+        res = json.loads(self.dbus.get_packages_by_key_paged("foobar", "", 0))
+        self.assertEqual(len(res['packages']), 3)
+        self.assertEqual(res['cursor'], '')
+
+    def test_paged_invalid_cursor(self):
+        self._overload_permission()
+        pkgs_mock = MagicMock()
+        self.dbus.backend.packages = pkgs_mock
+        self.dbus.backend.generation = 2
+        pkgs_mock.by_filter.return_value = [DnfPkg(FakePkg())] * 5
+        # cursor from an older sack generation
+        with self.assertRaises(InvalidCursorError):
+            self.dbus.get_packages_by_filter_paged("installed", False, "1:2", 2)
+        with self.assertRaises(InvalidCursorError):
+            self.dbus.get_packages_by_filter_paged("installed", False, "foobar", 2)
+
+    def test_get_packages_by_filter_v2(self):
+        self._overload_permission()
+        pkgs_mock = MagicMock()
+        self.dbus.backend.packages = pkgs_mock
+        pkgs_mock.by_filter.return_value = [DnfPkg(FakePkg())]
+        res = self.dbus.get_packages_by_filter_v2("installed", False)
+        self.assertEqual(
+            res, [('foo-too-loo-3:2.3.0-1.fc34.noarch', 'myrepo', '', 0)])
+        res = self.dbus.get_packages_by_filter_v2("installed", True)
+        self.assertEqual(
+            res, [('foo-too-loo-3:2.3.0-1.fc34.noarch', 'myrepo', 'This is a Fake Package', 100000)])
+
+    def test_get_packages_by_filter_fields(self):
+        self._overload_permission()
+        pkgs_mock = MagicMock()
+        self.dbus.backend.packages = pkgs_mock
+        pkgs_mock.by_filter.return_value = [DnfPkg(FakePkg())]
+        pkgs_mock.by_key.return_value = [DnfPkg(FakePkg(epoch='0'))]
+        res = self.dbus.get_packages_by_filter_fields("installed", False)
+        self.assertEqual(res, [('foo-too-loo', '3', '2.3.0', '1.fc34', 'noarch', 'myrepo', '', 0)])
+        res = self.dbus.get_packages_by_filter_fields("installed", True)
+        self.assertEqual(res, [('foo-too-loo', '3', '2.3.0', '1.fc34', 'noarch', 'myrepo',
+                                'This is a Fake Package', 100000)])
+        res = self.dbus.get_packages_by_key_fields("foo*")
+        self.assertEqual(res, [('foo-too-loo', '0', '2.3.0', '1.fc34', 'noarch', 'myrepo', '', 0)])
+
+    def test_get_packages_by_key_v2(self):
+        self._overload_permission()
+        pkgs_mock = MagicMock()
+        self.dbus.backend.packages = pkgs_mock
+        pkgs_mock.by_key.return_value = [DnfPkg(FakePkg())]
+        res = self.dbus.get_packages_by_key_v2("foobar")
+        self.assertEqual(res, [('foo-too-loo-3:2.3.0-1.fc34.noarch', 'myrepo')])
+
+    def test_get_packages_by_filter_paged_v2(self):
+        self._overload_permission()
+        pkgs_mock = MagicMock()
+        self.dbus.backend.packages = pkgs_mock
+        self.dbus.backend.generation = 1
+        pkgs_mock.by_filter.return_value = [DnfPkg(FakePkg())] * 3
+        pkgs, cursor = self.dbus.get_packages_by_filter_paged_v2("installed", True, "", 2)
+        self.assertEqual(len(pkgs), 2)
+        self.assertEqual(pkgs[0][3], 100000)
+        self.assertEqual(cursor, '1:2')
+
+    def test_get_packages_by_filter_columns(self):
+        self._overload_permission()
+        pkgs_mock = MagicMock()
+        self.dbus.backend.packages = pkgs_mock
+        pkgs_mock.by_filter.return_value = [
+            DnfPkg(FakePkg()), DnfPkg(FakePkg(name='bar', epoch='0', arch='x86_64'))]
+        res = self.dbus.get_packages_by_filter_columns("installed", False)
+        columns = {key: value.unpack() for key, value in res.items()}
+        self.assertEqual(columns['names'], ['foo-too-loo', 'bar'])
+        self.assertEqual(columns['evrs'], ['3:2.3.0-1.fc34', '2.3.0-1.fc34'])
+        self.assertEqual(columns['arches'], ['noarch', 'x86_64'])
+        self.assertEqual(columns['arch_index'], [0, 1])
+        self.assertEqual(columns['repos'], ['myrepo'])
+        self.assertEqual(columns['repo_index'], [0, 0])
+        self.assertNotIn('summaries', columns)
+        res = self.dbus.get_packages_by_filter_columns("installed", True)
+        self.assertEqual(res['sizes'].unpack(), [100000, 100000])
+
+    def test_get_repositories_v2(self):
+        self._overload_permission()
+        self.dbus.backend.get_repositories.return_value = [
+            DnfRepository(FakeRepo('repoid', 'reponame', True))]
+        res = self.dbus.get_repositories_v2()
+        self.assertEqual(len(res), 1)
+        repo = res[0]
+        self.assertEqual(repo['id'].unpack(), 'repoid')
+        self.assertEqual(repo['name'].unpack(), 'reponame')
+        self.assertEqual(repo['enabled'].unpack(), True)
+
+    def test_get_package_attribute_v2(self):
+        self._overload_permission()
+        self.dbus.backend.get_attribute.return_value = \
+            [('qt6-assistant-6.1.0-2.fc34.x86_64', '@System', 'Documentation browser for Qt6.'),
+             ('qt6-assistant-6.1.0-2.fc34.x86_64', 'updates', None)]
+        res = self.dbus.get_package_attribute_v2('qt6-assistant', "", "description")
+        self.assertEqual(2, len(res))
+        nevra, reponame, desc = res[0]
+        self.assertEqual(nevra, 'qt6-assistant-6.1.0-2.fc34.x86_64')
+        self.assertEqual(reponame, '@System')
+        self.assertEqual(desc.unpack(), 'Documentation browser for Qt6.')
+        self.assertEqual(res[1][2].unpack(), '')
+
+    def test_get_package_attributes(self):
+        self._overload_permission()
+        self.dbus.backend.generation = 1
+        self.dbus.backend.get_attributes.return_value = \
+            [('qt6-assistant-6.1.0-2.fc34.x86_64', '@System', {'summary': 'Qt6 assistant', 'size': 1000}),
+             ('qt6-qtbase-6.1.0-2.fc34.x86_64', '@System', {'summary': 'Qt6 base', 'size': None})]
+        pkgs = ['qt6-assistant-6.1.0-2.fc34.x86_64', 'qt6-qtbase-6.1.0-2.fc34.x86_64']
+        res = self.dbus.get_package_attributes(pkgs, ['summary', 'size'])
+        self.assertEqual(2, len(res))
+        nevra, reponame, values = res[0]
+        self.assertEqual(nevra, 'qt6-assistant-6.1.0-2.fc34.x86_64')
+        self.assertEqual({key: val.unpack() for key, val in values.items()},
+                         {'summary': 'Qt6 assistant', 'size': 1000})
+        self.assertEqual(res[1][2]['size'].unpack(), '')
+        # the list arguments can be used as cache key
+        self.assertEqual(res, self.dbus.get_package_attributes(pkgs, ['summary', 'size']))
+        self.dbus.backend.get_attributes.assert_called_once_with(pkgs, ['summary', 'size'])
+
+    def test_get_package_changelog(self):
+        self._overload_permission()
+        self.dbus.backend.generation = 1
+        entries = [('foo-1.0-2.fc34.noarch', 'updates',
+                    {'timestamp': datetime.date(2021, 5, n), 'author': 'Jane', 'text': f'- fix {n}'})
+                   for n in (3, 2, 1)]
+        self.dbus.backend.get_changelog.return_value = entries
+        res, cursor = self.dbus.get_package_changelog('foo', 'updates', '2021-01-01', '', 2)
+        self.dbus.backend.get_changelog.assert_called_with('foo', 'updates', datetime.date(2021, 1, 1))
+        self.assertEqual(res, [('foo-1.0-2.fc34.noarch', 'updates', '2021-05-03', 'Jane', '- fix 3'),
+                               ('foo-1.0-2.fc34.noarch', 'updates', '2021-05-02', 'Jane', '- fix 2')])
+        self.assertEqual(cursor, '1:2')
+        res, cursor = self.dbus.get_package_changelog('foo', 'updates', '2021-01-01', cursor, 2)
+        self.assertEqual(len(res), 1)
+        self.assertEqual(cursor, '')
+        # no since date
+        self.dbus.get_package_changelog('foo', '', '', '', 0)
+        self.dbus.backend.get_changelog.assert_called_with('foo', '', None)
+        with self.assertRaises(InvalidArgumentError):
+            self.dbus.get_package_changelog('foo', '', 'yesterday', '', 0)
+
     def test_get_package_attribute(self):
         self._overload_permission()
         pkg = 'AtomicParsley-0.9.5-17.fc34.x86_64'
@@ -172,3 +764,34 @@ class TestDnfDbus(unittest.TestCase):
         # json will convert tuple to list
         self.assertIsInstance(elem, list)
         self.assertEqual(elem[0], 'grp_id')
+
+    def test_refresh_repositories(self):
+        self._overload_permission()
+        self.dbus.backend.refresh_repos.return_value = {
+            'changed': ['updates'], 'timings': {'fedora': 0.1, 'updates': 1.5}, 'reload': 2.0}
+        res = self.dbus.refresh_repositories()
+        self.assertEqual(res['changed'].unpack(), ['updates'])
+        self.assertEqual(res['timings'].unpack(), {'fedora': 0.1, 'updates': 1.5})
+        self.assertEqual(res['reload'].unpack(), 2.0)
+
+    def test_refresh_repositories_permission(self):
+        """ test refreshing the metadata needs the write permission """
+        self.dbus.authorizer = MagicMock()
+        self.dbus.authorizer.check.return_value = False
+        token = CALLER.set(':1.42')
+        try:
+            with self.assertRaises(AccessDeniedError):
+                self.dbus.refresh_repositories()
+        finally:
+            CALLER.reset(token)
+        self.dbus.authorizer.check.assert_called_with(':1.42', 'dk.rasmil.DnfDbus.write')
+        self.dbus.backend.refresh_repos.assert_not_called()
+
+    def test_get_groups_by_category_v2(self):
+        self._overload_permission()
+        self.dbus.backend.get_groups_by_category.return_value = [
+            ['grp_id', 'grp_name', 'grp_ui_name', 'grp_ui_description']
+        ]
+        res = self.dbus.get_groups_by_category_v2('cat_id')
+        self.assertEqual(
+            res, [('grp_id', 'grp_name', 'grp_ui_name', 'grp_ui_description')])
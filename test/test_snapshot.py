@@ -0,0 +1,53 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from dnfdbus.snapshot import Snapshot
+
+ROWS = [['foo-1.0-1.fc34.noarch', '@System', 'Foo summary', 1000],
+        ['bar-2:2.0-1.fc34.x86_64', '@System', 'Bar summary', 2000]]
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'dnfdbus', 'snapshot.json.gz')
+        self.snapshot = Snapshot('cookie', {'fedora': 'aaa', 'updates': 'bbb'}, {'installed': ROWS})
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_save_load(self):
+        self.snapshot.save(self.path)
+        snapshot = Snapshot.load(self.path)
+        self.assertEqual(snapshot.rpmdb_cookie, 'cookie')
+        self.assertEqual(snapshot.repos, {'fedora': 'aaa', 'updates': 'bbb'})
+        self.assertEqual(snapshot.rows('installed'), ROWS)
+        self.assertEqual(snapshot.rows('updates'), None)
+        # only the snapshot is left in the directory
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['snapshot.json.gz'])
+
+    def test_load_missing(self):
+        self.assertEqual(Snapshot.load(self.path), None)
+
+    def test_load_invalid(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'wb') as f:
+            f.write(b'not gzip')
+        self.assertEqual(Snapshot.load(self.path), None)
+        # other format version
+        with gzip.open(self.path, 'wt') as f:
+            f.write('{"version": 0}')
+        self.assertEqual(Snapshot.load(self.path), None)
+
+    def test_is_valid(self):
+        repos = {'fedora': 'aaa', 'updates': 'bbb'}
+        self.assertEqual(self.snapshot.is_valid('cookie', repos), True)
+        self.assertEqual(self.snapshot.is_valid('cookie2', repos), False)
+        self.assertEqual(self.snapshot.is_valid('cookie', {'fedora': 'aaa', 'updates': 'ccc'}), False)
+        self.assertEqual(self.snapshot.is_valid('cookie', {'fedora': 'aaa'}), False)
+        # unknown state
+        self.assertEqual(self.snapshot.is_valid('', repos), False)
+        self.assertEqual(self.snapshot.is_valid('cookie', {'fedora': 'aaa', 'updates': ''}), False)
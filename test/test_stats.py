@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import patch
+
+from dnfdbus.stats import CALL, CallStats, CallTimer, Histogram, run_timed, timed
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_add(self):
+        hist = Histogram((1, 10))
+        for value in (0.5, 1, 5, 50):
+            hist.add(value)
+        self.assertEqual(hist.as_dict(), {'count': 4, 'sum': 56.5, 'max': 50,
+                                          'buckets': [[1, 2], [10, 1], [-1, 1]]})
+
+
+class TestCallStats(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = CallStats()
+
+    def test_timed(self):
+        timer = CallTimer()
+        token = CALL.set(timer)
+        try:
+            with timed('polkit'):
+                pass
+            with timed('polkit'):
+                pass
+        finally:
+            CALL.reset(token)
+        self.assertIn('polkit', timer.phases)
+        # outside a call nothing is timed
+        with timed('polkit'):
+            pass
+
+    @patch('dnfdbus.stats.time')
+    def test_run_timed(self, mock_time):
+        mock_time.perf_counter.side_effect = [0.0, 1.0, 1.5, 2.0, 4.0]
+        timer = CallTimer()
+
+        def work():
+            with timed('serialize'):
+                pass
+            return 'value'
+
+        token = CALL.set(timer)
+        try:
+            self.assertEqual(run_timed(work), 'value')
+        finally:
+            CALL.reset(token)
+        # 3s in the worker, 0.5s of it serializing
+        self.assertEqual(timer.phases, {'serialize': 0.5, 'backend': 2.5})
+        self.assertEqual(run_timed(lambda x: x, 'no call'), 'no call')
+
+    def test_record(self):
+        timer = CallTimer()
+        timer.add('backend', 0.002)
+        self.stats.record('dk.rasmil.DnfDbus.GetRepositories', timer, size=2000)
+        self.stats.record('dk.rasmil.DnfDbus.GetRepositories', CallTimer(), error=True)
+        res = self.stats.as_dict()['dk.rasmil.DnfDbus.GetRepositories']
+        self.assertEqual(res['calls'], 2)
+        self.assertEqual(res['errors'], 1)
+        self.assertEqual(res['latency']['count'], 2)
+        self.assertEqual(res['phases']['backend']['count'], 1)
+        self.assertEqual(res['phases']['polkit']['count'], 0)
+        self.assertEqual(res['reply_size']['count'], 1)
+        self.assertEqual(res['reply_size']['sum'], 2000)
+        lines = self.stats.summary()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith('dk.rasmil.DnfDbus.GetRepositories : calls=2 errors=1'))
@@ -0,0 +1,35 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from dnfdbus.watcher import DirectoryWatcher
+
+
+class TestDirectoryWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.watcher = DirectoryWatcher({'rpmdb': '/var/lib/rpm'}, delay=1.0)
+        self.changed = MagicMock()
+        self.watcher.changed.connect(self.changed)
+
+    @patch('dnfdbus.watcher.GLib')
+    def test_debounce(self, mock_glib):
+        """ test a burst of changes is reported once """
+        mock_glib.timeout_add.side_effect = [1, 2]
+        self.watcher._on_changed(None, None, None, None, 'rpmdb')
+        self.watcher._on_changed(None, None, None, None, 'rpmdb')
+        # the first timeout is restarted by the second change
+        mock_glib.source_remove.assert_called_once_with(1)
+        mock_glib.timeout_add.assert_called_with(1000, self.watcher._emit_changed, 'rpmdb')
+        self.changed.assert_not_called()
+        self.assertFalse(self.watcher._emit_changed('rpmdb'))
+        self.changed.assert_called_once_with('rpmdb')
+        self.assertEqual(self.watcher._timeouts, {})
+
+    @patch('dnfdbus.watcher.Gio')
+    def test_start_stop(self, mock_gio):
+        monitor = mock_gio.File.new_for_path().monitor_directory()
+        self.watcher.start()
+        mock_gio.File.new_for_path.assert_called_with('/var/lib/rpm')
+        monitor.connect.assert_called_with('changed', self.watcher._on_changed, 'rpmdb')
+        self.watcher.stop()
+        monitor.cancel.assert_called()